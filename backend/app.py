@@ -4,10 +4,15 @@ from flask_jwt_extended import JWTManager, create_access_token, jwt_required, ge
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import timedelta, datetime
 import os
+import base64
+import binascii
+import shutil
+import mimetypes
 from dotenv import load_dotenv
+from sqlalchemy import func, or_, and_
 
 from database import db, init_db
-from models import User, Project, Screenshot, File
+from models import User, Project, Screenshot, File, ProjectDeletion
 from tasks import scrape_funnel
 
 load_dotenv()
@@ -20,7 +25,7 @@ app.config['JWT_IDENTITY_CLAIM'] = 'sub'
 # Use database directory for persistent storage
 db_dir = os.path.join(os.path.dirname(__file__), 'database')
 os.makedirs(db_dir, exist_ok=True)
-app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(db_dir, "funnelsaver.db")}'
+app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.getenv("DATABASE_PATH", os.path.join(db_dir, "funnelsaver.db"))}'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(__file__), 'uploads')
 
@@ -93,37 +98,178 @@ def get_current_user():
     }), 200
 
 
-@app.route('/api/projects', methods=['GET'])
-@jwt_required()
-def get_projects():
-    user_id = int(get_jwt_identity())
-    user = User.query.get(user_id)
-
-    # Admin sees all projects, regular users see only their own
-    if user and user.is_admin:
-        projects = Project.query.order_by(Project.created_at.desc()).all()
-    else:
-        projects = Project.query.filter_by(user_id=user_id).order_by(Project.created_at.desc()).all()
-
-    return jsonify([{
+PROJECTS_PAGE_SIZE = 50
+PROJECTS_MAX_PAGE_SIZE = 200
+CHANGES_PAGE_SIZE = 200
+CHANGES_LAG = timedelta(seconds=2)
+# Deleted projects are reported by the change feed for this long
+DELETIONS_TTL = timedelta(days=1)
+
+
+def encode_cursor(timestamp, item_id):
+    """Opaque keyset cursor: (timestamp, id) of the last item"""
+    raw = f"{timestamp.isoformat()}|{item_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+    created_at, project_id = raw.split('|')
+    return datetime.fromisoformat(created_at), int(project_id)
+
+
+def project_summaries(projects):
+    """List entries for a page of projects: screenshot counts from one grouped
+    aggregate and the first step as cover, both bounded by the page size"""
+    ids = [p.id for p in projects]
+    counts, covers = {}, {}
+    if ids:
+        per_project = db.session.query(
+            Screenshot.project_id.label('project_id'),
+            func.count(Screenshot.id).label('count'),
+            func.min(Screenshot.step_number).label('first_step')
+        ).filter(Screenshot.project_id.in_(ids)).group_by(Screenshot.project_id).subquery()
+        rows = db.session.query(
+            per_project.c.project_id, per_project.c.count, Screenshot.id, Screenshot.screenshot_path
+        ).join(Screenshot, and_(
+            Screenshot.project_id == per_project.c.project_id,
+            Screenshot.step_number == per_project.c.first_step
+        )).all()
+        for project_id, count, screenshot_id, screenshot_path in rows:
+            counts[project_id] = count
+            covers.setdefault(project_id, {'id': screenshot_id, 'screenshot_path': screenshot_path})
+
+    usernames = dict(
+        db.session.query(User.id, User.username).filter(User.id.in_({p.user_id for p in projects})).all()
+    ) if projects else {}
+
+    return [{
         'id': p.id,
         'url': p.url,
         'status': p.status,
         'created_at': p.created_at.isoformat(),
         'completed_at': p.completed_at.isoformat() if p.completed_at else None,
+        'updated_at': p.updated_at.isoformat() if p.updated_at else None,
         'error': p.error,
         'user_id': p.user_id,
-        'username': p.user.username,  # Always show username for all users
-        'screenshot_count': len(p.screenshots),
+        'username': usernames.get(p.user_id),  # Always show username for all users
+        'screenshot_count': counts.get(p.id, 0),
         'title': p.title,
         'description': p.description,
         'favicon_path': p.favicon_path,
-        'screenshots': [{
-            'id': s.id,
-            'screenshot_path': s.screenshot_path,
-            'step_number': s.step_number
-        } for s in p.screenshots]
-    } for p in projects]), 200
+        'cover': covers.get(p.id)
+    } for p in projects]
+
+
+@app.route('/api/projects', methods=['GET'])
+@jwt_required()
+def get_projects():
+    """Newest projects first, one page at a time.
+    Query params: limit (default 50, max 200), cursor (next_cursor of the
+    previous page), status (comma-separated, e.g. "queued,processing").
+    """
+    user_id = int(get_jwt_identity())
+    user = User.query.get(user_id)
+
+    try:
+        limit = min(max(int(request.args.get('limit', PROJECTS_PAGE_SIZE)), 1), PROJECTS_MAX_PAGE_SIZE)
+    except ValueError:
+        return jsonify({'error': 'Invalid limit'}), 400
+
+    # Admin sees all projects, regular users see only their own
+    query = Project.query
+    if not (user and user.is_admin):
+        query = query.filter(Project.user_id == user_id)
+
+    statuses = [s for s in request.args.get('status', '').split(',') if s]
+    if statuses:
+        query = query.filter(Project.status.in_(statuses))
+
+    cursor = request.args.get('cursor')
+    if cursor:
+        try:
+            created_at, last_id = decode_cursor(cursor)
+        except (ValueError, UnicodeDecodeError, binascii.Error):
+            return jsonify({'error': 'Invalid cursor'}), 400
+        query = query.filter(or_(
+            Project.created_at < created_at,
+            and_(Project.created_at == created_at, Project.id < last_id)
+        ))
+
+    projects = query.order_by(Project.created_at.desc(), Project.id.desc()).limit(limit + 1).all()
+    has_more = len(projects) > limit
+    projects = projects[:limit]
+
+    return jsonify({
+        'projects': project_summaries(projects),
+        'next_cursor': encode_cursor(projects[-1].created_at, projects[-1].id) if has_more else None,
+        # Pass to GET /api/projects/changes to follow updates from here on
+        'changes_cursor': changes_cursor()
+    }), 200
+
+
+def changes_cursor():
+    # Trails the clock so rows stamped just before a concurrent commit are not skipped
+    return encode_cursor(datetime.utcnow() - CHANGES_LAG, 0)
+
+
+@app.route('/api/projects/changes', methods=['GET'])
+@jwt_required()
+def get_project_changes():
+    """Projects whose status, counts or metadata changed since a cursor.
+    Query param: since (changes_cursor of the list, or cursor of the previous
+    call). Returns {projects, deleted, cursor, has_more}; call again right away
+    while has_more is true. deleted lists the ids of projects deleted since the
+    cursor. The same project may be returned twice near the cursor, so clients
+    merge by id.
+    """
+    user_id = int(get_jwt_identity())
+    user = User.query.get(user_id)
+
+    since = request.args.get('since')
+    if not since:
+        return jsonify({'error': 'Invalid or missing since'}), 400
+    try:
+        since_at, since_id = decode_cursor(since)
+    except (ValueError, UnicodeDecodeError, binascii.Error):
+        try:
+            # Plain timestamp cursor of older clients
+            since_at, since_id = datetime.fromisoformat(since), 0
+        except ValueError:
+            return jsonify({'error': 'Invalid or missing since'}), 400
+
+    until = datetime.utcnow() - CHANGES_LAG
+    # (updated_at, id) keyset: rows sharing the timestamp of the last item of
+    # a page come with the next page instead of being skipped
+    query = Project.query.filter(or_(
+        Project.updated_at > since_at,
+        and_(Project.updated_at == since_at, Project.id > since_id)
+    ))
+    deletions = ProjectDeletion.query.filter(ProjectDeletion.deleted_at >= since_at)
+    if not (user and user.is_admin):
+        query = query.filter(Project.user_id == user_id)
+        deletions = deletions.filter(ProjectDeletion.user_id == user_id)
+
+    projects = query.order_by(Project.updated_at, Project.id).limit(CHANGES_PAGE_SIZE + 1).all()
+    has_more = len(projects) > CHANGES_PAGE_SIZE
+    projects = projects[:CHANGES_PAGE_SIZE]
+    if has_more:
+        until = projects[-1].updated_at
+        cursor = encode_cursor(until, projects[-1].id)
+    else:
+        cursor = encode_cursor(until, 0)
+    # Both ends inclusive: a deletion may be reported twice, never missed
+    deleted = sorted({
+        project_id for (project_id,) in
+        deletions.filter(ProjectDeletion.deleted_at <= until).with_entities(ProjectDeletion.project_id)
+    })
+
+    return jsonify({
+        'projects': project_summaries(projects),
+        'deleted': deleted,
+        'cursor': cursor,
+        'has_more': has_more
+    }), 200
 
 
 @app.route('/api/projects', methods=['POST'])
@@ -177,6 +323,10 @@ def create_project():
 @app.route('/api/projects/<int:project_id>', methods=['GET'])
 @jwt_required()
 def get_project(project_id):
+    """Project with its steps and files.
+    Query param: after_step (only steps with a higher step_number, for clients
+    catching up on events they missed).
+    """
     user_id = int(get_jwt_identity())
     user = User.query.filter_by(id=user_id).first()
 
@@ -192,14 +342,21 @@ def get_project(project_id):
     if not project:
         return jsonify({'error': 'Project not found'}), 404
 
-    screenshots = Screenshot.query.filter_by(project_id=project_id).order_by(Screenshot.step_number).all()
+    after_step = request.args.get('after_step', type=int)
+    query = Screenshot.query.filter_by(project_id=project_id)
+    if after_step is not None:
+        query = query.filter(Screenshot.step_number > after_step)
+    screenshots = query.order_by(Screenshot.step_number).all()
     files = File.query.filter_by(project_id=project_id).all()
+    screenshot_count = Screenshot.query.filter_by(project_id=project_id).count()
 
     # Check if task is stuck (no new screenshots in 5+ minutes while processing)
     is_stuck = False
-    if project.status == 'processing' and screenshots:
+    last_screenshot = Screenshot.query.filter_by(project_id=project_id).order_by(
+        Screenshot.step_number.desc()
+    ).first() if project.status == 'processing' else None
+    if last_screenshot:
         from datetime import datetime, timedelta
-        last_screenshot = screenshots[-1]
         time_since_last = datetime.utcnow() - last_screenshot.created_at
         if time_since_last > timedelta(minutes=5):
             is_stuck = True
@@ -216,17 +373,9 @@ def get_project(project_id):
         'description': project.description,
         'favicon_path': project.favicon_path,
         'is_stuck': is_stuck,
-        'screenshots': [{
-            'id': s.id,
-            'step_number': s.step_number,
-            'url': s.url,
-            'screenshot_path': s.screenshot_path,
-            'html_path': s.html_path,
-            'markdown_path': s.markdown_path,
-            'action_description': s.action_description,
-            'markdown_content': s.markdown_content,
-            'created_at': s.created_at.isoformat() if s.created_at else None
-        } for s in screenshots],
+        'after_step': after_step,
+        'screenshot_count': screenshot_count,
+        'screenshots': [s.to_dict() for s in screenshots],
         'files': [{
             'id': f.id,
             'file_type': f.file_type,
@@ -271,7 +420,9 @@ def get_screenshot_image(screenshot_id):
     if not os.path.exists(file_path):
         return jsonify({'error': 'Screenshot file not found'}), 404
 
-    return send_file(file_path, mimetype='image/png')
+    # PNG, JPEG or WebP depending on the capture profile
+    mimetype = mimetypes.guess_type(file_path)[0] or 'image/png'
+    return send_file(file_path, mimetype=mimetype)
 
 
 @app.route('/api/projects/<int:project_id>/duplicate', methods=['POST'])
@@ -357,9 +508,18 @@ def health():
     return jsonify({'status': 'healthy'}), 200
 
 
+SSE_RETRY_MS = 3000
+
+
 @app.route('/api/projects/<int:project_id>/events')
 def project_events(project_id):
-    """Server-Sent Events endpoint for real-time project updates"""
+    """Server-Sent Events endpoint for real-time project updates.
+    Events come from the project's Redis Stream and carry their stream id, so
+    a reconnecting EventSource (Last-Event-ID) gets everything it missed.
+    Never blocks: each request answers what is queued and ends, and
+    EventSource comes back after `retry` ms. Held-open streams are served by
+    event_gateway.py, so viewers don't tie up Gunicorn threads here.
+    """
     # Get token from query param since EventSource doesn't support headers
     token = request.args.get('token')
     if not token:
@@ -385,26 +545,37 @@ def project_events(project_id):
     if not project:
         return jsonify({'error': 'Project not found'}), 404
 
-    import redis
     import json
-
-    def event_stream():
-        # Connect to Redis for pub/sub
-        r = redis.from_url(os.getenv('REDIS_URL', 'redis://redis:6379/0'))
-        pubsub = r.pubsub()
-        channel = f'project_{project_id}_updates'
-        pubsub.subscribe(channel)
-
-        # Send initial state
-        yield f"data: {json.dumps({'type': 'connected', 'project_id': project_id})}\n\n"
-
-        # Listen for updates
-        for message in pubsub.listen():
-            if message['type'] == 'message':
-                yield f"data: {message['data'].decode('utf-8')}\n\n"
+    from tasks import get_redis
+    from events import event_stream_key, is_terminal, TERMINAL_STATUSES
+
+    r = get_redis()
+    key = event_stream_key(project_id)
+    # Set by EventSource when it reconnects; last_event_id lets a new page resume too
+    position = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    fresh = not position
+    if fresh:
+        # Fresh connection: the client loads the project itself, stream what comes next
+        latest = r.xrevrange(key, count=1)
+        position = latest[0][0].decode() if latest else '0-0'
+
+    entries = r.xread({key: position}, count=100)
+    # A finished project with nothing left to replay: 204 stops EventSource reconnecting
+    if project.status in TERMINAL_STATUSES and not entries:
+        return '', 204
+
+    frames = [f"retry: {SSE_RETRY_MS}\n"]
+    if fresh:
+        # The id becomes the client's Last-Event-ID, so the next request resumes here
+        frames.append(f"id: {position}\ndata: {json.dumps({'type': 'connected', 'project_id': project_id})}\n\n")
+    for entry_id, fields in (entries[0][1] if entries else []):
+        message = fields[b'message'].decode('utf-8')
+        frames.append(f"id: {entry_id.decode()}\ndata: {message}\n\n")
+        if is_terminal(json.loads(message)):
+            break
 
     return app.response_class(
-        event_stream(),
+        ''.join(frames),
         mimetype='text/event-stream',
         headers={
             'Cache-Control': 'no-cache',
@@ -558,7 +729,10 @@ def delete_project(project_id):
     # Delete screenshots
     for screenshot in project.screenshots:
         screenshot_path = os.path.join('uploads', screenshot.screenshot_path)
-        if os.path.exists(screenshot_path):
+        if os.path.dirname(screenshot_path).endswith('_tiles'):
+            # Tiled capture: the path is the first tile of a tile directory
+            shutil.rmtree(os.path.dirname(screenshot_path), ignore_errors=True)
+        elif os.path.exists(screenshot_path):
             os.remove(screenshot_path)
 
     # Delete exported files
@@ -575,6 +749,9 @@ def delete_project(project_id):
 
     # Delete project from database (cascade will delete screenshots and files)
     db.session.delete(project)
+    # Tombstone for the change feed; ones no dashboard can still be waiting for are dropped
+    db.session.add(ProjectDeletion(project_id=project.id, user_id=project.user_id))
+    ProjectDeletion.query.filter(ProjectDeletion.deleted_at < datetime.utcnow() - DELETIONS_TTL).delete()
     db.session.commit()
 
     return jsonify({'message': 'Project deleted successfully'}), 200
@@ -20,7 +20,10 @@ celery_app.conf.update(
     result_serializer='json',
     timezone='UTC',
     enable_utc=True,
-    worker_concurrency=2,  # Maximum 2 parallel workers
+    # prefork: one process (and browser) per funnel. threads: funnels of one
+    # process share its event loop and pooled browser (see tasks.py)
+    worker_pool=os.getenv('CELERY_WORKER_POOL', 'prefork'),
+    worker_concurrency=int(os.getenv('CELERY_WORKER_CONCURRENCY', '2')),  # Parallel funnels per worker
     worker_prefetch_multiplier=1,  # Fetch one task at a time
 
     # Broker connection settings for stability
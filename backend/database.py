@@ -1,4 +1,5 @@
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import inspect, text
 
 db = SQLAlchemy()
 
@@ -6,3 +7,20 @@ db = SQLAlchemy()
 def init_db():
     """Initialize database tables"""
     db.create_all()
+    # create_all() skips tables that already exist, so columns and indexes
+    # added to existing models are created here
+    existing = inspect(db.engine)
+    with db.engine.begin() as conn:
+        for table in db.metadata.sorted_tables:
+            columns = {c['name'] for c in existing.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in columns:
+                    column_type = column.type.compile(dialect=db.engine.dialect)
+                    conn.execute(text(f'ALTER TABLE {table.name} ADD COLUMN {column.name} {column_type}'))
+        # Projects created before updated_at existed
+        conn.execute(text(
+            'UPDATE projects SET updated_at = COALESCE(completed_at, created_at) WHERE updated_at IS NULL'
+        ))
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
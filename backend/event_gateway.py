@@ -0,0 +1,327 @@
+import argparse
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import jwt
+import redis.asyncio as aioredis
+from aiohttp import web
+from events import event_stream_key, is_terminal, TERMINAL_STATUSES
+
+SSE_HEARTBEAT_S = 15
+SSE_RETRY_MS = 3000
+# Longest block of the shared XREAD. New streams interrupt it (CLIENT UNBLOCK);
+# the bound only matters if that races the XREAD being sent
+READ_BLOCK_MS = 5000
+READ_COUNT = 100
+REPLAY_COUNT = 1000
+
+DB_PATH = os.getenv(
+    'DATABASE_PATH', os.path.join(os.path.dirname(__file__), 'database', 'funnelsaver.db')
+)
+
+CORS_HEADERS = {'Access-Control-Allow-Origin': '*'}
+SSE_HEADERS = {
+    **CORS_HEADERS,
+    'Content-Type': 'text/event-stream',
+    'Cache-Control': 'no-cache',
+    'X-Accel-Buffering': 'no',
+}
+
+
+def parse_id(entry_id: str) -> tuple:
+    """Stream entry id ('<ms>-<seq>') as a comparable tuple"""
+    ms, _, seq = entry_id.partition('-')
+    return int(ms), int(seq or 0)
+
+
+def verify_token(token: str, secret: str) -> int:
+    """User id of a flask-jwt-extended access token (raises jwt.InvalidTokenError)"""
+    claims = jwt.decode(token, secret, algorithms=['HS256'])
+    if claims.get('type', 'access') != 'access':
+        raise jwt.InvalidTokenError('Not an access token')
+    return int(claims['sub'])
+
+
+def load_project(db_path: str, project_id: int, user_id: int):
+    """Status of a project the user may watch (admins: any project), or None"""
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True, timeout=5)
+    try:
+        row = conn.execute(
+            'SELECT p.user_id, p.status, u.is_admin FROM projects p JOIN users u ON u.id = ? WHERE p.id = ?',
+            (user_id, project_id)
+        ).fetchone()
+    finally:
+        conn.close()
+    if not row:
+        return None
+    owner_id, status, is_admin = row
+    if owner_id != user_id and not is_admin:
+        return None
+    return {'status': status}
+
+
+class EventGateway:
+    """Serves /api/projects/<id>/events (SSE) to any number of viewers from
+    one asyncio process, instead of a server thread and a blocking Redis
+    read per open page.
+
+    * One XREAD loop on one Redis connection covers the streams of every
+      project somebody is watching; each entry is encoded once and fanned
+      out to the viewers of that project.
+    * Every viewer gets a bounded queue. A viewer that falls behind by
+      queue_size events is disconnected; EventSource reconnects with
+      Last-Event-ID and replays the rest from the stream.
+    * Same protocol as the Flask endpoint: retry + connected, id/data
+      events, heartbeat comments, end after a terminal status, 204 for a
+      finished project with nothing to replay.
+    * Serves live numbers on /metrics and /health.
+
+        python event_gateway.py --port 5002
+    """
+
+    def __init__(self, redis_url: str, jwt_secret: str, db_path: str = DB_PATH, queue_size: int = 256):
+        self.redis_url = redis_url
+        self.jwt_secret = jwt_secret
+        self.db_path = db_path
+        self.queue_size = queue_size
+        self.redis = None
+        self.reader = None
+        self.reader_id = None
+        self.reader_task = None
+        self.reading = False
+        self.wakeup = asyncio.Event()
+        # stream key -> {'position': last id read, 'subscribers': [...]}
+        self.streams = {}
+        self.started = time.time()
+        self.connections = 0
+        self.delivered = 0
+        self.dropped = 0
+        self.rejected = 0
+
+    @property
+    def subscribers(self) -> int:
+        return sum(len(stream['subscribers']) for stream in self.streams.values())
+
+    async def subscribe(self, key: str, last_id: str) -> dict:
+        """Register a viewer, then replay what it missed since last_id.
+        Live entries read meanwhile are held back and merged by id, so nothing
+        is lost or sent twice between the replay and the shared loop.
+        """
+        subscriber = {
+            'queue': asyncio.Queue(self.queue_size),
+            'last_id': last_id,
+            'pending': [],
+            'dropped': False,
+        }
+        stream = self.streams.get(key)
+        if stream is None:
+            stream = self.streams[key] = {'position': last_id, 'subscribers': []}
+            await self.wake_reader()
+        stream['subscribers'].append(subscriber)
+
+        try:
+            replay = await self.redis.xread({key: last_id}, count=REPLAY_COUNT)
+        except Exception:
+            self.unsubscribe(key, subscriber)
+            raise
+        events = [self.encode(entry_id, fields) for entry_id, fields in (replay[0][1] if replay else [])]
+        events.extend(subscriber['pending'])
+        subscriber['pending'] = None
+        for event in sorted(events, key=lambda event: parse_id(event[0])):
+            self.deliver(subscriber, *event)
+        return subscriber
+
+    def unsubscribe(self, key: str, subscriber: dict):
+        stream = self.streams.get(key)
+        if not stream:
+            return
+        if subscriber in stream['subscribers']:
+            stream['subscribers'].remove(subscriber)
+        if not stream['subscribers']:
+            # The read loop drops the stream from its next XREAD
+            del self.streams[key]
+
+    async def wake_reader(self):
+        """Restart a blocked XREAD so it picks up a newly watched stream"""
+        self.wakeup.set()
+        if self.reading and self.reader_id is not None:
+            try:
+                await self.redis.client_unblock(self.reader_id)
+            except Exception as e:
+                print(f"DEBUG: Failed to unblock event reader: {e}")
+
+    @staticmethod
+    def encode(entry_id, fields) -> tuple:
+        """(id, SSE frame, terminal) for a stream entry, built once per entry"""
+        entry_id = entry_id.decode()
+        message = fields[b'message'].decode('utf-8')
+        frame = f"id: {entry_id}\ndata: {message}\n\n".encode()
+        return entry_id, frame, is_terminal(json.loads(message))
+
+    def deliver(self, subscriber: dict, entry_id: str, frame: bytes, terminal: bool):
+        if subscriber['pending'] is not None:
+            subscriber['pending'].append((entry_id, frame, terminal))
+            return
+        if subscriber['dropped'] or parse_id(entry_id) <= parse_id(subscriber['last_id']):
+            return
+        try:
+            subscriber['queue'].put_nowait((frame, terminal))
+        except asyncio.QueueFull:
+            # Slow viewer: its handler closes the response, the client resumes
+            # from its Last-Event-ID and replays from the stream
+            subscriber['dropped'] = True
+            self.dropped += 1
+            return
+        subscriber['last_id'] = entry_id
+        self.delivered += 1
+
+    async def read_loop(self):
+        """The one XREAD for every watched stream, fanned out to the viewers"""
+        while True:
+            if not self.streams:
+                self.wakeup.clear()
+                await self.wakeup.wait()
+                continue
+            self.wakeup.clear()
+            positions = {key: stream['position'] for key, stream in self.streams.items()}
+            self.reading = True
+            try:
+                entries = await self.reader.xread(positions, block=READ_BLOCK_MS, count=READ_COUNT)
+            except Exception as e:
+                print(f"DEBUG: Event reader failed: {e}")
+                await asyncio.sleep(1)
+                continue
+            finally:
+                self.reading = False
+            for key, items in entries or []:
+                stream = self.streams.get(key.decode())
+                if stream is None:
+                    continue
+                for entry_id, fields in items:
+                    event = self.encode(entry_id, fields)
+                    if parse_id(event[0]) > parse_id(stream['position']):
+                        stream['position'] = event[0]
+                    for subscriber in stream['subscribers']:
+                        self.deliver(subscriber, *event)
+
+    async def handle_events(self, request: web.Request) -> web.StreamResponse:
+        project_id = int(request.match_info['project_id'])
+        # Token in the query string: EventSource can't send headers
+        token = request.query.get('token')
+        if not token:
+            return web.json_response({'error': 'Missing token'}, status=401, headers=CORS_HEADERS)
+        try:
+            user_id = verify_token(token, self.jwt_secret)
+        except (jwt.InvalidTokenError, KeyError, ValueError):
+            self.rejected += 1
+            return web.json_response({'error': 'Invalid token'}, status=401, headers=CORS_HEADERS)
+
+        project = await asyncio.to_thread(load_project, self.db_path, project_id, user_id)
+        if not project:
+            return web.json_response({'error': 'Project not found'}, status=404, headers=CORS_HEADERS)
+
+        key = event_stream_key(project_id)
+        last_id = request.headers.get('Last-Event-ID') or request.query.get('last_event_id')
+        if not last_id:
+            latest = await self.redis.xrevrange(key, count=1)
+            last_id = latest[0][0].decode() if latest else '0-0'
+
+        if project['status'] in TERMINAL_STATUSES and not await self.redis.xread({key: last_id}, count=1):
+            return web.Response(status=204, headers=CORS_HEADERS)
+
+        response = web.StreamResponse(headers=SSE_HEADERS)
+        await response.prepare(request)
+        try:
+            subscriber = await self.subscribe(key, last_id)
+        except Exception as e:
+            # Ending the response lets EventSource retry with its Last-Event-ID
+            print(f"DEBUG: Event replay failed for {key}: {e}")
+            return response
+        self.connections += 1
+        try:
+            await response.write(
+                f"retry: {SSE_RETRY_MS}\n"
+                f"data: {json.dumps({'type': 'connected', 'project_id': project_id})}\n\n".encode()
+            )
+            while not subscriber['dropped']:
+                try:
+                    frame, terminal = await asyncio.wait_for(subscriber['queue'].get(), SSE_HEARTBEAT_S)
+                except asyncio.TimeoutError:
+                    # Comment line: keeps proxies from closing an idle stream
+                    await response.write(b": heartbeat\n\n")
+                    continue
+                await response.write(frame)
+                if terminal:
+                    break
+        except ConnectionError:
+            # Viewer went away; noticed on the next write at the latest
+            pass
+        finally:
+            self.unsubscribe(key, subscriber)
+        return response
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "uptime_s": round(time.time() - self.started),
+            "subscribers": self.subscribers,
+            "streams": len(self.streams),
+            "connections": self.connections,
+            "delivered": self.delivered,
+            "dropped": self.dropped,
+            "rejected": self.rejected,
+            "per_project": {
+                key: len(stream['subscribers']) for key, stream in self.streams.items()
+            },
+        })
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        try:
+            await self.redis.ping()
+        except Exception as e:
+            return web.json_response({"status": "unhealthy", "error": str(e)}, status=503)
+        return web.json_response({"status": "healthy", "subscribers": self.subscribers})
+
+    async def on_startup(self, app: web.Application):
+        self.redis = aioredis.from_url(self.redis_url)
+        # The blocking XREAD gets a connection of its own, so its id is known for CLIENT UNBLOCK
+        self.reader = aioredis.from_url(self.redis_url, single_connection_client=True)
+        self.reader_id = await self.reader.client_id()
+        self.reader_task = asyncio.create_task(self.read_loop())
+
+    async def on_cleanup(self, app: web.Application):
+        if self.reader_task:
+            self.reader_task.cancel()
+        if self.reader:
+            await self.reader.aclose()
+        if self.redis:
+            await self.redis.aclose()
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/api/projects/{project_id:\\d+}/events", self.handle_events)
+        app.router.add_get("/metrics", self.handle_metrics)
+        app.router.add_get("/health", self.handle_health)
+        app.on_startup.append(self.on_startup)
+        app.on_cleanup.append(self.on_cleanup)
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="SSE gateway for project progress events")
+    parser.add_argument("--host", default="0.0.0.0", help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=5002, help="Port for the events endpoint, /metrics and /health")
+    parser.add_argument("--queue-size", type=int, default=256, help="Events buffered per viewer before it is dropped")
+    args = parser.parse_args()
+
+    gateway = EventGateway(
+        redis_url=os.getenv('REDIS_URL', 'redis://redis:6379/0'),
+        jwt_secret=os.getenv('JWT_SECRET_KEY', 'jwt-secret-key-change-in-production'),
+        queue_size=args.queue_size,
+    )
+    web.run_app(gateway.app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,21 @@
+import os
+
+# Version of the event payloads; bumped on incompatible changes so clients
+# can fall back to refetching the project
+EVENT_VERSION = 1
+
+# Progress events go to a capped Redis Stream per project, so SSE clients can
+# resume after a reconnect (Last-Event-ID) instead of losing what was sent
+EVENT_STREAM_MAXLEN = int(os.getenv('EVENT_STREAM_MAXLEN', '1000'))
+# A finished project's stream keeps only its final event, for this long
+EVENT_STREAM_TTL = int(os.getenv('EVENT_STREAM_TTL', '3600'))
+TERMINAL_STATUSES = ('completed', 'failed', 'cancelled')
+
+
+def event_stream_key(project_id):
+    return f'project_{project_id}_events'
+
+
+def is_terminal(event):
+    """True for the status_changed event that ends a project's stream"""
+    return event.get('type') == 'status_changed' and event.get('data', {}).get('status') in TERMINAL_STATUSES
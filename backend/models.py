@@ -26,6 +26,9 @@ class Project(db.Model):
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     completed_at = db.Column(db.DateTime, nullable=True)
     error = db.Column(db.Text, nullable=True)
+    # Bumped on every change the project list shows (status, metadata, new
+    # screenshots), drives GET /api/projects/changes
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     # Metadata fields
     title = db.Column(db.String(500), nullable=True)
@@ -35,6 +38,16 @@ class Project(db.Model):
     screenshots = db.relationship('Screenshot', backref='project', lazy=True, cascade='all, delete-orphan')
     files = db.relationship('File', backref='project', lazy=True, cascade='all, delete-orphan')
 
+    # Keyset pagination of the project list, newest first (per user, per status, all)
+    __table_args__ = (
+        db.Index('ix_projects_user_created', 'user_id', 'created_at', 'id'),
+        db.Index('ix_projects_status_created', 'status', 'created_at', 'id'),
+        db.Index('ix_projects_created', 'created_at', 'id'),
+        # Change feed, per user and for admins
+        db.Index('ix_projects_user_updated', 'user_id', 'updated_at'),
+        db.Index('ix_projects_updated', 'updated_at'),
+    )
+
 
 class Screenshot(db.Model):
     __tablename__ = 'screenshots'
@@ -50,6 +63,25 @@ class Screenshot(db.Model):
     markdown_content = db.Column(db.Text, nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Per-project counts and cover (first step) lookups
+    __table_args__ = (
+        db.Index('ix_screenshots_project_step', 'project_id', 'step_number'),
+    )
+
+    def to_dict(self):
+        """Step as returned by the project endpoints and screenshot_added events"""
+        return {
+            'id': self.id,
+            'step_number': self.step_number,
+            'url': self.url,
+            'screenshot_path': self.screenshot_path,
+            'html_path': self.html_path,
+            'markdown_path': self.markdown_path,
+            'action_description': self.action_description,
+            'markdown_content': self.markdown_content,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
 
 class File(db.Model):
     __tablename__ = 'files'
@@ -60,3 +92,19 @@ class File(db.Model):
     file_path = db.Column(db.String(500), nullable=False)
     file_name = db.Column(db.String(255), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+
+class ProjectDeletion(db.Model):
+    """Tombstone of a deleted project, so GET /api/projects/changes can tell
+    other open dashboards to drop it"""
+    __tablename__ = 'project_deletions'
+
+    id = db.Column(db.Integer, primary_key=True)
+    project_id = db.Column(db.Integer, nullable=False)
+    user_id = db.Column(db.Integer, nullable=False)  # Owner of the deleted project
+    deleted_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_project_deletions_user_deleted', 'user_id', 'deleted_at'),
+        db.Index('ix_project_deletions_deleted', 'deleted_at'),
+    )
@@ -7,6 +7,7 @@ from models import Project, Screenshot, File
 from tasks import scrape_funnel
 from datetime import datetime
 import os
+import shutil
 
 def recover_stuck_projects():
     """Find and restart projects that were processing when system went down"""
@@ -30,7 +31,10 @@ def recover_stuck_projects():
             for screenshot in project.screenshots:
                 # Delete screenshot file from disk
                 screenshot_path = os.path.join('uploads', screenshot.screenshot_path)
-                if os.path.exists(screenshot_path):
+                if os.path.dirname(screenshot_path).endswith('_tiles'):
+                    # Tiled capture: remove the whole tile directory
+                    shutil.rmtree(os.path.dirname(screenshot_path), ignore_errors=True)
+                elif os.path.exists(screenshot_path):
                     try:
                         os.remove(screenshot_path)
                     except Exception as e:
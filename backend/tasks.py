@@ -2,18 +2,22 @@ import sys
 import os
 import shutil
 import json
+import threading
+import concurrent.futures
 from datetime import datetime
+from celery.signals import worker_process_shutdown, worker_shutdown
 from celery_config import celery_app
 from flask import Flask
 from database import db
 from models import Project, Screenshot, File
+from events import EVENT_VERSION, EVENT_STREAM_MAXLEN, EVENT_STREAM_TTL, TERMINAL_STATUSES, event_stream_key
 import redis
 
 # Initialize Flask app for database access
 app = Flask(__name__)
 db_dir = os.path.join(os.path.dirname(__file__), 'database')
 os.makedirs(db_dir, exist_ok=True)
-app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(db_dir, "funnelsaver.db")}'
+app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.getenv("DATABASE_PATH", os.path.join(db_dir, "funnelsaver.db"))}'
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(__file__), 'uploads')
 db.init_app(app)
@@ -23,22 +27,180 @@ db.init_app(app)
 scraper_path = '/scraper' if os.path.exists('/scraper') else os.path.join(os.path.dirname(__file__), '..', 'scraper')
 sys.path.insert(0, scraper_path)
 
+# Warm browser pool: Chromium is launched once per worker process and every
+# task gets a fresh context from it. Set BROWSER_POOL=0 to launch per task.
+# With the threads pool (CELERY_WORKER_POOL=threads) several tasks share the
+# process: their funnels run concurrently on one event loop and one browser,
+# at most FUNNELS_PER_PROCESS at a time.
+# With BROWSER_SERVER_URL set no browser is launched here at all: every funnel
+# attaches to the browser server (scraper/src/browser_server.py).
+BROWSER_POOL_ENABLED = os.getenv('BROWSER_POOL', '1') == '1'
+BROWSER_SERVER_URL = os.getenv('BROWSER_SERVER_URL')
+FUNNELS_PER_PROCESS = int(os.getenv('FUNNELS_PER_PROCESS', os.getenv('CELERY_WORKER_CONCURRENCY', '2')))
+_pool_lock = threading.Lock()
+_worker_loop = None
+_browser_pool = None
+_funnel_slots = None
+_markdown_executor = None
+
+
+def get_browser_pool():
+    """Start (once per process) the event loop thread and browser pool"""
+    global _worker_loop, _browser_pool, _funnel_slots, _markdown_executor
+    with _pool_lock:
+        if _worker_loop is None:
+            import asyncio
+            from src.pool import WorkerLoop, BrowserPool
+            from src.converter import create_executor
+            _worker_loop = WorkerLoop()
+            if not BROWSER_SERVER_URL:
+                _browser_pool = BrowserPool(
+                    headless=True,
+                    max_contexts=int(os.getenv('BROWSER_POOL_MAX_CONTEXTS', '50')),
+                    max_rss_mb=int(os.getenv('BROWSER_POOL_MAX_RSS_MB', '1500')),
+                )
+            _funnel_slots = asyncio.Semaphore(FUNNELS_PER_PROCESS)
+            # One Markdown pool for all funnels of the process
+            _markdown_executor = create_executor(int(os.getenv('MARKDOWN_WORKERS', '2')))
+        return _worker_loop, _browser_pool
+
+
+@worker_process_shutdown.connect  # prefork children
+@worker_shutdown.connect  # threads pool (single process)
+def shutdown_browser_pool(**kwargs):
+    """Close the pooled browser when the worker process exits"""
+    global _worker_loop, _browser_pool
+    with _pool_lock:
+        if _worker_loop is None:
+            return
+        if _browser_pool is not None:
+            try:
+                _worker_loop.run(_browser_pool.close(), timeout=30)
+            except Exception as e:
+                print(f"Failed to close browser pool: {e}")
+            _browser_pool = None
+        _worker_loop.stop()
+        _worker_loop = None
+        _markdown_executor.shutdown(wait=False, cancel_futures=True)
+
+
+_redis = None
+
+
+def get_redis():
+    global _redis
+    if _redis is None:
+        _redis = redis.from_url(os.getenv('REDIS_URL', 'redis://redis:6379/0'))
+    return _redis
+
 
 def send_progress_event(project_id, event_type, data):
-    """Send real-time progress event via Redis pub/sub"""
+    """Append a real-time progress event to the project's Redis Stream"""
     try:
-        r = redis.from_url(os.getenv('REDIS_URL', 'redis://redis:6379/0'))
-        channel = f'project_{project_id}_updates'
+        r = get_redis()
+        key = event_stream_key(project_id)
         message = json.dumps({
+            'v': EVENT_VERSION,
             'type': event_type,
             'data': data,
             'timestamp': datetime.utcnow().isoformat()
         })
-        r.publish(channel, message)
+        pipe = r.pipeline()
+        pipe.xadd(key, {'message': message}, maxlen=EVENT_STREAM_MAXLEN, approximate=True)
+        if event_type == 'status_changed' and data.get('status') in TERMINAL_STATUSES:
+            # Reconnecting clients catch up from the API; the stream only needs the end
+            pipe.xtrim(key, maxlen=1)
+            pipe.expire(key, EVENT_STREAM_TTL)
+        pipe.execute()
     except Exception as e:
         print(f"Failed to send progress event: {e}")
 
 
+def _record_step(project_id, step_data):
+    """Store a completed step and notify the frontend.
+    Runs in a thread with its own app context (and DB session), so concurrent
+    funnels never share a session or block the event loop.
+    Returns False if the project was cancelled in the meantime.
+    """
+    with app.app_context():
+        project = Project.query.get(project_id)
+        if not project or project.status == 'cancelled':
+            return False
+
+        step_number = step_data['step']
+        reused_from = (step_data.get('capture') or {}).get('reused_from')
+        if reused_from is not None:
+            # Same screen as an earlier step: the row below points at that step's
+            # artifacts but keeps this step's own URL and action
+            send_progress_event(project_id, 'progress', {
+                'action': 'reused',
+                'message': f"Step {step_number}: same screen as step {reused_from}",
+                'step': step_number,
+            })
+
+        # New screenshot (count, cover): the project shows up in the change feed
+        project.updated_at = datetime.utcnow()
+        screenshot_path_abs = step_data['screenshot_path']
+        html_path_abs = step_data['html_path']
+
+        # Convert absolute paths to relative paths for DB/Frontend
+        # The scraper writes to project_dir which is uploads/project_{id}
+        # We want paths like project_{id}/step_0.png, or for tiled captures
+        # project_{id}/step_0_tiles/tile_000.png (the tile directory is kept)
+        project_dir = os.path.join(app.config['UPLOAD_FOLDER'], f'project_{project_id}')
+
+        def relative(path):
+            return f"project_{project_id}/{os.path.relpath(path, project_dir).replace(os.sep, '/')}"
+
+        rel_screenshot_path = relative(screenshot_path_abs)
+        rel_html_path = relative(html_path_abs) if html_path_abs else None
+
+        # Markdown content is passed directly
+        markdown_content = step_data.get('markdown_content')
+
+        # On step 0, save metadata and favicon
+        if step_number == 0:
+            metadata = step_data.get('metadata', {})
+            favicon_filename = step_data.get('favicon_filename')
+
+            # Update project with metadata
+            project.title = metadata.get('title')
+            project.description = metadata.get('description')
+            if favicon_filename:
+                project.favicon_path = f"project_{project_id}/{favicon_filename}"
+
+        # Create screenshot record
+        screenshot = Screenshot(
+            project_id=project_id,
+            step_number=step_number,
+            url=step_data['url'],
+            screenshot_path=rel_screenshot_path,
+            html_path=rel_html_path,
+            markdown_path=None, # Will be set at end if needed, or we can save per step
+            markdown_content=markdown_content,
+            action_description=step_data.get('action_desc', f'Step {step_number}')
+        )
+
+        db.session.add(screenshot)
+        db.session.commit()
+
+        # Send screenshot added event: the complete step, so clients append it
+        # instead of refetching the project (screenshot_count reveals gaps)
+        send_progress_event(project_id, 'screenshot_added', {
+            'step_number': step_number,
+            'screenshot_id': screenshot.id,
+            'screenshot_path': rel_screenshot_path,
+            'screenshot': screenshot.to_dict(),
+            'screenshot_count': Screenshot.query.filter_by(project_id=project_id).count(),
+            'project': {
+                'title': project.title,
+                'description': project.description,
+                'favicon_path': project.favicon_path
+            }
+        })
+        return True
+
+
 @celery_app.task(bind=True)
 def scrape_funnel(self, project_id):
     """
@@ -77,74 +239,55 @@ def scrape_funnel(self, project_id):
                 except Exception as e:
                     print(f"Error in on_progress: {e}")
 
+            # The running funnel, so a cancelled project can stop it (revoke
+            # cannot terminate a task in the threads pool)
+            funnel_task = None
+
             # Define callback for real-time updates
             async def on_step_completed(step_data):
                 """Callback called by scraper after each step"""
                 try:
-                    # We need to run sync DB operations inside async callback
-                    # Since we are in the same thread, we can use the app context
-                    # but let's be safe and re-establish it if needed, though
-                    # here we are just using the outer scope variables.
-
-                    step_number = step_data['step']
-                    screenshot_path_abs = step_data['screenshot_path']
-                    html_path_abs = step_data['html_path']
-
-                    # Convert absolute paths to relative paths for DB/Frontend
-                    # The scraper writes to project_dir which is uploads/project_{id}
-                    # We want paths like project_{id}/step_0.png
-
-                    rel_screenshot_path = f"project_{project_id}/{os.path.basename(screenshot_path_abs)}"
-                    rel_html_path = f"project_{project_id}/{os.path.basename(html_path_abs)}" if html_path_abs else None
-
-                    # Markdown content is passed directly
-                    markdown_content = step_data.get('markdown_content')
-
-                    # On step 0, save metadata and favicon
-                    if step_number == 0:
-                        metadata = step_data.get('metadata', {})
-                        favicon_filename = step_data.get('favicon_filename')
-
-                        # Update project with metadata
-                        project.title = metadata.get('title')
-                        project.description = metadata.get('description')
-                        if favicon_filename:
-                            project.favicon_path = f"project_{project_id}/{favicon_filename}"
-
-                    # Create screenshot record
-                    screenshot = Screenshot(
-                        project_id=project_id,
-                        step_number=step_number,
-                        url=step_data['url'],
-                        screenshot_path=rel_screenshot_path,
-                        html_path=rel_html_path,
-                        markdown_path=None, # Will be set at end if needed, or we can save per step
-                        markdown_content=markdown_content,
-                        action_description=step_data.get('action_desc', f'Step {step_number}')
-                    )
-
-                    db.session.add(screenshot)
-                    db.session.commit()
-
-                    # Send screenshot added event
-                    send_progress_event(project_id, 'screenshot_added', {
-                        'step_number': step_number,
-                        'screenshot_id': screenshot.id,
-                        'screenshot_path': rel_screenshot_path
-                    })
-
+                    if not await asyncio.to_thread(_record_step, project_id, step_data):
+                        print(f"Project {project_id} was cancelled, stopping funnel")
+                        funnel_task.cancel()
                 except Exception as e:
                     print(f"Error in on_step_completed: {e}")
 
+            async def run(**funnel):
+                nonlocal funnel_task
+                funnel_task = asyncio.current_task()
+                if _funnel_slots is None:
+                    await run_funnel(**funnel)
+                    return
+                async with _funnel_slots:
+                    await run_funnel(**funnel)
+
             # Run the scraper with custom output directory and callbacks
-            asyncio.run(run_funnel(
+            funnel = dict(
                 url=project.url,
                 headless=True,
                 max_steps=100,
                 output_dir=project_dir,
                 on_step_completed=on_step_completed,
                 on_progress=on_progress
-            ))
+            )
+            try:
+                if BROWSER_POOL_ENABLED:
+                    worker_loop, browser_pool = get_browser_pool()
+                    worker_loop.run(run(
+                        **funnel,
+                        browser_pool=browser_pool,
+                        markdown_executor=_markdown_executor,
+                    ))
+                else:
+                    asyncio.run(run(**funnel))
+            except (asyncio.CancelledError, concurrent.futures.CancelledError):
+                return {'status': 'cancelled', 'project_id': project_id}
+
+            # The project may have been cancelled while the last step ran
+            db.session.refresh(project)
+            if project.status == 'cancelled':
+                return {'status': 'cancelled', 'project_id': project_id}
 
             # Use project_dir as run_dir (scraper will write directly there)
             run_dir = project_dir
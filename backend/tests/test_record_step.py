@@ -0,0 +1,48 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+
+@pytest.fixture
+def tasks(tmp_path, monkeypatch):
+    # Point the worker's app at a throwaway database before it is imported
+    monkeypatch.setenv('DATABASE_PATH', str(tmp_path / 'test.db'))
+    sys.modules.pop('tasks', None)
+    import tasks as tasks_module
+
+    tasks_module.app.config['UPLOAD_FOLDER'] = str(tmp_path / 'uploads')
+    monkeypatch.setattr(tasks_module, 'send_progress_event', lambda *args, **kwargs: None)
+    with tasks_module.app.app_context():
+        tasks_module.db.create_all()
+    return tasks_module
+
+
+def test_tiled_step_keeps_tile_directory(tasks):
+    from models import User, Project, Screenshot
+
+    with tasks.app.app_context():
+        user = User(username='tester', password_hash='x')
+        tasks.db.session.add(user)
+        tasks.db.session.commit()
+        project = Project(user_id=user.id, url='https://example.com', status='processing')
+        tasks.db.session.add(project)
+        tasks.db.session.commit()
+        project_id = project.id
+
+    project_dir = os.path.join(tasks.app.config['UPLOAD_FOLDER'], f'project_{project_id}')
+    assert tasks._record_step(project_id, {
+        'step': 3,
+        'url': 'https://example.com/quiz',
+        'screenshot_path': os.path.join(project_dir, 'step_3_tiles', 'tile_000.png'),
+        'html_path': os.path.join(project_dir, 'step_3.html'),
+        'markdown_content': '# Quiz',
+        'action_desc': "clicked element with text 'Next'",
+    })
+
+    with tasks.app.app_context():
+        screenshot = Screenshot.query.filter_by(project_id=project_id, step_number=3).one()
+        assert screenshot.screenshot_path == f'project_{project_id}/step_3_tiles/tile_000.png'
+        assert screenshot.html_path == f'project_{project_id}/step_3.html'
@@ -7,6 +7,11 @@ const API_URL = USE_PROD
   ? 'https://b.hugmediary.com'
   : (process.env.REACT_APP_API_URL || 'http://localhost:5000');
 
+// Live project events (SSE). Production builds are served by nginx, which proxies
+// the events path on the same origin to the SSE gateway (docker-compose `events`)
+const EVENTS_URL = process.env.REACT_APP_EVENTS_URL
+  ?? (process.env.NODE_ENV === 'production' ? '' : (process.env.REACT_APP_API_URL || API_URL));
+
 const api = axios.create({
   baseURL: `${API_URL}/api`,
   headers: {
@@ -43,16 +48,27 @@ export const register = (username, password) => {
   return api.post('/auth/register', { username, password });
 };
 
-export const getProjects = () => {
-  return api.get('/projects');
+// One page of projects, newest first: { projects, next_cursor }
+// params: { limit, cursor, status }
+export const getProjects = (params = {}) => {
+  return api.get('/projects', { params });
+};
+
+// Projects changed and ids deleted since a cursor: { projects, deleted, cursor, has_more }
+export const getProjectChanges = (since) => {
+  return api.get('/projects/changes', { params: { since } });
 };
 
 export const createProject = (url) => {
   return api.post('/projects', { url });
 };
 
-export const getProject = (id) => {
-  return api.get(`/projects/${id}`);
+export const getProjectEventsUrl = (id, token) =>
+  `${EVENTS_URL}/api/projects/${id}/events?token=${token}`;
+
+// params: { after_step } to only get the steps after a step number
+export const getProject = (id, params = {}) => {
+  return api.get(`/projects/${id}`, { params });
 };
 
 export const getScreenshotImage = (screenshotPath) => {
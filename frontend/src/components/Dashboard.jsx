@@ -1,6 +1,7 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { getProjects, createProject, getCurrentUser } from '../api';
+import { getProjects, getProjectChanges, createProject, getCurrentUser } from '../api';
+import { isOlder, mergeProjectChanges } from '../utils/projects';
 import { Button } from './ui/button';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from './ui/card';
 import { Badge } from './ui/badge';
@@ -9,20 +10,27 @@ import { Alert, AlertDescription } from './ui/alert';
 import { Dialog, DialogContent, DialogDescription, DialogFooter, DialogHeader, DialogTitle } from './ui/dialog';
 import { AlertCircle, Plus } from 'lucide-react';
 
+const PAGE_SIZE = 24;
+
 function Dashboard({ onLogout, token }) {
   const navigate = useNavigate();
   const [projects, setProjects] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  // Set once older pages were appended with "Load more"
+  const loadedMore = useRef(false);
   const [url, setUrl] = useState('');
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
   const [credits, setCredits] = useState(1);
   const [isAdmin, setIsAdmin] = useState(false);
   const [showPaymentModal, setShowPaymentModal] = useState(false);
+  const changesCursor = useRef(null);
 
   useEffect(() => {
     loadProjects();
     loadUserInfo();
-    const interval = setInterval(loadProjects, 5000);
+    const interval = setInterval(loadChanges, 5000);
     return () => clearInterval(interval);
   }, []);
 
@@ -38,13 +46,62 @@ function Dashboard({ onLogout, token }) {
 
   const loadProjects = async () => {
     try {
-      const response = await getProjects();
-      setProjects(response.data);
+      const response = await getProjects({ limit: PAGE_SIZE });
+      const page = response.data.projects;
+      changesCursor.current = response.data.changes_cursor;
+      if (!loadedMore.current) {
+        setProjects(page);
+        setNextCursor(response.data.next_cursor);
+        return;
+      }
+      // Refresh the first page, keep the older pages already loaded
+      const last = page[page.length - 1];
+      setProjects((prev) => {
+        const ids = new Set(page.map((p) => p.id));
+        const older = last ? prev.filter((p) => !ids.has(p.id) && isOlder(p, last)) : [];
+        return [...page, ...older];
+      });
     } catch (err) {
       console.error('Failed to load projects', err);
     }
   };
 
+  const loadChanges = async () => {
+    if (!changesCursor.current) return;
+    try {
+      let hasMore = true;
+      while (hasMore) {
+        const response = await getProjectChanges(changesCursor.current);
+        const { projects: changed, deleted = [] } = response.data;
+        changesCursor.current = response.data.cursor;
+        hasMore = response.data.has_more;
+        if (changed.length || deleted.length) {
+          setProjects((prev) => mergeProjectChanges(prev, changed, deleted));
+        }
+      }
+    } catch (err) {
+      console.error('Failed to load project changes', err);
+    }
+  };
+
+  const loadMoreProjects = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const response = await getProjects({ limit: PAGE_SIZE, cursor: nextCursor });
+      setProjects((prev) => {
+        const ids = new Set(prev.map((p) => p.id));
+        return [...prev, ...response.data.projects.filter((p) => !ids.has(p.id))];
+      });
+      setNextCursor(response.data.next_cursor);
+      loadedMore.current = true;
+    } catch (err) {
+      console.error('Failed to load more projects', err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleSubmit = async (e) => {
     e.preventDefault();
     setError('');
@@ -227,6 +284,14 @@ function Dashboard({ onLogout, token }) {
             ))}
           </div>
         )}
+
+        {nextCursor && (
+          <div className="mt-6 flex justify-center">
+            <Button variant="outline" onClick={loadMoreProjects} disabled={loadingMore}>
+              {loadingMore ? 'Loading...' : 'Load more'}
+            </Button>
+          </div>
+        )}
       </main>
 
       {/* Payment Modal */}
@@ -1,6 +1,7 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useNavigate } from 'react-router-dom';
-import { getProjects, createProject, getCurrentUser, getScreenshotImage } from '../api';
+import { getProjects, getProjectChanges, createProject, getCurrentUser, getScreenshotImage } from '../api';
+import { isOlder, mergeProjectChanges } from '../utils/projects';
 import { ThemeToggle } from './ThemeToggle';
 import { updatePageMeta } from '../utils/seo';
 import { useToast } from '../hooks/use-toast';
@@ -15,10 +16,18 @@ import {
   Coins
 } from 'lucide-react';
 
+const PAGE_SIZE = 24;
+
 function DashboardNew({ onLogout, token }) {
   const navigate = useNavigate();
   const { toast } = useToast();
   const [projects, setProjects] = useState([]);
+  const [nextCursor, setNextCursor] = useState(null);
+  const [loadingMore, setLoadingMore] = useState(false);
+  // Set once older pages were appended with "Load more"
+  const loadedMore = useRef(false);
+  // Position in the change feed; the list only receives projects changed since
+  const changesCursor = useRef(null);
   const [url, setUrl] = useState('');
   const [loading, setLoading] = useState(false);
   const [error, setError] = useState('');
@@ -39,7 +48,7 @@ function DashboardNew({ onLogout, token }) {
   useEffect(() => {
     loadProjects();
     loadUserInfo();
-    const interval = setInterval(loadProjects, 5000);
+    const interval = setInterval(loadChanges, 5000);
     return () => clearInterval(interval);
     // eslint-disable-next-line
   }, []);
@@ -60,8 +69,21 @@ function DashboardNew({ onLogout, token }) {
 
   const loadProjects = async () => {
     try {
-      const response = await getProjects();
-      setProjects(response.data);
+      const response = await getProjects({ limit: PAGE_SIZE });
+      const page = response.data.projects;
+      changesCursor.current = response.data.changes_cursor;
+      if (!loadedMore.current) {
+        setProjects(page);
+        setNextCursor(response.data.next_cursor);
+        return;
+      }
+      // Refresh the first page, keep the older pages already loaded
+      const last = page[page.length - 1];
+      setProjects((prev) => {
+        const ids = new Set(page.map((p) => p.id));
+        const older = last ? prev.filter((p) => !ids.has(p.id) && isOlder(p, last)) : [];
+        return [...page, ...older];
+      });
     } catch (err) {
       console.error('Failed to load projects', err);
       // Redirect to login if user is not authenticated
@@ -70,6 +92,42 @@ function DashboardNew({ onLogout, token }) {
     }
   };
 
+  const loadChanges = async () => {
+    if (!changesCursor.current) return;
+    try {
+      let hasMore = true;
+      while (hasMore) {
+        const response = await getProjectChanges(changesCursor.current);
+        const { projects: changed, deleted = [] } = response.data;
+        changesCursor.current = response.data.cursor;
+        hasMore = response.data.has_more;
+        if (changed.length || deleted.length) {
+          setProjects((prev) => mergeProjectChanges(prev, changed, deleted));
+        }
+      }
+    } catch (err) {
+      console.error('Failed to load project changes', err);
+    }
+  };
+
+  const loadMoreProjects = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const response = await getProjects({ limit: PAGE_SIZE, cursor: nextCursor });
+      setProjects((prev) => {
+        const ids = new Set(prev.map((p) => p.id));
+        return [...prev, ...response.data.projects.filter((p) => !ids.has(p.id))];
+      });
+      setNextCursor(response.data.next_cursor);
+      loadedMore.current = true;
+    } catch (err) {
+      console.error('Failed to load more projects', err);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
   const handleSubmit = async (e) => {
     e.preventDefault();
     setError('');
@@ -131,8 +189,8 @@ function DashboardNew({ onLogout, token }) {
   };
 
   const getFirstScreenshot = (project) => {
-    if (project.screenshots && project.screenshots.length > 0) {
-      return getScreenshotImage(project.screenshots[0].screenshot_path);
+    if (project.cover) {
+      return getScreenshotImage(project.cover.screenshot_path);
     }
     return null;
   };
@@ -367,6 +425,18 @@ function DashboardNew({ onLogout, token }) {
               })}
             </div>
           )}
+
+          {nextCursor && (
+            <div className="flex justify-center mt-8">
+              <button
+                onClick={loadMoreProjects}
+                disabled={loadingMore}
+                className="bg-muted border border-border text-foreground px-6 py-3 rounded-lg font-semibold cursor-pointer transition-colors hover:border-muted-foreground/50 disabled:opacity-50 disabled:cursor-not-allowed"
+              >
+                {loadingMore ? 'Loading...' : 'Load more'}
+              </button>
+            </div>
+          )}
         </section>
       </div>
     </div>
@@ -1,6 +1,8 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
-import { getProject, getScreenshotImage, togglePublic, cancelProject } from '../api';
+import { getProject, getProjectEventsUrl, getScreenshotImage, togglePublic, cancelProject } from '../api';
+import { EVENT_VERSION, TERMINAL_STATUSES, lastStepNumber, applyScreenshotEvent, applyProjectDelta, missedSteps } from '../utils/projects';
+import { ScreenshotImage } from './ScreenshotImage';
 import { Button } from './ui/button';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from './ui/card';
 import { Badge } from './ui/badge';
@@ -26,6 +28,9 @@ function ProjectDetail({ token, onLogout }) {
   const { id } = useParams();
   const navigate = useNavigate();
   const [project, setProject] = useState(null);
+  // Latest project for the event handlers (the effect closure sees a stale one)
+  const projectRef = useRef(null);
+  projectRef.current = project;
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
   const [lightboxIndex, setLightboxIndex] = useState(null);
@@ -39,18 +44,32 @@ function ProjectDetail({ token, onLogout }) {
     if (!token) return;
 
     const eventSource = new EventSource(
-      `${process.env.REACT_APP_API_URL || 'https://b.hugmediary.com'}/api/projects/${id}/events?token=${token}`
+      getProjectEventsUrl(id, token)
     );
 
     eventSource.onmessage = (event) => {
       try {
         const data = JSON.parse(event.data);
-        if (data.type === 'screenshot_added') {
-          loadProject();
+        if (data.type === 'connected') {
+          // (Re)connected: fetch whatever was published while away
+          if (projectRef.current) loadMissedSteps();
+        } else if (data.type === 'screenshot_added') {
+          if (data.v !== EVENT_VERSION || !data.data.screenshot) {
+            loadProject();
+            return;
+          }
+          // Steps arrive complete: append, and only catch up on a gap
+          const current = projectRef.current;
+          setProject(prev => prev ? applyScreenshotEvent(prev, data.data) : prev);
+          if (current && missedSteps(current, data.data)) {
+            loadMissedSteps(lastStepNumber(current));
+          }
         } else if (data.type === 'status_changed') {
           setProject(prev => prev ? {...prev, status: data.data.status} : null);
-          if (data.data.status === 'completed' || data.data.status === 'failed') {
-            loadProject();
+          if (TERMINAL_STATUSES.includes(data.data.status)) {
+            // Final status, files and any step not seen yet; the stream ends here
+            eventSource.close();
+            loadMissedSteps();
           }
         }
       } catch (e) {
@@ -58,21 +77,25 @@ function ProjectDetail({ token, onLogout }) {
       }
     };
 
-    eventSource.onerror = () => {
-      eventSource.close();
-    };
-
-    const interval = setInterval(() => {
-      if (project?.status === 'processing' || project?.status === 'queued') {
-        loadProject();
-      }
-    }, 10000);
+    // No onerror handling: EventSource reconnects by itself and the server
+    // replays everything after the Last-Event-ID it sends
 
     return () => {
       eventSource.close();
-      clearInterval(interval);
     };
-  }, [id, project?.status]);
+  }, [id]);
+
+  // Only the steps after the last one shown (or after `afterStep`)
+  const loadMissedSteps = async (afterStep) => {
+    if (!projectRef.current) return;
+    try {
+      const step = afterStep === undefined ? lastStepNumber(projectRef.current) : afterStep;
+      const response = await getProject(id, { after_step: step });
+      setProject(prev => prev ? applyProjectDelta(prev, response.data) : response.data);
+    } catch (err) {
+      console.error('Failed to load missed steps', err);
+    }
+  };
 
   const loadProject = async () => {
     try {
@@ -400,9 +423,12 @@ function ProjectDetail({ token, onLogout }) {
                 size="sm"
                 onClick={async (e) => {
                   e.stopPropagation();
+                  const screenshot = project.screenshots[lightboxIndex];
+                  // Screenshots may be PNG, JPEG or WebP depending on the capture profile
+                  const ext = screenshot.screenshot_path.split('.').pop() || 'png';
                   const link = document.createElement('a');
-                  link.href = getScreenshotImage(project.screenshots[lightboxIndex].screenshot_path);
-                  link.download = `step_${project.screenshots[lightboxIndex].step_number}.png`;
+                  link.href = getScreenshotImage(screenshot.screenshot_path);
+                  link.download = `step_${screenshot.step_number}.${ext}`;
                   link.click();
                 }}
               >
@@ -475,10 +501,10 @@ function ProjectDetail({ token, onLogout }) {
               </Button>
             )}
 
-            <img
-              src={getScreenshotImage(project.screenshots[lightboxIndex].screenshot_path)}
+            <ScreenshotImage
+              screenshotPath={project.screenshots[lightboxIndex].screenshot_path}
               alt={`Step ${project.screenshots[lightboxIndex].step_number}`}
-              className="max-h-full w-full max-w-md rounded-lg object-contain shadow-lg"
+              className="max-h-full w-full max-w-md overflow-y-auto rounded-lg object-contain shadow-lg"
             />
 
             {lightboxIndex < project.screenshots.length - 1 && (
@@ -1,6 +1,8 @@
-import React, { useState, useEffect } from 'react';
+import React, { useState, useEffect, useRef } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
-import { getProject, getScreenshotImage, togglePublic, cancelProject, deleteProject, getCurrentUser, duplicateProject, updateProject } from '../api';
+import { getProject, getProjectEventsUrl, getScreenshotImage, togglePublic, cancelProject, deleteProject, getCurrentUser, duplicateProject, updateProject } from '../api';
+import { EVENT_VERSION, TERMINAL_STATUSES, lastStepNumber, applyScreenshotEvent, applyProjectDelta, missedSteps } from '../utils/projects';
+import { ScreenshotImage } from './ScreenshotImage';
 import { Badge } from './ui/badge';
 import { Alert, AlertDescription } from './ui/alert';
 import { Skeleton } from './ui/skeleton';
@@ -37,6 +39,9 @@ function ProjectDetailNew({ token, onLogout }) {
   const navigate = useNavigate();
   const { toast } = useToast();
   const [project, setProject] = useState(null);
+  // Latest project for the event handlers (the effect closure sees a stale one)
+  const projectRef = useRef(null);
+  projectRef.current = project;
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState('');
   const [lightboxIndex, setLightboxIndex] = useState(null);
@@ -76,18 +81,32 @@ function ProjectDetailNew({ token, onLogout }) {
     if (!token) return;
 
     const eventSource = new EventSource(
-      `${process.env.REACT_APP_API_URL || 'https://b.hugmediary.com'}/api/projects/${id}/events?token=${token}`
+      getProjectEventsUrl(id, token)
     );
 
     eventSource.onmessage = (event) => {
       try {
         const data = JSON.parse(event.data);
-        if (data.type === 'screenshot_added') {
-          loadProject();
+        if (data.type === 'connected') {
+          // (Re)connected: fetch whatever was published while away
+          if (projectRef.current) loadMissedSteps();
+        } else if (data.type === 'screenshot_added') {
+          if (data.v !== EVENT_VERSION || !data.data.screenshot) {
+            loadProject();
+            return;
+          }
+          // Steps arrive complete: append, and only catch up on a gap
+          const current = projectRef.current;
+          setProject(prev => prev ? applyScreenshotEvent(prev, data.data) : prev);
+          if (current && missedSteps(current, data.data)) {
+            loadMissedSteps(lastStepNumber(current));
+          }
         } else if (data.type === 'status_changed') {
           setProject(prev => prev ? {...prev, status: data.data.status} : null);
-          if (data.data.status === 'completed' || data.data.status === 'failed') {
-            loadProject();
+          if (TERMINAL_STATUSES.includes(data.data.status)) {
+            // Final status, files and any step not seen yet; the stream ends here
+            eventSource.close();
+            loadMissedSteps();
           }
         } else if (data.type === 'progress') {
           // Add progress message to log (keep last 10 messages)
@@ -102,22 +121,14 @@ function ProjectDetailNew({ token, onLogout }) {
       }
     };
 
-    eventSource.onerror = () => {
-      eventSource.close();
-    };
-
-    const interval = setInterval(() => {
-      if (project?.status === 'processing' || project?.status === 'queued') {
-        loadProject();
-      }
-    }, 10000);
+    // No onerror handling: EventSource reconnects by itself and the server
+    // replays everything after the Last-Event-ID it sends
 
     return () => {
       eventSource.close();
-      clearInterval(interval);
     };
     // eslint-disable-next-line
-  }, [id, project?.status]);
+  }, [id]);
 
   useEffect(() => {
     const handleScroll = () => {
@@ -162,6 +173,18 @@ function ProjectDetailNew({ token, onLogout }) {
     }
   };
 
+  // Only the steps after the last one shown (or after `afterStep`)
+  const loadMissedSteps = async (afterStep) => {
+    if (!projectRef.current) return;
+    try {
+      const step = afterStep === undefined ? lastStepNumber(projectRef.current) : afterStep;
+      const response = await getProject(id, { after_step: step });
+      setProject(prev => prev ? applyProjectDelta(prev, response.data) : response.data);
+    } catch (err) {
+      console.error('Failed to load missed steps', err);
+    }
+  };
+
   const loadProject = async () => {
     try {
       const response = await getProject(id);
@@ -366,7 +389,9 @@ function ProjectDetailNew({ token, onLogout }) {
       const url = window.URL.createObjectURL(blob);
       const a = document.createElement('a');
       a.href = url;
-      a.download = `screen-${step}.png`;
+      // Screenshots may be PNG, JPEG or WebP depending on the capture profile
+      const ext = (blob.type.split('/')[1] || 'png').replace('jpeg', 'jpg');
+      a.download = `screen-${step}.${ext}`;
       a.click();
       window.URL.revokeObjectURL(url);
       toast({
@@ -954,10 +979,10 @@ function ProjectDetailNew({ token, onLogout }) {
               {/* Scrollable Image Container */}
               <ScrollArea className="flex-1 h-full">
                 <div className="flex justify-center items-start py-8 px-4 md:px-0 min-h-full">
-                  <img
-                    src={getScreenshotImage(screenshots[lightboxIndex].screenshot_path)}
+                  <ScreenshotImage
+                    screenshotPath={screenshots[lightboxIndex].screenshot_path}
                     alt={`Screen ${screenshots[lightboxIndex].step_number}`}
-                    className="w-full md:w-[280px] md:min-w-[280px] h-auto rounded-xl md:rounded-[20px] border border-border"
+                    className="w-full md:w-[280px] md:min-w-[280px] h-auto rounded-xl md:rounded-[20px] border border-border overflow-hidden"
                     style={{ flexShrink: 0 }}
                   />
                 </div>
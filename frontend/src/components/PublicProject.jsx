@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { useParams } from 'react-router-dom';
 import { getPublicProject, getScreenshotImage } from '../api';
+import { ScreenshotImage } from './ScreenshotImage';
 import { Button } from './ui/button';
 import { Card, CardContent, CardDescription, CardHeader, CardTitle } from './ui/card';
 import { Badge } from './ui/badge';
@@ -252,10 +253,10 @@ function PublicProject() {
               </Button>
             )}
 
-            <img
-              src={getScreenshotImage(project.screenshots[lightboxIndex].screenshot_path)}
+            <ScreenshotImage
+              screenshotPath={project.screenshots[lightboxIndex].screenshot_path}
               alt={`Step ${project.screenshots[lightboxIndex].step_number}`}
-              className="max-h-full w-full max-w-md rounded-lg object-contain shadow-lg"
+              className="max-h-full w-full max-w-md overflow-y-auto rounded-lg object-contain shadow-lg"
             />
 
             {lightboxIndex < project.screenshots.length - 1 && (
@@ -1,6 +1,7 @@
 import React, { useState, useEffect } from 'react';
 import { useParams, useNavigate } from 'react-router-dom';
 import { getPublicProject, getScreenshotImage, getCurrentUser } from '../api';
+import { ScreenshotImage } from './ScreenshotImage';
 import { Button } from './ui/button';
 import { Badge } from './ui/badge';
 import { Alert, AlertDescription } from './ui/alert';
@@ -143,7 +144,9 @@ function PublicProjectNew() {
       const url = window.URL.createObjectURL(blob);
       const a = document.createElement('a');
       a.href = url;
-      a.download = `screen-${step}.png`;
+      // Screenshots may be PNG, JPEG or WebP depending on the capture profile
+      const ext = (blob.type.split('/')[1] || 'png').replace('jpeg', 'jpg');
+      a.download = `screen-${step}.${ext}`;
       a.click();
       window.URL.revokeObjectURL(url);
     } catch (err) {
@@ -505,10 +508,10 @@ function PublicProjectNew() {
               {/* Scrollable Image Container */}
               <ScrollArea className="flex-1 h-full">
                 <div className="flex justify-center items-start py-8 px-4 md:px-0 min-h-full">
-                  <img
-                    src={getScreenshotImage(screenshots[lightboxIndex].screenshot_path)}
+                  <ScreenshotImage
+                    screenshotPath={screenshots[lightboxIndex].screenshot_path}
                     alt={`Screen ${screenshots[lightboxIndex].step_number}`}
-                    className="w-full md:w-[280px] md:min-w-[280px] h-auto rounded-xl md:rounded-[20px] border border-border"
+                    className="w-full md:w-[280px] md:min-w-[280px] h-auto rounded-xl md:rounded-[20px] border border-border overflow-hidden"
                     style={{ flexShrink: 0 }}
                   />
                 </div>
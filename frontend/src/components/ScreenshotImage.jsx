@@ -0,0 +1,43 @@
+import React, { useState, useEffect } from 'react';
+import { getScreenshotImage } from '../api';
+
+// Very tall pages are captured as tiles: screenshot_path then points at the
+// first tile of a "step_N_tiles/" directory whose manifest.json lists them all
+const isTiled = (screenshotPath) => /_tiles\//.test(screenshotPath || '');
+
+export function ScreenshotImage({ screenshotPath, alt, className, style }) {
+  const [tiles, setTiles] = useState(null);
+
+  useEffect(() => {
+    if (!isTiled(screenshotPath)) {
+      setTiles(null);
+      return;
+    }
+    let cancelled = false;
+    const dir = screenshotPath.slice(0, screenshotPath.lastIndexOf('/'));
+    fetch(getScreenshotImage(`${dir}/manifest.json`))
+      .then((response) => (response.ok ? response.json() : null))
+      .then((manifest) => {
+        if (!cancelled && manifest) {
+          setTiles(manifest.tiles.map((tile) => getScreenshotImage(`${dir}/${tile.file}`)));
+        }
+      })
+      .catch((err) => console.error('Failed to load tile manifest:', err));
+    return () => {
+      cancelled = true;
+    };
+  }, [screenshotPath]);
+
+  if (!tiles) {
+    // Plain capture, or the first tile while the manifest loads
+    return <img src={getScreenshotImage(screenshotPath)} alt={alt} className={className} style={style} />;
+  }
+
+  return (
+    <div className={className} style={style}>
+      {tiles.map((src, index) => (
+        <img key={src} src={src} alt={index === 0 ? alt : ''} className="block w-full h-auto" loading="lazy" />
+      ))}
+    </div>
+  );
+}
@@ -0,0 +1,57 @@
+// Keyset order of the project list: newest first, ties broken by id
+export const isOlder = (a, b) => a.created_at < b.created_at || (a.created_at === b.created_at && a.id < b.id);
+
+// Apply projects from GET /api/projects/changes to the loaded list: known
+// projects are replaced, new ones are added when they fall within the loaded
+// pages (older ones arrive with "Load more"), deleted ones are dropped
+export const mergeProjectChanges = (projects, changed, deleted = []) => {
+  const last = projects[projects.length - 1];
+  const byId = new Map(projects.map((p) => [p.id, p]));
+  changed.forEach((p) => {
+    if (byId.has(p.id) || !last || !isOlder(p, last)) {
+      byId.set(p.id, p);
+    }
+  });
+  deleted.forEach((id) => byId.delete(id));
+  return Array.from(byId.values()).sort((a, b) => (isOlder(a, b) ? 1 : -1));
+};
+
+// Version of the event payloads this client understands (EVENT_VERSION in backend/tasks.py)
+export const EVENT_VERSION = 1;
+
+// Statuses after which the event stream ends
+export const TERMINAL_STATUSES = ['completed', 'failed', 'cancelled'];
+
+const byStep = (a, b) => a.step_number - b.step_number;
+
+// Highest step already shown, for GET /api/projects/:id?after_step=
+export const lastStepNumber = (project) => {
+  const steps = project?.screenshots || [];
+  return steps.length ? steps[steps.length - 1].step_number : -1;
+};
+
+// Add steps to a project, replacing the ones it already has, in step order
+export const mergeSteps = (project, screenshots) => {
+  const byNumber = new Map((project.screenshots || []).map((s) => [s.step_number, s]));
+  screenshots.forEach((s) => byNumber.set(s.step_number, s));
+  return { ...project, screenshots: Array.from(byNumber.values()).sort(byStep) };
+};
+
+// Apply a screenshot_added event (complete step plus project metadata)
+export const applyScreenshotEvent = (project, data) => ({
+  ...mergeSteps(project, [data.screenshot]),
+  ...data.project,
+  screenshot_count: data.screenshot_count,
+});
+
+// Apply an after_step response: project fields as returned, steps merged
+export const applyProjectDelta = (project, delta) => {
+  const { screenshots, ...fields } = delta;
+  return mergeSteps({ ...project, ...fields }, screenshots);
+};
+
+// True when a screenshot_added event shows steps were missed before it
+export const missedSteps = (project, data) => {
+  const known = (project?.screenshots || []).length;
+  return data.screenshot_count > known + 1;
+};
@@ -0,0 +1,92 @@
+import asyncio
+import glob
+import os
+import statistics
+import sys
+import time
+
+# Add scraper root to path
+sys.path.append(os.path.abspath(os.path.join(os.path.dirname(__file__), '..', 'scraper')))
+
+from playwright.async_api import async_playwright
+from markdownify import markdownify as md
+from src.scraper import VISIBLE_HTML_JS
+
+# Previous implementation: clones the whole document and calls
+# getComputedStyle on every node of the detached clone.
+CLONE_VISIBLE_HTML_JS = """() => {
+    const clone = document.documentElement.cloneNode(true);
+
+    // Remove scripts, styles, and other non-visible elements
+    const toRemove = clone.querySelectorAll('script, style, noscript, svg, iframe, link, meta');
+    toRemove.forEach(el => el.remove());
+
+    // Remove hidden elements (simple check)
+    const allElements = clone.querySelectorAll('*');
+    allElements.forEach(el => {
+        const style = window.getComputedStyle(el);
+        if (style.display === 'none' || style.visibility === 'hidden' || style.opacity === '0') {
+            el.remove();
+        }
+    });
+
+    return clone.outerHTML;
+}"""
+
+ROUNDS = 20
+
+
+async def measure(page, script):
+    """Run an extraction script ROUNDS times.
+    Returns the median in-page time, the median time including the CDP transfer
+    and the extracted HTML.
+    """
+    in_page, total = [], []
+    html = ''
+    for _ in range(ROUNDS):
+        started = time.perf_counter()
+        result = await page.evaluate(
+            "(source) => { const t0 = performance.now(); const html = eval(source)(); "
+            "return { html: html, ms: performance.now() - t0 }; }",
+            script,
+        )
+        total.append((time.perf_counter() - started) * 1000)
+        in_page.append(result['ms'])
+        html = result['html']
+    return statistics.median(in_page), statistics.median(total), html
+
+
+async def benchmark(fixtures_dir):
+    fixtures = sorted(glob.glob(os.path.join(fixtures_dir, 'step_*.html')))
+    if not fixtures:
+        print(f"No step_*.html fixtures found in {fixtures_dir}")
+        return
+
+    async with async_playwright() as p:
+        browser = await p.chromium.launch(headless=True)
+        page = await browser.new_page(viewport={'width': 430, 'height': 932})
+        # Scripts are not needed to lay out a saved page and would mutate it
+        await page.route('**/*.js', lambda route: route.abort())
+
+        print(f"{'fixture':<24} {'clone ms':>9} {'walker ms':>10} {'clone KB':>9} {'walker KB':>10} {'md chars (clone / walker)':>26}")
+        for path in fixtures:
+            await page.goto(f"file://{os.path.abspath(path)}", wait_until='load')
+
+            clone_ms, clone_total, clone_html = await measure(page, CLONE_VISIBLE_HTML_JS)
+            walker_ms, walker_total, walker_html = await measure(page, VISIBLE_HTML_JS)
+            clone_md = md(clone_html, heading_style="ATX", strip=['script', 'style'])
+            walker_md = md(walker_html, heading_style="ATX", strip=['script', 'style'])
+
+            print(
+                f"{os.path.basename(path):<24} {clone_ms:>9.1f} {walker_ms:>10.1f} "
+                f"{len(clone_html) / 1024:>9.1f} {len(walker_html) / 1024:>10.1f} "
+                f"{len(clone_md):>12} / {len(walker_md):<11}"
+                f"(with transfer: {clone_total:.1f} / {walker_total:.1f} ms)"
+            )
+
+        await browser.close()
+
+
+if __name__ == "__main__":
+    # Usage: python helpers/benchmark_extraction.py <run dir with step_*.html>
+    asyncio.run(benchmark(sys.argv[1] if len(sys.argv) > 1 else "outputs"))
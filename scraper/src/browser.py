@@ -1,9 +1,16 @@
 import asyncio
 from playwright.async_api import async_playwright
 from .config import Config
+from .network import RequestRouter
+from .cache import AssetCache
 
 class Browser:
-    def __init__(self, config: Config, headless: bool = True, slow_mo: int = 0, keep_open: bool = False):
+    """Page in a fresh browser context. Launches its own Chromium, or, with a
+    pool (BrowserPool), leases a context from an already running browser, or,
+    in connect mode (config.browser_server_url), attaches to a browser server.
+    """
+
+    def __init__(self, config: Config, headless: bool = True, slow_mo: int = 0, keep_open: bool = False, funnel_url: str = None, pool=None):
         self.config = config
         self.headless = headless
         self.slow_mo = slow_mo
@@ -12,23 +19,56 @@ class Browser:
         self.browser = None
         self.context = None
         self.page = None
+        self.pool = pool
+        self.connect_url = None if pool else config.browser_server_url
+        self.router = RequestRouter(config.resource_blocking, funnel_url)
+        cache = config.asset_cache
+        self.asset_cache = (
+            AssetCache(cache['path'], max_bytes=cache['max_mb'] * 1024 * 1024)
+            if cache['enabled'] else None
+        )
 
     async def __aenter__(self):
-        self.playwright = await async_playwright().start()
-        self.browser = await self.playwright.chromium.launch(
-            headless=self.headless,
-            slow_mo=self.slow_mo  # milliseconds to slow down operations
-        )
-        self.context = await self.browser.new_context(
+        context_options = dict(
             viewport=self.config.viewport,
             user_agent=self.config.user_agent,
             device_scale_factor=3,
         )
+        if self.pool:
+            self.context = await self.pool.lease(**context_options)
+        elif self.connect_url:
+            self.playwright = await async_playwright().start()
+            self.browser = await self.playwright.chromium.connect_over_cdp(self.connect_url)
+            self.context = await self.browser.new_context(**context_options)
+        else:
+            self.playwright = await async_playwright().start()
+            self.browser = await self.playwright.chromium.launch(
+                headless=self.headless,
+                slow_mo=self.slow_mo  # milliseconds to slow down operations
+            )
+            self.context = await self.browser.new_context(**context_options)
+        # Handlers registered last run first: blocking rules, then the cache
+        if self.asset_cache:
+            await self.asset_cache.install(self.context)
+        await self.router.install(self.context)
         self.page = await self.context.new_page()
         return self.page
 
     async def __aexit__(self, exc_type, exc, tb):
-        await self.context.close()
+        if self.pool:
+            # The browser stays up for the next run
+            await self.pool.release(self.context)
+        else:
+            await self.context.close()
+        if self.asset_cache:
+            await self.asset_cache.save()
+        if self.pool:
+            return
+        if self.connect_url:
+            # Only disconnects: the browser server keeps running
+            await self.browser.close()
+            await self.playwright.stop()
+            return
         if not self.keep_open:
             await self.browser.close()
             await self.playwright.stop()
@@ -0,0 +1,240 @@
+import argparse
+import asyncio
+import itertools
+import json
+import re
+import time
+import aiohttp
+from aiohttp import web
+from playwright.async_api import async_playwright
+
+# Ids for messages the proxy itself sends upstream (far above client ids)
+OWN_ID_BASE = 1_000_000_000
+OWN_IDS = itertools.count(OWN_ID_BASE)
+
+# Id of a CDP reply, read without parsing the (possibly huge) payload
+REPLY_ID = re.compile(r'^\{"id":(\d+)')
+
+
+class BrowserServer:
+    """Runs one Chromium outside the scraping workers and proxies CDP
+    connections to it, so workers attach with Browser's connect mode
+    (BROWSER_SERVER_URL=ws://host:9300/ws) instead of launching their own.
+
+    * Tracks the browser contexts each connection creates and hides targets
+      of other connections' contexts from it.
+    * Rejects new contexts beyond max_contexts (admission limit).
+    * Disposes the contexts of a connection that goes away (crashed or
+      terminated worker); the browser itself keeps running.
+    * Serves live numbers on /metrics and /health.
+
+        python -m src.browser_server --port 9300 --max-contexts 20
+    """
+
+    def __init__(self, max_contexts: int = 20, debugging_port: int = 9222, headless: bool = True):
+        self.max_contexts = max_contexts
+        self.debugging_port = debugging_port
+        self.headless = headless
+        self.playwright = None
+        self.browser = None
+        self.connections = {}
+        self.owners = {}
+        self.started = time.time()
+        self.launches = 0
+        self.admitted = 0
+        self.rejected = 0
+        self.disposed_on_disconnect = 0
+        self.messages = 0
+
+    @property
+    def active_contexts(self) -> int:
+        return sum(len(conn["contexts"]) for conn in self.connections.values())
+
+    async def ensure_browser(self):
+        """Launch Chromium (again, if it died) with the debugging port open."""
+        if self.browser and self.browser.is_connected():
+            return
+        if self.playwright is None:
+            self.playwright = await async_playwright().start()
+        self.browser = await self.playwright.chromium.launch(
+            headless=self.headless,
+            args=[f"--remote-debugging-port={self.debugging_port}", "--remote-debugging-address=127.0.0.1"],
+        )
+        self.launches += 1
+        print(f"DEBUG: Browser server launched Chromium #{self.launches}")
+
+    async def _upstream_url(self, session: aiohttp.ClientSession) -> str:
+        await self.ensure_browser()
+        async with session.get(f"http://127.0.0.1:{self.debugging_port}/json/version") as response:
+            return (await response.json(content_type=None))["webSocketDebuggerUrl"]
+
+    def _reject(self, message: dict) -> str:
+        self.rejected += 1
+        return json.dumps({
+            "id": message["id"],
+            "error": {"code": -32000, "message": f"Browser server at capacity ({self.max_contexts} contexts)"},
+        })
+
+    async def handle_ws(self, request: web.Request) -> web.WebSocketResponse:
+        client = web.WebSocketResponse(max_msg_size=0)
+        await client.prepare(request)
+        conn = {"peer": request.remote, "contexts": set(), "pending": {}, "opened": time.time()}
+
+        async with aiohttp.ClientSession() as session:
+            try:
+                upstream = await session.ws_connect(await self._upstream_url(session), max_msg_size=0)
+            except Exception as e:
+                print(f"DEBUG: Browser connection failed: {e}")
+                await client.close()
+                return client
+            # Registered only once connected: /metrics never shows dead connections
+            self.connections[id(client)] = conn
+
+            async def client_to_browser():
+                async for msg in client:
+                    if msg.type != aiohttp.WSMsgType.TEXT:
+                        break
+                    self.messages += 1
+                    message = json.loads(msg.data)
+                    method = message.get("method")
+                    if method == "Target.createBrowserContext":
+                        if self.active_contexts + len(conn["pending"]) >= self.max_contexts:
+                            await client.send_str(self._reject(message))
+                            continue
+                        conn["pending"][message["id"]] = method
+                    elif method == "Target.disposeBrowserContext":
+                        context_id = message.get("params", {}).get("browserContextId")
+                        conn["contexts"].discard(context_id)
+                        self.owners.pop(context_id, None)
+                    elif method == "Browser.close":
+                        # The server owns the browser: a worker can only disconnect
+                        await client.send_str(json.dumps({"id": message["id"], "result": {}}))
+                        continue
+                    await upstream.send_str(msg.data)
+
+            async def browser_to_client():
+                async for msg in upstream:
+                    if msg.type != aiohttp.WSMsgType.TEXT:
+                        break
+                    self.messages += 1
+                    reply = REPLY_ID.match(msg.data)
+                    if reply:
+                        reply_id = int(reply.group(1))
+                        if reply_id >= OWN_ID_BASE:
+                            continue  # reply to the proxy's own request
+                        if reply_id in conn["pending"]:
+                            self._track_context(json.loads(msg.data), conn)
+                    elif '"Target.' in msg.data[:64]:
+                        if not await self._filter_target_event(json.loads(msg.data), conn, upstream):
+                            continue
+                    await client.send_str(msg.data)
+
+            pumps = [asyncio.create_task(client_to_browser()), asyncio.create_task(browser_to_client())]
+            try:
+                await asyncio.wait(pumps, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                for pump in pumps:
+                    pump.cancel()
+                # Contexts the worker did not close itself (crash, revoke, ...)
+                for context_id in list(conn["contexts"]):
+                    self.owners.pop(context_id, None)
+                    try:
+                        await upstream.send_str(json.dumps({
+                            "id": next(OWN_IDS),
+                            "method": "Target.disposeBrowserContext",
+                            "params": {"browserContextId": context_id},
+                        }))
+                        self.disposed_on_disconnect += 1
+                    except Exception:
+                        break
+                await upstream.close()
+                await client.close()
+                self.connections.pop(id(client), None)
+        return client
+
+    def _track_context(self, reply: dict, conn: dict):
+        """Record the context created by a Target.createBrowserContext reply."""
+        conn["pending"].pop(reply["id"], None)
+        context_id = reply.get("result", {}).get("browserContextId")
+        if context_id:
+            conn["contexts"].add(context_id)
+            self.owners[context_id] = conn
+            self.admitted += 1
+
+    async def _filter_target_event(self, message: dict, conn: dict, upstream) -> bool:
+        """False for events about targets in another connection's contexts."""
+        params = message.get("params", {})
+        target = params.get("targetInfo", {})
+        owner = self.owners.get(target.get("browserContextId"))
+        if owner is None or owner is conn:
+            return True
+        # Target of another connection's context: hide it, and let go of it
+        # right away so it is not kept waiting for this connection's debugger
+        if message.get("method") == "Target.attachedToTarget":
+            request = {"id": next(OWN_IDS), "method": "Target.detachFromTarget", "params": {"sessionId": params["sessionId"]}}
+            if message.get("sessionId"):
+                request["sessionId"] = message["sessionId"]
+            await upstream.send_str(json.dumps(request))
+        return False
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        return web.json_response({
+            "uptime_s": round(time.time() - self.started),
+            "browser_connected": bool(self.browser and self.browser.is_connected()),
+            "launches": self.launches,
+            "connections": len(self.connections),
+            "contexts": self.active_contexts,
+            "max_contexts": self.max_contexts,
+            "admitted": self.admitted,
+            "rejected": self.rejected,
+            "disposed_on_disconnect": self.disposed_on_disconnect,
+            "messages": self.messages,
+            "per_connection": [
+                {"peer": conn["peer"], "contexts": len(conn["contexts"]), "age_s": round(time.time() - conn["opened"])}
+                for conn in self.connections.values()
+            ],
+        })
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        try:
+            await self.ensure_browser()
+        except Exception as e:
+            return web.json_response({"status": "unhealthy", "error": str(e)}, status=503)
+        return web.json_response({"status": "healthy", "contexts": self.active_contexts})
+
+    async def on_startup(self, app: web.Application):
+        await self.ensure_browser()
+
+    async def on_cleanup(self, app: web.Application):
+        if self.browser:
+            await self.browser.close()
+        if self.playwright:
+            await self.playwright.stop()
+
+    def app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_get("/ws", self.handle_ws)
+        app.router.add_get("/metrics", self.handle_metrics)
+        app.router.add_get("/health", self.handle_health)
+        app.on_startup.append(self.on_startup)
+        app.on_cleanup.append(self.on_cleanup)
+        return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Shared Chromium for funnel workers")
+    parser.add_argument("--host", default="0.0.0.0", help="Interface to listen on")
+    parser.add_argument("--port", type=int, default=9300, help="Port for /ws, /metrics and /health")
+    parser.add_argument("--max-contexts", type=int, default=20, help="Concurrent browser contexts admitted")
+    parser.add_argument("--debugging-port", type=int, default=9222, help="Local Chromium remote debugging port")
+    parser.add_argument("--headed", action="store_true", help="Run the browser in headed mode (visible)")
+    args = parser.parse_args()
+
+    server = BrowserServer(
+        max_contexts=args.max_contexts, debugging_port=args.debugging_port, headless=not args.headed
+    )
+    web.run_app(server.app(), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
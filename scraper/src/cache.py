@@ -0,0 +1,271 @@
+import os
+import re
+import json
+import time
+import asyncio
+import hashlib
+import tempfile
+from email.utils import parsedate_to_datetime
+from playwright.async_api import BrowserContext, Route
+
+# Static assets only: XHR/fetch responses and HTML documents are never cached
+CACHEABLE_TYPES = {"stylesheet", "script", "image", "font"}
+
+# Hop-by-hop / encoding headers that no longer match the stored (decoded) body
+DROP_HEADERS = {"content-encoding", "content-length", "transfer-encoding", "connection"}
+
+# Store layout: <path>/<key[:2]>/<key> (body) and <key>.meta.json next to it
+META_SUFFIX = ".meta.json"
+TMP_PREFIX = ".tmp-"
+# Temp files older than this belong to a run that died mid-write
+STALE_TMP_S = 3600
+
+# Assets without explicit freshness stay fresh for 10% of their age, at most a day
+HEURISTIC_MAX_S = 24 * 3600
+
+
+class AssetCache:
+    """On-disk cache of static assets shared across funnel runs.
+    Installed as a context route handler. Entries are keyed by URL, kept
+    fresh according to Cache-Control / Expires, revalidated with ETag /
+    Last-Modified once stale. Private responses and responses that vary per
+    request (Vary, origin-specific CORS) are never stored. Each entry is a body file plus its own metadata
+    file, so concurrent runs never overwrite each other's entries; the body's
+    mtime records its last use. At the end of each run the store directory is
+    trimmed to max_bytes, least recently used first. All file I/O runs in
+    threads. Reports hit ratio and bytes saved per run.
+    """
+
+    MAX_AGE = re.compile(r"max-age=(\d+)")
+
+    def __init__(self, path: str, max_bytes: int = 500 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+        self.stored = 0
+        self.bytes_saved = 0
+        self.evicted = 0
+
+    @staticmethod
+    def _key(url: str) -> str:
+        return hashlib.sha256(url.encode("utf-8")).hexdigest()
+
+    def _body_path(self, key: str) -> str:
+        return os.path.join(self.path, key[:2], key)
+
+    def _meta_path(self, key: str) -> str:
+        return self._body_path(key) + META_SUFFIX
+
+    def _freshness(self, headers: dict) -> float:
+        """Seconds the response may be served without revalidation."""
+        cache_control = headers.get("cache-control", "")
+        if "no-cache" in cache_control:
+            return 0
+        match = self.MAX_AGE.search(cache_control)
+        if match:
+            return int(match.group(1))
+        try:
+            if "expires" in headers:
+                return parsedate_to_datetime(headers["expires"]).timestamp() - time.time()
+            if "last-modified" in headers:
+                age = time.time() - parsedate_to_datetime(headers["last-modified"]).timestamp()
+                return min(age / 10, HEURISTIC_MAX_S)
+        except (TypeError, ValueError):
+            pass
+        return 0
+
+    def _storable(self, status: int, headers: dict) -> bool:
+        cache_control = headers.get("cache-control", "")
+        if status != 200 or "no-store" in cache_control or "private" in cache_control:
+            return False
+        # Entries are keyed by URL alone: responses that differ per request
+        # headers or per requesting origin would be replayed to the wrong funnel
+        # (bodies are stored decoded, so Vary: Accept-Encoding is harmless)
+        vary = {v.strip().lower() for v in headers.get("vary", "").split(",") if v.strip()}
+        if vary - {"accept-encoding"}:
+            return False
+        if headers.get("access-control-allow-origin", "*") != "*":
+            return False
+        # Without freshness or validators an entry could never be reused
+        return self._freshness(headers) > 0 or "etag" in headers or "last-modified" in headers
+
+    @staticmethod
+    def _read(path: str) -> bytes:
+        with open(path, "rb") as f:
+            return f.read()
+
+    @staticmethod
+    def _write(path: str, data: bytes):
+        """Atomic write through a temp file of its own: runs may store the same key at once."""
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=TMP_PREFIX)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def _load(self, key: str) -> tuple:
+        """(entry, body) stored for a key, or (None, None)."""
+        try:
+            entry = json.loads(self._read(self._meta_path(key)))
+            body = self._read(self._body_path(key))
+        except (OSError, ValueError):
+            return None, None
+        return entry, body
+
+    def _save_entry(self, key: str, entry: dict, body: bytes = None):
+        """Write an entry (and its body, if new) and mark it as just used."""
+        if body is not None:
+            self._write(self._body_path(key), body)
+        else:
+            os.utime(self._body_path(key))
+        self._write(self._meta_path(key), json.dumps(entry).encode("utf-8"))
+
+    def _touch(self, key: str):
+        try:
+            os.utime(self._body_path(key))
+        except OSError:
+            pass
+
+    def _discard(self, key: str):
+        self._discard_path(self._meta_path(key))
+        self._discard_path(self._body_path(key))
+
+    async def _handle(self, route: Route):
+        request = route.request
+        if request.method != "GET" or request.resource_type not in CACHEABLE_TYPES:
+            await route.fallback()
+            return
+
+        key = self._key(request.url)
+        entry, body = await asyncio.to_thread(self._load, key)
+
+        if entry and entry["expires"] > time.time():
+            self.hits += 1
+            self.bytes_saved += len(body)
+            await asyncio.to_thread(self._touch, key)
+            await route.fulfill(status=200, headers=entry["headers"], body=body)
+            return
+
+        try:
+            headers = dict(request.headers)
+            if entry:
+                if "etag" in entry["headers"]:
+                    headers["if-none-match"] = entry["headers"]["etag"]
+                if "last-modified" in entry["headers"]:
+                    headers["if-modified-since"] = entry["headers"]["last-modified"]
+            response = await route.fetch(headers=headers)
+        except Exception:
+            await route.fallback()
+            return
+
+        if entry and response.status == 304:
+            self.revalidated += 1
+            self.bytes_saved += len(body)
+            fresh_headers = {**entry["headers"], **response.headers}
+            entry["expires"] = time.time() + self._freshness(fresh_headers)
+            try:
+                await asyncio.to_thread(self._save_entry, key, entry)
+            except OSError as e:
+                print(f"DEBUG: Could not update asset cache entry: {e}")
+            await route.fulfill(status=200, headers=entry["headers"], body=body)
+            return
+
+        self.misses += 1
+        try:
+            body = await response.body()
+        except Exception:
+            await route.fallback()
+            return
+        if self._storable(response.status, response.headers):
+            entry = {
+                "url": request.url,
+                "size": len(body),
+                "headers": {k: v for k, v in response.headers.items() if k not in DROP_HEADERS},
+                "expires": time.time() + self._freshness(response.headers),
+            }
+            try:
+                await asyncio.to_thread(self._save_entry, key, entry, body)
+                self.stored += 1
+            except OSError as e:
+                print(f"DEBUG: Could not store asset: {e}")
+        elif entry:
+            await asyncio.to_thread(self._discard, key)
+        await route.fulfill(
+            status=response.status,
+            headers={k: v for k, v in response.headers.items() if k not in DROP_HEADERS},
+            body=body,
+        )
+
+    async def install(self, context: BrowserContext):
+        """Serve static assets of the context from the cache."""
+        os.makedirs(self.path, exist_ok=True)
+        await context.route("**/*", self._handle)
+
+    def _evict(self):
+        """Trim the store to max_bytes, least recently used bodies first.
+        Scans the directory, so the entries of every run sharing it count.
+        """
+        entries = {}
+        total = 0
+        now = time.time()
+        for shard in os.scandir(self.path):
+            if not shard.is_dir():
+                continue
+            for item in os.scandir(shard.path):
+                try:
+                    stat = item.stat()
+                except OSError:
+                    continue
+                if item.name.startswith(TMP_PREFIX):
+                    # Left behind by a run that died mid-write
+                    if now - stat.st_mtime > STALE_TMP_S:
+                        self._discard_path(item.path)
+                    continue
+                total += stat.st_size
+                key = item.name[:-len(META_SUFFIX)] if item.name.endswith(META_SUFFIX) else item.name
+                # [last used, bytes]; metadata without a body goes first
+                record = entries.setdefault(key, [0, 0])
+                record[1] += stat.st_size
+                if key == item.name:
+                    record[0] = stat.st_mtime
+        for key, (_, size) in sorted(entries.items(), key=lambda item: item[1][0]):
+            if total <= self.max_bytes:
+                break
+            self._discard(key)
+            total -= size
+            self.evicted += 1
+
+    @staticmethod
+    def _discard_path(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    async def save(self):
+        """Evict down to max_bytes (the store is shared, so after any run)."""
+        try:
+            await asyncio.to_thread(self._evict)
+        except OSError as e:
+            print(f"DEBUG: Could not trim asset cache: {e}")
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.revalidated + self.misses
+        return {
+            "hits": self.hits,
+            "revalidated": self.revalidated,
+            "misses": self.misses,
+            "hit_ratio": round((self.hits + self.revalidated) / lookups, 3) if lookups else 0.0,
+            "bytes_saved": self.bytes_saved,
+            "stored": self.stored,
+            "evicted": self.evicted,
+        }
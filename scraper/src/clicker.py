@@ -1,13 +1,257 @@
 import random
+import time
 from playwright.async_api import Page
-from urllib.parse import urlparse, urljoin
+from .dom import REF_JS, resolve_ref
+from .cookies import CookieResolver
+
+# Scores every clickable candidate in a single round trip.
+# Takes the selector/keyword lists from Python and returns references to
+# deduplicated, visible, enabled, non-excluded elements in document order.
+CANDIDATES_JS = """(opts) => {""" + REF_JS + """
+    const seen = new Set();
+    const candidates = [];
+    const initDomain = opts.initialDomain.replace('www.', '');
+    const visited = new Set(opts.visitedUrls);
+
+    const isEnabled = (el) => {
+        if (el.hasAttribute('disabled') || el.getAttribute('aria-disabled') === 'true') return false;
+        return !(el.getAttribute('class') || '').toLowerCase().includes('disabled');
+    };
+    const textOf = (el) => ((el.innerText || el.value || '') + '').trim();
+    const isExcluded = (text, href) => {
+        if (!text) return true;  // empty buttons are usually icons/navigation
+        const textLower = text.toLowerCase();
+        const hrefLower = (href || '').toLowerCase();
+        return opts.excludePatterns.some(p => textLower.includes(p) || hrefLower.includes(p));
+    };
+    const isSameDomain = (href) => {
+        if (!href || href.startsWith('#') || href.startsWith('/')) return true;
+        if (!/^[a-z][a-z0-9+.-]*:\/\//i.test(href)) return true;  // relative link
+        try {
+            return new URL(href).host.replace('www.', '') === initDomain;
+        } catch (e) {
+            return false;
+        }
+    };
+    const collect = (selectors, kind) => {
+        for (const selector of selectors) {
+            let found;
+            try {
+                found = document.querySelectorAll(selector);
+            } catch (e) {
+                continue;
+            }
+            for (const el of found) {
+                if (seen.has(el)) continue;
+                seen.add(el);
+                if (!fsVisible(el)) continue;
+                const href = el.getAttribute('href');
+                if (kind === 'button' && !isEnabled(el)) continue;
+                const text = textOf(el);
+                if (isExcluded(text, href)) continue;
+                if (kind === 'link') {
+                    if (!isSameDomain(href)) continue;
+                    if (href && visited.has(new URL(href, location.href).href)) continue;
+                }
+                const textLower = text.toLowerCase();
+                const priority = kind === 'button' && opts.priorityKeywords.some(k => textLower.includes(k));
+                candidates.push({
+                    ref: fsRef(el),
+                    text: text.slice(0, 200),
+                    href: href,
+                    kind: priority ? 'priority' : kind,
+                });
+            }
+        }
+    };
+
+    collect(opts.buttonSelectors, 'button');
+    collect(opts.linkSelectors, 'link');
+    return candidates;
+}"""
+
+# Waits in-page for an enabled "Next"-style button. Rescans (coalesced per
+# burst of mutations) only when buttons change state or nodes are inserted,
+# and resolves the moment a priority candidate shows up or the budget runs
+# out. The last scan is returned so the caller never has to scan again.
+WAIT_PRIORITY_JS = """async (opts) => {
+    const scanCandidates = """ + CANDIDATES_JS + """;
+    let scans = 0;
+    let scanMs = 0;
+    const scan = () => {
+        const t0 = performance.now();
+        const list = scanCandidates(opts);
+        scans++;
+        scanMs += performance.now() - t0;
+        return list;
+    };
+    const hasPriority = (list) => list.some(c => c.kind === 'priority');
+    const started = performance.now();
+    const result = (list) => ({
+        candidates: list, scans: scans, scan_ms: scanMs, waited_ms: Math.round(performance.now() - started),
+    });
+
+    const first = scan();
+    if (hasPriority(first) || opts.budgetMs <= 0) return result(first);
+
+    return await new Promise(resolve => {
+        let done = false;
+        let scheduled = false;
+        const finish = (list) => {
+            if (done) return;
+            done = true;
+            observer.disconnect();
+            clearTimeout(timer);
+            resolve(result(list));
+        };
+        const observer = new MutationObserver(() => {
+            if (scheduled || done) return;
+            scheduled = true;
+            setTimeout(() => {
+                scheduled = false;
+                if (done) return;
+                const list = scan();
+                if (hasPriority(list)) finish(list);
+            }, 16);
+        });
+        observer.observe(document.documentElement, {
+            subtree: true, childList: true, characterData: true,
+            attributes: true, attributeFilter: ['disabled', 'aria-disabled', 'class', 'style', 'hidden'],
+        });
+        const timer = setTimeout(() => finish(scan()), opts.budgetMs);
+    });
+}"""
+
+# Collects a descriptor for every fillable form field in one round trip.
+# Also remembers which suggestion-like elements were already visible, so
+# SUGGESTION_JS only reacts to autocomplete lists that appear after filling.
+FIELDS_JS = """(opts) => {""" + REF_JS + """
+    const textTypes = ['text', 'email', 'tel', 'number', 'search', 'url', ''];
+    const fields = [];
+    const seen = new Set();
+
+    for (const selector of opts.inputSelectors) {
+        for (const el of document.querySelectorAll(selector)) {
+            if (seen.has(el)) continue;
+            seen.add(el);
+            const tag = el.tagName.toLowerCase();
+            if (tag !== 'input' && tag !== 'textarea') continue;
+            const type = (el.getAttribute('type') || '').toLowerCase();
+            if (tag === 'input' && !textTypes.includes(type)) continue;
+            if (el.value || !fsVisible(el)) continue;
+            fields.push({
+                ref: fsRef(el),
+                kind: 'text',
+                type: type || 'text',
+                placeholder: el.getAttribute('placeholder') || '',
+                name: el.getAttribute('name') || '',
+                testid: el.getAttribute('data-testid') || '',
+                autocomplete: el.hasAttribute('list') || el.getAttribute('role') === 'combobox'
+                    || ['list', 'both'].includes(el.getAttribute('aria-autocomplete')),
+            });
+        }
+    }
+
+    for (const el of document.querySelectorAll('select')) {
+        if (!fsVisible(el) || el.value) continue;
+        fields.push({
+            ref: fsRef(el),
+            kind: 'select',
+            name: el.getAttribute('name') || '',
+            id: el.getAttribute('id') || '',
+            options: el.options.length,
+        });
+    }
+
+    for (const el of document.querySelectorAll('input[type="checkbox"]')) {
+        if (!fsVisible(el) || el.checked) continue;
+        fields.push({
+            ref: fsRef(el),
+            kind: 'checkbox',
+            id: el.getAttribute('id') || '',
+            class: el.getAttribute('class') || '',
+        });
+    }
+
+    for (const el of document.querySelectorAll('input[type="radio"]')) {
+        fields.push({
+            ref: fsRef(el),
+            kind: 'radio',
+            name: el.getAttribute('name') || '',
+            value: el.getAttribute('value') || '',
+        });
+    }
+
+    const baseline = new WeakSet();
+    for (const selector of opts.suggestionSelectors) {
+        for (const el of document.querySelectorAll(selector)) {
+            if (fsVisible(el)) baseline.add(el);
+        }
+    }
+    window.__fsSuggestionBaseline = baseline;
+    return fields;
+}"""
+
+# Applies a whole form plan in one round trip. Values are set through the
+# native setter and followed by input/change events so React-style
+# controlled inputs pick them up, the same way Playwright's fill() does.
+APPLY_FORM_JS = """(actions) => {""" + REF_JS + """
+    const setValue = (el, value) => {
+        const proto = el.tagName === 'TEXTAREA' ? HTMLTextAreaElement.prototype : HTMLInputElement.prototype;
+        el.focus();
+        Object.getOwnPropertyDescriptor(proto, 'value').set.call(el, value);
+        el.dispatchEvent(new Event('input', { bubbles: true }));
+        el.dispatchEvent(new Event('change', { bubbles: true }));
+    };
+    return actions.map(action => {
+        const weak = fsRefs.els.get(action.ref);
+        const el = weak && weak.deref();
+        if (!el || !el.isConnected) return false;
+        try {
+            if (action.op === 'fill') {
+                setValue(el, action.value);
+                return el.value === action.value;
+            }
+            if (action.op === 'select') {
+                el.selectedIndex = action.index;
+                el.dispatchEvent(new Event('input', { bubbles: true }));
+                el.dispatchEvent(new Event('change', { bubbles: true }));
+                return true;
+            }
+            if (action.op === 'check') {
+                if (!el.checked) el.click();
+                return el.checked;
+            }
+            if (action.op === 'radio') {
+                // Custom radio UIs hide the input, click its label instead
+                const label = el.closest('label');
+                if (fsVisible(el) || !label) el.click();
+                else label.click();
+                return true;
+            }
+        } catch (e) {}
+        return false;
+    });
+}"""
+
+# Returns the first suggestion element that became visible after FIELDS_JS ran
+SUGGESTION_JS = """(selectors) => {""" + REF_JS + """
+    const baseline = window.__fsSuggestionBaseline || new WeakSet();
+    for (const selector of selectors) {
+        for (const el of document.querySelectorAll(selector)) {
+            if (!baseline.has(el) && fsVisible(el)) return el;
+        }
+    }
+    return null;
+}"""
 
 class Clicker:
     """Utility class to handle automatic interactions on a page.
     It can:
-    * Accept common cookie consent banners.
+    * Accept common cookie consent banners (see CookieResolver).
     * Auto-fill form fields before clicking Next/Submit.
-    * Find visible clickable elements (buttons, links, inputs of type submit).
+    * Find visible clickable elements (buttons, links, inputs of type submit)
+      in a single in-page scan, timing each scan.
     * Check if buttons are enabled (not disabled).
     * Prioritize "Next" buttons over others.
     * Prioritize buttons over links.
@@ -91,559 +335,418 @@ class Clicker:
             self.form_values.update(config.default_form_values)
         print(f"DEBUG: Using form values: {self.form_values}")
 
+        # Candidate scan timings in milliseconds, one entry per scan
+        self.selection_times = []
+        self.last_selection_ms = 0.0
+        self.last_form_plan_ms = 0.0
+        self.last_clicked_text = None
+
+        # Cookie banners: one combined probe, remembered per domain across runs
+        self.cookies = CookieResolver(self.COOKIE_SELECTORS, getattr(config, "cookie_memory_path", None))
+
+        # Upper bound for waiting on an enabled submit button after filling forms
+        self.submit_wait_ms = getattr(config, "submit_wait_ms", 3000)
+
+        # Upper bound for waiting on an autocomplete list after filling
+        self.autocomplete_timeout_ms = getattr(config, "autocomplete_timeout_ms", 2000)
+
     async def accept_cookies(self, page: Page) -> bool:
         """Detect and click a cookie acceptance button if present.
         Returns True if a button was clicked.
         """
-        for selector in self.COOKIE_SELECTORS:
-            try:
-                element = await page.query_selector(selector)
-                if element and await element.is_visible():
-                    await element.click(timeout=5000)
-                    await page.wait_for_timeout(1000)  # Wait for cookie banner to disappear
-                    return True
-            except Exception:
-                continue
-        return False
+        return await self.cookies.accept(page)
+
+    # Text-like inputs considered by fill_forms
+    INPUT_SELECTORS = [
+        'input[type="text"]',
+        'input[type="email"]',
+        'input[type="tel"]',
+        'input[type="number"]',
+        'input:not([type])',  # inputs without type
+        'textarea',
+        '[data-testid*="input"]',
+        '[data-testid="email-input"]',  # Explicit selector for Nebula email
+    ]
 
-    async def fill_forms(self, page: Page) -> int:
-        """Auto-fill visible form fields with default values.
-        Returns the number of fields filled.
-        """
-        filled_count = 0
+    # Common autocomplete suggestion selectors
+    SUGGESTION_SELECTORS = [
+        '[class*="autocomplete"]',
+        '[class*="suggestion"]',
+        '[class*="dropdown"]',
+        '[role="option"]',
+        '[role="listbox"] > div',
+        'div[class*="cadb210c-0"]',  # Specific for this site
+    ]
 
-        # Find all input fields
-        input_selectors = [
-            'input[type="text"]',
-            'input[type="email"]',
-            'input[type="tel"]',
-            'input[type="number"]',
-            'input:not([type])',  # inputs without type
-            'textarea',
-            'textarea',
-            '[data-testid*="input"]',
-            '[data-testid="email-input"]',  # Explicit selector for Nebula email
+    def _classify_field(self, field: dict):
+        """Pick a form value for a text field descriptor.
+        Returns a (value, is_email) tuple.
+        """
+        input_type = field["type"]
+        combined_text = (field["placeholder"] + " " + field["name"] + " " + field["testid"]).lower()
+        is_email_field = input_type == "email" or "email" in combined_text or "e-mail" in combined_text or "mail" in combined_text
+
+        if is_email_field:
+            value = self.form_values["email"]
+        elif input_type == "tel" or "phone" in combined_text or "tel" in combined_text:
+            value = self.form_values["phone"]
+        elif "height" in combined_text or "рост" in combined_text:
+            value = self.form_values["height"]
+        elif "goal" in combined_text and "weight" in combined_text:
+            # Goal weight should be checked before regular weight
+            value = self.form_values.get("goal_weight", self.form_values["weight"])
+        elif "weight" in combined_text or "вес" in combined_text:
+            value = self.form_values["weight"]
+        elif "age" in combined_text or "возраст" in combined_text:
+            value = self.form_values["age"]
+        elif "location" in combined_text or "place" in combined_text or "city" in combined_text or "where" in combined_text:
+            value = self.form_values["location"]
+            # Location fields are the ones that show async suggestion lists
+            field["autocomplete"] = True
+        elif "name" in combined_text:
+            value = self.form_values["name"]
+        elif "message" in combined_text or "comment" in combined_text:
+            value = self.form_values["message"]
+        elif input_type == "number":
+            # Generic number input - use age as default
+            value = self.form_values["age"]
+        else:
+            value = self.form_values["text"]
+        return value, is_email_field
+
+    @staticmethod
+    def _select_index(field: dict) -> int:
+        """Pick an option index for a select descriptor based on its name/id."""
+        combined = (field["name"] + " " + field["id"]).lower()
+        count = field["options"]
+
+        if "month" in combined:
+            # Pick a random month
+            return random.randint(1, min(12, count - 1))
+        if "day" in combined:
+            # Pick a random day (1-28 to avoid month-specific issues)
+            return random.randint(1, min(28, count - 1))
+        if "year" in combined:
+            # Pick a year around 1990 (middle of the list)
+            middle_idx = count // 2
+            return random.randint(max(1, middle_idx - 5), min(count - 1, middle_idx + 5))
+        if "hour" in combined:
+            # Pick a random hour (avoiding edges - 3 to 9)
+            return random.randint(3, min(9, count - 1))
+        if "minute" in combined:
+            # Pick a random minute (any value)
+            return random.randint(0, count - 1)
+        if "part" in combined or "ampm" in combined or "meridiem" in combined:
+            # Pick AM or PM randomly
+            return random.randint(0, min(1, count - 1))
+        # For unknown selects, pick a random non-default option
+        return random.randint(0, count - 1)
+
+    def _plan_forms(self, fields: list) -> list:
+        """Turn field descriptors into a list of actions for APPLY_FORM_JS."""
+        actions = []
+
+        for field in fields:
+            if field["kind"] == "text":
+                value, is_email = self._classify_field(field)
+                print(f"DEBUG: Planned input: type={field['type']}, placeholder='{field['placeholder']}', name='{field['name']}', testid='{field['testid']}', is_email={is_email}")
+                actions.append({"ref": field["ref"], "op": "fill", "value": value,
+                                "email": is_email, "autocomplete": field["autocomplete"]})
+            elif field["kind"] == "select" and field["options"] >= 2:
+                # Must have at least one non-default option
+                actions.append({"ref": field["ref"], "op": "select", "index": self._select_index(field)})
+
+        # Check random number of checkboxes (1-3) instead of all,
+        # skipping cookie consent and other system checkboxes
+        valid_checkboxes = [
+            f for f in fields
+            if f["kind"] == "checkbox"
+            and not any(word in (f["id"] + " " + f["class"]).lower() for word in ("onetrust", "cookie"))
         ]
-
-        print(f"DEBUG: Found {len(input_selectors)} selector types")
-
-        for selector in input_selectors:
-            try:
-                inputs = await page.query_selector_all(selector)
-                print(f"DEBUG: Selector '{selector}' found {len(inputs)} elements")
-                for input_el in inputs:
-                    # Skip if hidden or already filled
-                    is_visible = await input_el.is_visible()
-                    if not is_visible:
-                        print(f"DEBUG: Element skipped (not visible)")
-                        continue
-
-                    current_value = await input_el.input_value()
-                    if current_value:  # Already has value
-                        print(f"DEBUG: Element skipped (already has value: '{current_value}')")
-                        continue
-
-                    # Determine what to fill based on attributes
-                    placeholder = await input_el.get_attribute("placeholder") or ""
-                    name_attr = await input_el.get_attribute("name") or ""
-                    testid = await input_el.get_attribute("data-testid") or ""
-                    input_type = await input_el.get_attribute("type") or "text"
-
-                    # Determine appropriate value
-                    value = None
-                    combined_text = (placeholder + " " + name_attr + " " + testid).lower()
-                    is_email_field = input_type == "email" or "email" in combined_text or "e-mail" in combined_text or "mail" in combined_text
-                    
-                    print(f"DEBUG: Processing input: type={input_type}, placeholder='{placeholder}', name='{name_attr}', testid='{testid}', is_email={is_email_field}")
-
-                    if is_email_field:
-                        value = self.form_values["email"]
-                    elif input_type == "tel" or "phone" in combined_text or "tel" in combined_text:
-                        value = self.form_values["phone"]
-                    elif "height" in combined_text or "рост" in combined_text:
-                        value = self.form_values["height"]
-                    elif "goal" in combined_text and "weight" in combined_text:
-                        # Goal weight should be checked before regular weight
-                        value = self.form_values.get("goal_weight", self.form_values["weight"])
-                    elif "weight" in combined_text or "вес" in combined_text:
-                        value = self.form_values["weight"]
-                    elif "age" in combined_text or "возраст" in combined_text:
-                        value = self.form_values["age"]
-                    elif "location" in combined_text or "place" in combined_text or "city" in combined_text or "where" in combined_text:
-                        value = self.form_values["location"]
-                    elif "name" in combined_text:
-                        value = self.form_values["name"]
-                    elif "message" in combined_text or "comment" in combined_text:
-                        value = self.form_values["message"]
-                    elif input_type == "number":
-                        # Generic number input - use age as default
-                        value = self.form_values["age"]
-                    else:
-                        value = self.form_values["text"]
-
-                    if value:
-                        # Use fill() immediately to avoid triggering validation for every character (which causes 429s)
-                        if is_email_field:
-                            print(f"DEBUG: Attempting to fill email field with '{value}' using fill()")
-                            try:
-                                await input_el.fill(value)
-                                await page.wait_for_timeout(500)
-                                # Dispatch events to ensure React/frameworks pick it up
-                                await input_el.dispatch_event("input")
-                                await input_el.dispatch_event("change")
-                            except Exception as e:
-                                print(f"DEBUG: fill() failed: {e}")
-                                print(f"DEBUG: Trying fallback to press_sequentially()")
-                                try:
-                                    await input_el.click()
-                                    await input_el.press_sequentially(value, delay=10) # Faster typing
-                                except Exception as e2:
-                                    print(f"DEBUG: press_sequentially failed: {e2}")
-
-                            # Verify if filled
-                            new_val = await input_el.input_value()
-                            print(f"DEBUG: Value after filling attempts: '{new_val}'")
-                            
-                            await page.wait_for_timeout(2000)  # Wait for validation
-                        else:
-                            print(f"DEBUG: Filling field with '{value}' using fill()")
-                            await input_el.fill(value)
-                            await page.wait_for_timeout(2000)  # 2 seconds for autocomplete dropdown
-                        filled_count += 1
-
-                        # Check if autocomplete dropdown appeared and click first suggestion
-                        try:
-                            # Common autocomplete selectors
-                            autocomplete_selectors = [
-                                '[class*="autocomplete"]',
-                                '[class*="suggestion"]',
-                                '[class*="dropdown"]',
-                                '[role="option"]',
-                                '[role="listbox"] > div',
-                                'div[class*="cadb210c-0"]',  # Specific for this site
-                            ]
-
-                            for ac_selector in autocomplete_selectors:
-                                suggestions = await page.query_selector_all(ac_selector)
-                                if suggestions and len(suggestions) > 0:
-                                    first_suggestion = suggestions[0]
-                                    if await first_suggestion.is_visible():
-                                        await first_suggestion.click(timeout=2000)
-                                        await page.wait_for_timeout(1000)  # Wait for button to enable
-                                        break
-                        except Exception:
-                            pass  # No autocomplete, continue
-
-                        await page.wait_for_timeout(500)  # Longer delay after autocomplete interaction
-            except Exception:
-                continue
-
-        # Fill select dropdowns (date pickers, etc.)
-        try:
-            selects = await page.query_selector_all('select')
-            for select_el in selects:
-                if not await select_el.is_visible():
-                    continue
-
-                name_attr = await select_el.get_attribute("name") or ""
-                id_attr = await select_el.get_attribute("id") or ""
-                combined = (name_attr + " " + id_attr).lower()
-
-                # Get all options
-                options = await select_el.query_selector_all('option')
-                if len(options) < 2:  # Must have at least one non-default option
-                    continue
-
-                # Check current value
-                current_value = await select_el.evaluate("el => el.value")
-                if current_value and current_value != "":  # Already selected
-                    continue
-
-                # Select based on field type
-                if "month" in combined:
-                    # Pick a random month
-                    await select_el.select_option(index=random.randint(1, min(12, len(options) - 1)))
-                    filled_count += 1
-                elif "day" in combined:
-                    # Pick a random day (1-28 to avoid month-specific issues)
-                    await select_el.select_option(index=random.randint(1, min(28, len(options) - 1)))
-                    filled_count += 1
-                elif "year" in combined:
-                    # Pick a year around 1990 (middle of the list)
-                    middle_idx = len(options) // 2
-                    await select_el.select_option(index=random.randint(max(1, middle_idx - 5), min(len(options) - 1, middle_idx + 5)))
-                    filled_count += 1
-                elif "hour" in combined:
-                    # Pick a random hour (avoiding edges - 3 to 9)
-                    max_hour_idx = min(9, len(options) - 1)
-                    await select_el.select_option(index=random.randint(3, max_hour_idx))
-                    filled_count += 1
-                elif "minute" in combined:
-                    # Pick a random minute (any value)
-                    await select_el.select_option(index=random.randint(0, len(options) - 1))
-                    filled_count += 1
-                elif "part" in combined or "ampm" in combined or "meridiem" in combined:
-                    # Pick AM or PM randomly
-                    await select_el.select_option(index=random.randint(0, min(1, len(options) - 1)))
-                    filled_count += 1
-                else:
-                    # For unknown selects, pick a random non-default option
-                    await select_el.select_option(index=random.randint(0, len(options) - 1))
-                    filled_count += 1
-
-                await page.wait_for_timeout(300)  # Small delay between fills
-        except Exception:
-            pass
-
-        # Check random number of visible checkboxes (1-3) instead of all
-        try:
-            checkboxes = await page.query_selector_all('input[type="checkbox"]')
-            print(f"DEBUG: Found {len(checkboxes)} checkboxes")
-
-            # Filter out non-visible and system checkboxes
-            valid_checkboxes = []
-            for checkbox in checkboxes:
-                try:
-                    if not await checkbox.is_visible():
-                        continue
-
-                    # Skip cookie consent and other system checkboxes
-                    checkbox_id = await checkbox.get_attribute("id") or ""
-                    checkbox_class = await checkbox.get_attribute("class") or ""
-                    if "onetrust" in checkbox_id.lower() or "cookie" in checkbox_id.lower():
-                        continue
-                    if "onetrust" in checkbox_class.lower() or "cookie" in checkbox_class.lower():
-                        continue
-
-                    # Check if already checked
-                    is_checked = await checkbox.is_checked()
-                    if not is_checked:
-                        valid_checkboxes.append((checkbox, checkbox_id, checkbox_class))
-                except Exception:
-                    continue
-
-            # Select random number of checkboxes to check (1-3)
-            if valid_checkboxes:
-                import random
-                num_to_check = random.randint(1, min(3, len(valid_checkboxes)))
-                checkboxes_to_check = random.sample(valid_checkboxes, num_to_check)
-
-                print(f"DEBUG: Checking {num_to_check} out of {len(valid_checkboxes)} valid checkboxes")
-                for checkbox, checkbox_id, checkbox_class in checkboxes_to_check:
-                    try:
-                        print(f"DEBUG: Checking checkbox: id='{checkbox_id}', class='{checkbox_class}'")
-                        await checkbox.check()
-                        filled_count += 1
-                        await page.wait_for_timeout(500)  # Increased wait time for JS to process
-                    except Exception as e:
-                        print(f"DEBUG: Error checking checkbox: {e}")
-                        continue
-        except Exception as e:
-            print(f"DEBUG: Error processing checkboxes: {e}")
-
-        # Handle radio buttons (e.g., gender selection)
+        if valid_checkboxes:
+            num_to_check = random.randint(1, min(3, len(valid_checkboxes)))
+            print(f"DEBUG: Checking {num_to_check} out of {len(valid_checkboxes)} valid checkboxes")
+            for checkbox in random.sample(valid_checkboxes, num_to_check):
+                actions.append({"ref": checkbox["ref"], "op": "check"})
+
+        # Radio buttons (e.g., gender selection), grouped by name
+        radio_groups = {}
+        for field in fields:
+            if field["kind"] == "radio" and field["name"]:
+                radio_groups.setdefault(field["name"], []).append(field)
+
+        target_gender = self.form_values.get("gender", "female").lower()
+        for name, group in radio_groups.items():
+            # Check if this group is likely about gender, by name or by values
+            is_gender_group = "gender" in name.lower() or "sex" in name.lower()
+            if not is_gender_group:
+                is_gender_group = any(r["value"].lower() in ["male", "female", "man", "woman"] for r in group)
+
+            selected_radio = None
+            if is_gender_group:
+                for radio in group:
+                    val_lower = radio["value"].lower()
+                    if target_gender in ["female", "woman"] and val_lower in ["female", "woman"]:
+                        selected_radio = radio
+                        break
+                    elif target_gender in ["male", "man"] and val_lower in ["male", "man"]:
+                        selected_radio = radio
+                        break
+            else:
+                # Random selection for non-gender groups
+                selected_radio = random.choice(group)
+
+            if selected_radio:
+                actions.append({"ref": selected_radio["ref"], "op": "radio"})
+
+        return actions
+
+    async def _fill_fallback(self, page: Page, action: dict) -> bool:
+        """Fill a text field with Playwright when the batched setter did not stick."""
+        input_el = await resolve_ref(page, action["ref"])
+        if not input_el:
+            return False
         try:
-            radios = await page.query_selector_all('input[type="radio"]')
-            print(f"DEBUG: Found {len(radios)} radio buttons")
-            
-            # Group radios by name
-            radio_groups = {}
-            for radio in radios:
-                name = await radio.get_attribute("name")
-                if name:
-                    if name not in radio_groups:
-                        radio_groups[name] = []
-                    radio_groups[name].append(radio)
-            
-            target_gender = self.form_values.get("gender", "female").lower()
-            
-            for name, group in radio_groups.items():
-                # Check if this group is likely about gender
-                is_gender_group = "gender" in name.lower() or "sex" in name.lower()
-                
-                # If not explicitly named gender, check values
-                if not is_gender_group:
-                    for radio in group:
-                        val = await radio.get_attribute("value") or ""
-                        if val.lower() in ["male", "female", "man", "woman"]:
-                            is_gender_group = True
-                            break
-                
-                selected_radio = None
-                if is_gender_group:
-                    print(f"DEBUG: Processing gender radio group: {name}")
-                    for radio in group:
-                        val = await radio.get_attribute("value") or ""
-                        val_lower = val.lower()
-                        
-                        # Check if this radio matches our target gender
-                        if target_gender in ["female", "woman"] and val_lower in ["female", "woman"]:
-                            selected_radio = radio
-                            break
-                        elif target_gender in ["male", "man"] and val_lower in ["male", "man"]:
-                            selected_radio = radio
-                            break
-                else:
-                    # Random selection for non-gender groups
-                    print(f"DEBUG: Processing random radio group: {name}")
-                    if group:
-                        selected_radio = random.choice(group)
-
-                if selected_radio:
-                    try:
-                        # Try to click the radio or its label
-                        clicked = False
-                        if await selected_radio.is_visible():
-                            await selected_radio.click(timeout=1000)
-                            clicked = True
-                        else:
-                            # If radio is hidden, try clicking parent label
-                            print("DEBUG: Radio not visible, trying to click parent label")
-                            # Try JS click on label
-                            await selected_radio.evaluate("el => el.closest('label') && el.closest('label').click()")
-                            clicked = True
-                        
-                        if clicked:
-                            filled_count += 1
-                            await page.wait_for_timeout(500)
-                    except Exception as e:
-                        print(f"DEBUG: Error clicking radio: {e}")
-                        # Fallback: try clicking parent label via JS if standard click failed
-                        try:
-                            await selected_radio.evaluate("el => el.closest('label') && el.closest('label').click()")
-                            filled_count += 1
-                        except:
-                            pass
+            await input_el.fill(action["value"])
+            return True
         except Exception as e:
-            print(f"DEBUG: Error processing radio buttons: {e}")
-
-        return filled_count
-
-    async def _is_same_domain(self, element, initial_domain: str) -> bool:
-        """Check if a link stays within the initial domain."""
+            print(f"DEBUG: fill() failed: {e}")
+            if not action["email"]:
+                return False
+        # Emails are the field most likely to have custom input handling
+        print("DEBUG: Trying fallback to press_sequentially()")
         try:
-            href = await element.get_attribute("href")
-            if not href:
-                return True  # No href means it's probably a button
-            if href.startswith('#') or href.startswith('/'):
-                return True  # Relative link or anchor
-            parsed = urlparse(href)
-            if not parsed.netloc:
-                return True  # No domain means relative link
-
-            # Normalize domains for comparison (remove www.)
-            link_domain = parsed.netloc.replace("www.", "")
-            init_domain = initial_domain.replace("www.", "")
-
-            # Must match the initial domain exactly
-            return link_domain == init_domain
-        except Exception:
-            return False  # If we can't check, don't allow it
+            await input_el.click()
+            await input_el.press_sequentially(action["value"], delay=10)  # Faster typing
+            return True
+        except Exception as e2:
+            print(f"DEBUG: press_sequentially failed: {e2}")
+            return False
 
-    async def _is_button_enabled(self, element) -> bool:
-        """Check if button is enabled (not disabled)."""
+    async def _pick_suggestion(self, page: Page, wait: bool) -> bool:
+        """Click the first autocomplete suggestion that appeared after filling.
+        Only waits (up to autocomplete_timeout_ms) when a filled field is
+        expected to show suggestions; otherwise checks once.
+        """
         try:
-            disabled = await element.get_attribute("disabled")
-            aria_disabled = await element.get_attribute("aria-disabled")
-
-            # Check if explicitly disabled
-            if disabled is not None or aria_disabled == "true":
-                return False
-
-            # Check classes for disabled state
-            class_attr = await element.get_attribute("class") or ""
-            if "disabled" in class_attr.lower():
+            if wait:
+                handle = await page.wait_for_function(
+                    SUGGESTION_JS, arg=self.SUGGESTION_SELECTORS, timeout=self.autocomplete_timeout_ms
+                )
+            else:
+                handle = await page.evaluate_handle(SUGGESTION_JS, self.SUGGESTION_SELECTORS)
+            suggestion = handle.as_element()
+            if not suggestion:
                 return False
-
+            await suggestion.click(timeout=2000)
             return True
         except Exception:
-            return True  # If we can't check, assume enabled
+            return False  # No autocomplete, continue
 
-    async def _has_priority_keyword(self, element) -> bool:
-        """Check if element text contains priority keywords like 'Next'."""
+    async def fill_forms(self, page: Page) -> int:
+        """Auto-fill visible form fields with default values.
+        Fields are collected in one evaluate call, classified in Python and
+        filled in one batched evaluate call.
+        Returns the number of fields filled.
+        """
+        started = time.perf_counter()
         try:
-            text = await element.inner_text()
-            text_lower = text.lower().strip()
+            fields = await page.evaluate(FIELDS_JS, {
+                "inputSelectors": self.INPUT_SELECTORS,
+                "suggestionSelectors": self.SUGGESTION_SELECTORS,
+            })
+        except Exception as e:
+            print(f"DEBUG: Form scan failed: {e}")
+            return 0
 
-            for keyword in self.PRIORITY_KEYWORDS:
-                if keyword in text_lower:
-                    return True
-            return False
-        except Exception:
-            return False
+        actions = self._plan_forms(fields)
+        self.last_form_plan_ms = (time.perf_counter() - started) * 1000
+        print(f"DEBUG: Planned {len(actions)} form actions from {len(fields)} fields in {self.last_form_plan_ms:.1f}ms")
+        if not actions:
+            return 0
 
-    async def _should_exclude_element(self, element) -> bool:
-        """Check if element should be excluded based on text/attributes."""
         try:
-            # Check text content
-            text = await element.inner_text()
-            text_lower = text.lower().strip()
-
-            # Check href attribute
-            href = await element.get_attribute("href")
-            href_lower = href.lower() if href else ""
-
-            # Check all attributes for excluded patterns
-            for pattern in self.EXCLUDE_PATTERNS:
-                if pattern in text_lower or pattern in href_lower:
-                    return True
-
-            # Exclude very short or empty text buttons that might be navigation
-            if len(text_lower) < 1:
-                return True
+            results = await page.evaluate(APPLY_FORM_JS, actions)
+        except Exception as e:
+            print(f"DEBUG: Batched form fill failed: {e}")
+            results = [False] * len(actions)
 
-            return False
-        except Exception:
-            return False
+        filled_count = 0
+        for action, ok in zip(actions, results):
+            if not ok and action["op"] == "fill":
+                ok = await self._fill_fallback(page, action)
+            if ok:
+                filled_count += 1
 
-    async def _visible_clickables(self, page: Page, initial_domain: str, visited_urls: set, prioritize_buttons: bool = True):
-        """Get visible clickable elements, with optional button prioritization."""
-        current_url = page.url
-        priority_buttons = []  # Buttons with "Next", "Continue", etc.
-        regular_buttons = []
-        links = []
+        filled_text = [a for a in actions if a["op"] == "fill"]
+        if filled_text:
+            await self._pick_suggestion(page, wait=any(a["autocomplete"] for a in filled_text))
 
-        # Get all buttons first
-        for selector in self.BUTTON_SELECTORS:
-            try:
-                found = await page.query_selector_all(selector)
-                for el in found:
-                    # Check visibility, enabled state, and exclusions
-                    if not await el.is_visible():
-                        continue
-                    if not await self._is_button_enabled(el):
-                        continue
-                    if await self._should_exclude_element(el):
-                        continue
-
-                    # Prioritize buttons with "Next", "Continue" keywords
-                    if await self._has_priority_keyword(el):
-                        priority_buttons.append(el)
-                    else:
-                        regular_buttons.append(el)
-            except Exception:
-                continue
+        return filled_count
 
-        # Get links that stay within the initial domain and haven't been visited
-        for selector in self.LINK_SELECTORS:
-            try:
-                found = await page.query_selector_all(selector)
-                for el in found:
-                    if not await el.is_visible():
-                        continue
-                    if await self._should_exclude_element(el):
-                        continue
-                    if not await self._is_same_domain(el, initial_domain):
-                        continue
-
-                    # Check if link leads to already visited URL
-                    href = await el.get_attribute("href")
-                    if href:
-                        # Construct full URL
-                        full_url = urljoin(current_url, href)
-                        if full_url not in visited_urls:
-                            links.append(el)
-                    else:
-                        links.append(el)
-            except Exception:
-                continue
+    def _record_selection_time(self, ms: float):
+        """Store how long the last candidate selection took (in milliseconds)."""
+        self.last_selection_ms = ms
+        self.selection_times.append(ms)
+
+    def selection_stats(self) -> dict:
+        """Summary of candidate selection timings for this run."""
+        times = self.selection_times
+        return {
+            "scans": len(times),
+            "total_ms": round(sum(times), 1),
+            "avg_ms": round(sum(times) / len(times), 1) if times else 0.0,
+            "max_ms": round(max(times), 1) if times else 0.0,
+        }
+
+    def _candidate_options(self, initial_domain: str, visited_urls: set) -> dict:
+        """Arguments passed to CANDIDATES_JS."""
+        return {
+            "buttonSelectors": self.BUTTON_SELECTORS,
+            "linkSelectors": self.LINK_SELECTORS,
+            "excludePatterns": self.EXCLUDE_PATTERNS,
+            "priorityKeywords": self.PRIORITY_KEYWORDS,
+            "initialDomain": initial_domain,
+            "visitedUrls": list(visited_urls),
+        }
+
+    @staticmethod
+    def _rank(candidates: list, prioritize_buttons: bool = True, avoid: set = None) -> list:
+        """Order candidates: "Next"-style buttons, then buttons, then links.
+        Candidates whose text is in `avoid` are dropped first (unless that
+        leaves nothing), so a tried "Next" gives way to untried buttons.
+        """
+        if avoid:
+            fresh = [c for c in candidates if c["text"] not in avoid]
+            if fresh:
+                if len(fresh) < len(candidates):
+                    print(f"DEBUG: Skipping {len(candidates) - len(fresh)} already tried candidates")
+                candidates = fresh
+        priority_buttons = [c for c in candidates if c["kind"] == "priority"]
+        regular_buttons = [c for c in candidates if c["kind"] == "button"]
+        links = [c for c in candidates if c["kind"] == "link"]
 
-        # Return in priority order
         if priority_buttons:
             return priority_buttons
         if prioritize_buttons and regular_buttons:
             return regular_buttons
-        # Otherwise return buttons + links
         return regular_buttons + links
 
-    async def click_random(self, page: Page, initial_domain: str, visited_urls: set) -> str:
+    async def _visible_clickables(self, page: Page, initial_domain: str, visited_urls: set, prioritize_buttons: bool = True, avoid: set = None):
+        """Get visible clickable candidates, with optional button prioritization.
+        All checks (visibility, enabled state, exclusions, priority keywords,
+        same domain, visited links) run in a single page.evaluate call.
+        Returns candidate dicts with 'ref', 'text', 'href' and 'kind' keys;
+        use resolve_ref() to get an ElementHandle for the one being clicked.
+        """
+        started = time.perf_counter()
+        try:
+            candidates = await page.evaluate(CANDIDATES_JS, self._candidate_options(initial_domain, visited_urls))
+        except Exception as e:
+            print(f"DEBUG: Candidate scan failed: {e}")
+            candidates = []
+        self._record_selection_time((time.perf_counter() - started) * 1000)
+        print(f"DEBUG: Found {len(candidates)} candidates in {self.last_selection_ms:.1f}ms")
+        return self._rank(candidates, prioritize_buttons, avoid)
+
+    async def _wait_for_candidates(self, page: Page, initial_domain: str, visited_urls: set, budget_ms: int, avoid: set = None) -> list:
+        """Wait up to budget_ms for an enabled priority button, driven by DOM mutations.
+        Returns the ranked candidates of the scan that resolved the wait.
+        """
+        options = self._candidate_options(initial_domain, visited_urls)
+        options["budgetMs"] = budget_ms
+        try:
+            result = await page.evaluate(WAIT_PRIORITY_JS, options)
+        except Exception as e:
+            # Usually a navigation while waiting; scan the new document once
+            print(f"DEBUG: Submit button wait interrupted: {e}")
+            return await self._visible_clickables(page, initial_domain, visited_urls, prioritize_buttons=True, avoid=avoid)
+
+        self._record_selection_time(result["scan_ms"])
+        print(
+            f"DEBUG: {len(result['candidates'])} candidates after waiting {result['waited_ms']}ms "
+            f"({result['scans']} scans, {result['scan_ms']:.1f}ms scanning)"
+        )
+        return self._rank(result["candidates"], prioritize_buttons=True, avoid=avoid)
+
+    async def click_random(self, page: Page, initial_domain: str, visited_urls: set, avoid: set = None) -> str:
         """Click a random visible clickable element.
         Auto-fills forms before clicking.
         Prioritizes buttons over links and stays within the initial domain.
+        Elements whose text is in `avoid` (already clicked from this state) are
+        only used when nothing else is left. The clicked text is kept in
+        last_clicked_text.
         Returns a description of the action performed.
         """
+        self.last_clicked_text = None
         # First, try to fill any forms on the page
         filled = await self.fill_forms(page)
-        if filled > 0:
-            await page.wait_for_timeout(500)  # Wait for form validation
-
-        # After filling forms/selecting options, check if Submit/Continue button is now enabled
-        # Wait up to 10 seconds for submit button to become enabled
-        submit_clicked = False
-        print(f"DEBUG: Filled {filled} fields, now looking for enabled submit button...")
 
-        for attempt in range(20):  # 20 attempts * 500ms = 10 seconds
-            elements = await self._visible_clickables(page, initial_domain, visited_urls, prioritize_buttons=True)
+        # After filling forms/selecting options, wait for a Submit/Continue button
+        # to become enabled. Without filled fields there is nothing to wait for.
+        budget_ms = self.submit_wait_ms if filled > 0 else 0
+        print(f"DEBUG: Filled {filled} fields, waiting up to {budget_ms}ms for an enabled submit button...")
+        candidates = await self._wait_for_candidates(page, initial_domain, visited_urls, budget_ms, avoid)
 
-            # Check if any priority button (Submit, Continue, Next) is now enabled
-            for el in elements:
-                has_priority = await self._has_priority_keyword(el)
-                is_enabled = await self._is_button_enabled(el)
+        # Priority candidates (Submit, Continue, Next) are already known to be enabled
+        for candidate in candidates:
+            if candidate["kind"] != "priority":
+                continue
+            el = await resolve_ref(page, candidate["ref"])
+            if not el:
+                continue
 
-                if has_priority:
-                    try:
-                        text = await el.inner_text()
-                        disabled_attr = await el.get_attribute("disabled")
-                        print(f"DEBUG: Priority button found: '{text.strip()}', disabled={disabled_attr}, enabled={is_enabled}")
-                    except:
-                        pass
+            text = candidate["text"]
+            self.last_clicked_text = text
+            desc = f"Selected options and clicked '{text}'"
+            print(f"DEBUG: Clicking enabled submit button: '{text}'")
+            try:
+                # Scroll element into view first
+                try:
+                    await el.scroll_into_view_if_needed(timeout=5000)
+                    await page.wait_for_timeout(500)
+                except Exception as scroll_err:
+                    print(f"DEBUG: Scroll failed: {scroll_err}, trying JS scroll...")
+                    await el.evaluate("el => el.scrollIntoView({behavior: 'smooth', block: 'center'})")
+                    await page.wait_for_timeout(1000)
 
-                if has_priority and is_enabled:
+                await el.click(timeout=10000)
+                await page.wait_for_timeout(1000)
+                return desc
+            except Exception as e:
+                print(f"DEBUG: Click failed: {e}, trying force click...")
+                try:
+                    await el.click(force=True, timeout=5000)
+                    await page.wait_for_timeout(1000)
+                    return desc
+                except Exception as e2:
+                    print(f"DEBUG: Force click also failed: {e2}")
+                    # Try JavaScript click as final fallback
                     try:
-                        text = await el.inner_text()
-                        desc = f"Selected options and clicked '{text.strip()}'"
-                        print(f"DEBUG: Clicking enabled submit button: '{text.strip()}'")
-
-                        # Scroll element into view first
-                        try:
-                            await el.scroll_into_view_if_needed(timeout=5000)
-                            await page.wait_for_timeout(500)
-                        except Exception as scroll_err:
-                            print(f"DEBUG: Scroll failed: {scroll_err}, trying JS scroll...")
-                            await el.evaluate("el => el.scrollIntoView({behavior: 'smooth', block: 'center'})")
-                            await page.wait_for_timeout(1000)
-
-                        await el.click(timeout=10000)
+                        print(f"DEBUG: Trying JavaScript click as final fallback...")
+                        await el.evaluate("el => el.click()")
                         await page.wait_for_timeout(1000)
                         return desc
-                    except Exception as e:
-                        print(f"DEBUG: Click failed: {e}, trying force click...")
-                        try:
-                            await el.click(force=True, timeout=5000)
-                            await page.wait_for_timeout(1000)
-                            return desc
-                        except Exception as e2:
-                            print(f"DEBUG: Force click also failed: {e2}")
-                            # Try JavaScript click as final fallback
-                            try:
-                                print(f"DEBUG: Trying JavaScript click as final fallback...")
-                                await el.evaluate("el => el.click()")
-                                await page.wait_for_timeout(1000)
-                                return desc
-                            except Exception as e3:
-                                print(f"DEBUG: JavaScript click also failed: {e3}")
-                                pass
-
-            # If no enabled submit button found yet, wait and try again
-            print(f"DEBUG: Attempt {attempt+1}/20 - no enabled submit button found, waiting...")
-            await page.wait_for_timeout(500)
+                    except Exception as e3:
+                        print(f"DEBUG: JavaScript click also failed: {e3}")
+                        pass
 
         # If no submit button was found/clicked, proceed with normal random click
-        elements = await self._visible_clickables(page, initial_domain, visited_urls, prioritize_buttons=True)
-        if not elements:
+        # using the candidates from the same scan
+        element = None
+        while candidates and not element:
+            candidate = random.choice(candidates)
+            element = await resolve_ref(page, candidate["ref"])
+            if not element:
+                candidates.remove(candidate)
+
+        if not element:
             if filled > 0:
                 return "Filled forms / selected options"
             return "No clickable elements found"
 
-        element = random.choice(elements)
-
-        # Try to get a readable description
-        try:
-            text = await element.inner_text()
-            desc = f"clicked element with text '{text.strip()}'"
-        except Exception:
-            desc = "clicked an element"
-
+        self.last_clicked_text = candidate["text"]
+        desc = f"clicked element with text '{candidate['text']}'"
         if filled > 0:
             desc = f"Filled forms and {desc}"
 
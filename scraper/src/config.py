@@ -1,5 +1,14 @@
 import yaml, os
 
+# Built-in screenshot profiles (see Scraper.capture_screenshot). "default" is
+# the historical capture: full page, device pixels, lossless PNG. Pages taller
+# than tile_height CSS px are captured as tiles so no single bitmap gets huge.
+CAPTURE_PROFILES = {
+    'default': {'scale': 'device', 'format': 'png', 'full_page': True, 'max_height': None, 'tile_height': 4000},
+    'explore': {'scale': 'css', 'format': 'jpeg', 'quality': 80, 'full_page': True, 'max_height': 6000, 'tile_height': None},
+    'fidelity': {'scale': 'device', 'format': 'png', 'full_page': True, 'max_height': None, 'tile_height': 4000},
+}
+
 class Config:
     def __init__(self, path: str = None):
         self.path = path or os.getenv('FUNNEL_CONFIG', '.funnelsaver.yml')
@@ -37,3 +46,134 @@ class Config:
     @property
     def screenshot_delay_ms(self):
         return int(self.data.get('screenshot_delay_ms', 1500))
+
+    @property
+    def autocomplete_timeout_ms(self):
+        return int(self.data.get('autocomplete_timeout_ms', 2000))
+
+    @property
+    def stabilize_quiet_ms(self):
+        return int(self.data.get('stabilize_quiet_ms', 300))
+
+    @property
+    def stabilize_timeout_ms(self):
+        # Ceiling for page stabilization; defaults to the old networkidle + fixed delay budget
+        return int(self.data.get('stabilize_timeout_ms', 4000 + self.screenshot_delay_ms))
+
+    @property
+    def initial_load_timeout_ms(self):
+        return int(self.data.get('initial_load_timeout_ms', 3000))
+
+    @property
+    def submit_wait_ms(self):
+        return int(self.data.get('submit_wait_ms', 3000))
+
+    @property
+    def dead_end_timeout_ms(self):
+        # Max wait for a redirect or new elements when nothing can be clicked
+        return int(self.data.get('dead_end_timeout_ms', 10000))
+
+    @property
+    def cache_dir(self):
+        # Persistent state shared across runs (cookie memory, ...)
+        return self.data.get('cache_dir', os.getenv('FUNNEL_CACHE_DIR', os.path.expanduser('~/.cache/funnelsaver')))
+
+    @property
+    def cookie_memory_path(self):
+        return self.data.get('cookie_memory_path', os.path.join(self.cache_dir, 'cookie_memory.json'))
+
+    @property
+    def markdown_workers(self):
+        return int(self.data.get('markdown_workers', 2))
+
+    @property
+    def report_streaming(self):
+        # Append steps to funnel_steps.jsonl and build the JSON/Markdown reports at the end
+        return bool(self.data.get('report_streaming', True))
+
+    @property
+    def report_checkpoint_steps(self):
+        # Rebuild the JSON/Markdown reports every N streamed steps, so a killed run
+        # still leaves usable reports (0: only at the end)
+        return int(self.data.get('report_checkpoint_steps', 10))
+
+    @property
+    def writer_workers(self):
+        # Threads writing artifacts (screenshots, HTML, reports) behind the crawl
+        return int(self.data.get('writer_workers', 2))
+
+    @property
+    def writer_queue_size(self):
+        # Pending writes per writer thread before capture waits (back-pressure)
+        return int(self.data.get('writer_queue_size', 32))
+
+    @property
+    def resource_blocking(self):
+        # Request blocking rules (see RequestRouter); nothing is blocked by default
+        return self.data.get('resource_blocking') or {}
+
+    @property
+    def asset_cache(self):
+        # On-disk cache of static assets shared across runs. Opt-in: it routes every
+        # request through Python, which also bypasses Chromium's own HTTP cache
+        value = self.data.get('asset_cache')
+        if not value:
+            return {'enabled': False}
+        value = value if isinstance(value, dict) else {}
+        return {
+            'enabled': bool(value.get('enabled', True)),
+            'path': value.get('path', os.path.join(self.cache_dir, 'assets')),
+            'max_mb': int(value.get('max_mb', 500)),
+        }
+
+    @property
+    def dedupe_threshold(self):
+        # Max differing bits (of 64) between perceptual hashes for a step to reuse
+        # the previous step's artifacts; -1 captures every step
+        return int(self.data.get('dedupe_threshold', 5))
+
+    @property
+    def max_state_revisits(self):
+        # Stop once the crawl comes back to the same state more often than this
+        return int(self.data.get('max_state_revisits', 2))
+
+    @property
+    def state_similarity(self):
+        # Estimated shingle Jaccard above which two states on one URL are the same
+        return float(self.data.get('state_similarity', 0.95))
+
+    @property
+    def browser_server_url(self):
+        # CDP endpoint of a browser server (src/browser_server.py); unset: launch locally
+        return self.data.get('browser_server_url', os.getenv('BROWSER_SERVER_URL')) or None
+
+    @property
+    def capture_profiles(self):
+        # Built-in profiles, overridden/extended by `capture_profiles` in the config
+        profiles = {name: dict(profile) for name, profile in CAPTURE_PROFILES.items()}
+        for name, profile in (self.data.get('capture_profiles') or {}).items():
+            profiles[name] = {**profiles.get(name, CAPTURE_PROFILES['default']), **(profile or {})}
+        return profiles
+
+    @property
+    def capture_profile(self):
+        # Profile used while exploring the funnel
+        return self.data.get('capture_profile', 'default')
+
+    @property
+    def fidelity_profile(self):
+        return self.data.get('fidelity_profile', 'fidelity')
+
+    @property
+    def fidelity_steps(self):
+        # Steps captured with the fidelity profile instead
+        return [int(step) for step in self.data.get('fidelity_steps', [])]
+
+    def capture_profile_for(self, step: int) -> dict:
+        """Screenshot profile for a step, with its name under 'name'."""
+        name = self.fidelity_profile if step in self.fidelity_steps else self.capture_profile
+        profiles = self.capture_profiles
+        if name not in profiles:
+            print(f"DEBUG: Unknown capture profile '{name}', using 'default'")
+            name = 'default'
+        return {'name': name, **profiles[name]}
@@ -0,0 +1,79 @@
+import asyncio
+import multiprocessing
+import re
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from urllib.parse import urljoin
+from markdownify import markdownify as md
+
+
+def html_to_markdown(html: str, current_url: str) -> str:
+    """Convert cleaned HTML to Markdown and make relative URLs absolute.
+    Module-level so it can run in a worker process.
+    """
+    # Convert cleaned HTML to markdown
+    # strip=['a'] ensures links are kept but maybe we want to keep them
+    # newline_style='BACKSLASH' handles line breaks better
+    markdown = md(html, heading_style="ATX", strip=['script', 'style'])
+
+    # Fix relative image URLs in markdown
+    # Pattern: ![alt](relative_path) or [text](relative_path)
+    def fix_url(match):
+        prefix = match.group(1) # ![ or [
+        alt_or_text = match.group(2)
+        url = match.group(3)
+
+        # If URL is relative (starts with / or doesn't have protocol), make it absolute
+        if url and (url.startswith('/') or (not url.startswith('http://') and not url.startswith('https://') and not url.startswith('data:'))):
+            absolute_url = urljoin(current_url, url)
+            return f'{prefix}{alt_or_text}]({absolute_url})'
+        return match.group(0)  # Return unchanged if already absolute
+
+    # Fix both image and link URLs with a more robust regex
+    # Matches ![alt](url) or [text](url)
+    return re.sub(r'(!?\[)([^\]]*)\]\(([^)]+)\)', fix_url, markdown)
+
+
+def create_executor(max_workers: int = 2):
+    """Process pool for conversions, or a thread pool where processes can't be started."""
+    if multiprocessing.current_process().daemon:
+        # Celery prefork children are daemonic and cannot start processes;
+        # a thread still keeps the conversion off the event loop
+        return ThreadPoolExecutor(max_workers=max_workers)
+    return ProcessPoolExecutor(
+        max_workers=max_workers, mp_context=multiprocessing.get_context("spawn")
+    )
+
+
+class MarkdownConverter:
+    """Runs HTML-to-Markdown conversion off the event loop in a bounded pool.
+    submit() returns a future right away, so the crawler can keep going while
+    conversion finishes; it only blocks when max_pending conversions are
+    already queued (back-pressure).
+
+    Concurrent runs in one process can share an executor (see create_executor);
+    a shared executor is left running by shutdown().
+    """
+
+    def __init__(self, max_workers: int = 2, max_pending: int = None, executor=None):
+        self.owns_executor = executor is None
+        self.executor = executor or create_executor(max_workers)
+        self.max_pending = max_pending or max_workers * 2
+        self._slots = None
+
+    async def submit(self, html: str, current_url: str) -> asyncio.Future:
+        """Queue a conversion and return a future resolving to the Markdown."""
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_pending)
+        await self._slots.acquire()
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(self.executor, html_to_markdown, html, current_url)
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    async def convert(self, html: str, current_url: str) -> str:
+        """Convert and wait for the result."""
+        return await (await self.submit(html, current_url))
+
+    def shutdown(self):
+        if self.owns_executor:
+            self.executor.shutdown(wait=False, cancel_futures=True)
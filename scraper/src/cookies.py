@@ -0,0 +1,211 @@
+import os
+import re
+import json
+import fcntl
+import asyncio
+import datetime
+import tempfile
+from urllib.parse import urlparse
+from playwright.async_api import Page
+from .dom import REF_JS, resolve_ref
+
+# Flags a document as "dirty" when something that looks like a consent
+# overlay is inserted. Installed as an init script, so parser-inserted
+# banners of a freshly loaded document are caught as well.
+CONSENT_OBSERVER_JS = """
+    if (!window.__fsConsent) {
+        const state = window.__fsConsent = { dirty: false };
+        const pattern = /cookie|consent|onetrust|gdpr/i;
+        const looksLikeConsent = (el) => {
+            const className = typeof el.className === 'string' ? el.className : '';
+            if (pattern.test(el.id || '') || pattern.test(className)) return true;
+            const text = el.textContent || '';
+            return text.length < 2000 && pattern.test(text);
+        };
+        new MutationObserver(records => {
+            if (state.dirty) return;
+            for (const record of records) {
+                for (const node of record.addedNodes) {
+                    if (node.nodeType === 1 && looksLikeConsent(node)) {
+                        state.dirty = true;
+                        return;
+                    }
+                }
+            }
+        }).observe(document, { childList: true, subtree: true });
+    }
+"""
+
+# Reads and clears the dirty flag. Pages without the observer always count as dirty.
+CONSENT_DIRTY_JS = """() => {
+    const state = window.__fsConsent;
+    if (!state) return true;
+    const dirty = state.dirty;
+    state.dirty = false;
+    return dirty;
+}"""
+
+# Checks every cookie selector in one query and returns the first visible match
+COOKIE_PROBE_JS = """(specs) => {""" + REF_JS + """
+    if (window.__fsConsent) window.__fsConsent.dirty = false;
+    for (const spec of specs) {
+        let found;
+        try {
+            found = document.querySelectorAll(spec.css);
+        } catch (e) {
+            continue;
+        }
+        for (const el of found) {
+            if (spec.text && !(el.innerText || '').toLowerCase().includes(spec.text)) continue;
+            if (!fsVisible(el)) continue;
+            return { ref: fsRef(el), selector: spec.selector };
+        }
+    }
+    return null;
+}"""
+
+# Resolves once the clicked button is gone or hidden
+COOKIE_GONE_JS = """(id) => {
+    const weak = window.__fsRefs && window.__fsRefs.els.get(id);
+    const el = weak && weak.deref();
+    if (!el || !el.isConnected) return true;
+    const rect = el.getBoundingClientRect();
+    return !rect.width || !rect.height || window.getComputedStyle(el).visibility === 'hidden';
+}"""
+
+
+class CookieResolver:
+    """Accepts cookie banners with as few round trips as possible.
+    * All selectors are checked in a single in-page query.
+    * Remembers per domain, across runs, which selector worked or that the
+      domain shows no banner, and tries the remembered selector first.
+      Updates are merged into the memory file under a lock, off the event
+      loop, so concurrent runs and workers keep each other's domains.
+    * Once a banner was accepted (or none was found), stops probing until an
+      in-page observer sees a new consent-like overlay being inserted.
+    """
+
+    HAS_TEXT = re.compile(r"""^(.*):has-text\((['"])(.+)\2\)$""")
+
+    def __init__(self, selectors: list, memory_path: str = None):
+        self.selectors = selectors
+        self.memory_path = memory_path
+        self.memory = self._load_memory()
+        self.settled = False
+        self.probes = 0
+        self.skipped = 0
+
+    def _load_memory(self) -> dict:
+        if not self.memory_path or not os.path.exists(self.memory_path):
+            return {}
+        try:
+            with open(self.memory_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def _save(self, domain: str, entry: dict) -> dict:
+        """Merge one domain into the memory file: re-read under an exclusive
+        lock and replace atomically. Returns the merged memory.
+        """
+        directory = os.path.dirname(self.memory_path) or "."
+        os.makedirs(directory, exist_ok=True)
+        with open(f"{self.memory_path}.lock", "w") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            memory = self._load_memory()
+            memory[domain] = entry
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".cookie_memory-")
+            try:
+                with os.fdopen(fd, "w", encoding="utf-8") as f:
+                    json.dump(memory, f, indent=2)
+                os.replace(tmp_path, self.memory_path)
+            except BaseException:
+                try:
+                    os.remove(tmp_path)
+                except OSError:
+                    pass
+                raise
+        return memory
+
+    async def _remember(self, domain: str, selector: str):
+        """Persist the selector that worked for a domain (None: no banner)."""
+        known = self.memory.get(domain)
+        if known and known.get("selector") == selector:
+            return
+        entry = {"selector": selector, "updated": datetime.datetime.now().isoformat()}
+        self.memory[domain] = entry
+        if not self.memory_path:
+            return
+        try:
+            merged = await asyncio.to_thread(self._save, domain, entry)
+        except OSError as e:
+            print(f"DEBUG: Could not save cookie memory: {e}")
+            return
+        # Domains learned by other runs, without losing this run's newer entries
+        self.memory = {**merged, **self.memory}
+
+    @staticmethod
+    def _domain(url: str) -> str:
+        return urlparse(url).netloc.replace("www.", "")
+
+    def _specs(self, preferred: str = None) -> list:
+        """Translate selectors into CSS + text pairs for COOKIE_PROBE_JS.
+        Playwright's :has-text() is not CSS, so it becomes a text filter.
+        """
+        ordered = list(self.selectors)
+        if preferred in ordered:
+            ordered.remove(preferred)
+            ordered.insert(0, preferred)
+
+        specs = []
+        for selector in ordered:
+            match = self.HAS_TEXT.match(selector)
+            if match:
+                specs.append({"selector": selector, "css": match.group(1) or "*", "text": match.group(3).lower()})
+            else:
+                specs.append({"selector": selector, "css": selector, "text": None})
+        return specs
+
+    async def install(self, page: Page):
+        """Register the consent overlay observer for all future documents of this page."""
+        await page.add_init_script("(() => {" + CONSENT_OBSERVER_JS + "})()")
+
+    async def accept(self, page: Page) -> bool:
+        """Detect and click a cookie acceptance button if present.
+        Returns True if a button was clicked.
+        """
+        domain = self._domain(page.url)
+        known = self.memory.get(domain) or {}
+        # Domains known to have no banner are only probed if an overlay shows up
+        settled = self.settled or (domain in self.memory and known.get("selector") is None)
+        try:
+            if settled and not await page.evaluate(CONSENT_DIRTY_JS):
+                self.skipped += 1
+                return False
+
+            self.probes += 1
+            found = await page.evaluate(COOKIE_PROBE_JS, self._specs(known.get("selector")))
+        except Exception:
+            return False
+
+        self.settled = True
+        if not found:
+            if domain not in self.memory:
+                await self._remember(domain, None)
+            return False
+
+        element = await resolve_ref(page, found["ref"])
+        if not element:
+            return False
+        try:
+            await element.click(timeout=5000)
+        except Exception:
+            return False
+
+        await self._remember(domain, found["selector"])
+        try:
+            # Wait for cookie banner to disappear
+            await page.wait_for_function(COOKIE_GONE_JS, arg=found["ref"], timeout=1000)
+        except Exception:
+            pass
+        return True
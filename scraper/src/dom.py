@@ -0,0 +1,54 @@
+from playwright.async_api import Page
+
+# In-page element registry shared by every evaluate() script that hands
+# elements back to Python. Elements are tracked in a WeakMap instead of being
+# tagged with an attribute, so registering them does not mutate the DOM (and
+# does not wake up MutationObservers on the page).
+# Prepend this to the body of a function expression to get fsRef()/fsVisible().
+REF_JS = """
+    const fsRefs = window.__fsRefs || (window.__fsRefs = { seq: 0, ids: new WeakMap(), els: new Map(), pruneAt: 5000 });
+    const fsRef = (el) => {
+        let id = fsRefs.ids.get(el);
+        if (!id) {
+            id = 'r' + (++fsRefs.seq);
+            fsRefs.ids.set(el, id);
+            fsRefs.els.set(id, new WeakRef(el));
+            // Drop detached elements from both maps (a re-attached one gets a
+            // fresh id); the next pass waits until the live set has doubled
+            if (fsRefs.els.size > fsRefs.pruneAt) {
+                for (const [key, weak] of fsRefs.els) {
+                    const node = weak.deref();
+                    if (node && node.isConnected) continue;
+                    fsRefs.els.delete(key);
+                    if (node) fsRefs.ids.delete(node);
+                }
+                fsRefs.pruneAt = Math.max(5000, fsRefs.els.size * 2);
+            }
+        }
+        return id;
+    };
+    // Same rule as Playwright's isVisible(): non-empty box and not visibility:hidden
+    const fsVisible = (el) => {
+        const rect = el.getBoundingClientRect();
+        if (!rect.width || !rect.height) return false;
+        return window.getComputedStyle(el).visibility !== 'hidden';
+    };
+"""
+
+
+async def resolve_ref(page: Page, ref: str):
+    """Turn a reference returned by an in-page scan into an ElementHandle.
+    Returns None if the element has been garbage collected or detached.
+    """
+    try:
+        handle = await page.evaluate_handle(
+            """(id) => {
+                const weak = window.__fsRefs && window.__fsRefs.els.get(id);
+                const el = weak && weak.deref();
+                return el && el.isConnected ? el : null;
+            }""",
+            ref,
+        )
+    except Exception:
+        return None
+    return handle.as_element()
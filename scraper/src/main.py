@@ -1,11 +1,17 @@
 import argparse
 import asyncio
+import os
+import time
 from pathlib import Path
 from src.config import Config
 from src.browser import Browser
 from src.clicker import Clicker
 from src.scraper import Scraper
+from src.converter import MarkdownConverter
 from src.reporter import Reporter
+from src.stabilizer import Stabilizer
+from src.state_graph import StateGraph
+from src.writer import ArtifactWriter
 
 
 async def run_funnel(
@@ -20,6 +26,8 @@ async def run_funnel(
     output_dir: str = None,
     on_step_completed=None,
     on_progress=None,
+    browser_pool=None,
+    markdown_executor=None,
 ):
     from urllib.parse import urlparse
 
@@ -33,7 +41,10 @@ async def run_funnel(
     # Setting directly in data dict because the property is likely read-only
     config.data["screenshot_delay_ms"] = 2000
 
-    async with Browser(config, headless=headless, keep_open=keep_open) as page:
+    browser = Browser(
+        config, headless=headless, keep_open=keep_open, funnel_url=url, pool=browser_pool
+    )
+    async with browser as page:
 
         # Set up network logging
         def log_request(request):
@@ -48,200 +59,354 @@ async def run_funnel(
         page.on("response", log_response)
 
         clicker = Clicker(config)
-        if output_dir:
-            reporter = Reporter(url, output_dir=output_dir, use_subdirectory=False)
-        else:
-            reporter = Reporter(url)
-        scraper = Scraper(output_dir=reporter.run_dir)
-
-        if on_progress:
-            await on_progress(
-                {"action": "navigate", "message": f"Navigating to {url}..."}
-            )
+        stabilizer = Stabilizer(
+            quiet_ms=config.stabilize_quiet_ms,
+            timeout_ms=config.stabilize_timeout_ms,
+        )
+        await stabilizer.install(page)
+        await clicker.cookies.install(page)
+        writer = ArtifactWriter(
+            workers=config.writer_workers, max_pending=config.writer_queue_size
+        )
+        converter = MarkdownConverter(
+            max_workers=config.markdown_workers, executor=markdown_executor
+        )
+        reporter = None
+        last_delivery = None
+        # From here on the converter and writer are always shut down, whether the
+        # first navigation fails or the run is cancelled mid-loop
+        try:
+            if output_dir:
+                reporter = Reporter(
+                    url,
+                    output_dir=output_dir,
+                    use_subdirectory=False,
+                    streaming=config.report_streaming,
+                    writer=writer,
+                    checkpoint_steps=config.report_checkpoint_steps,
+                )
+            else:
+                reporter = Reporter(
+                    url,
+                    streaming=config.report_streaming,
+                    writer=writer,
+                    checkpoint_steps=config.report_checkpoint_steps,
+                )
+            scraper = Scraper(output_dir=reporter.run_dir, converter=converter, writer=writer)
+
+            # Markdown conversion runs in a pool while the crawler moves on, so steps
+            # are delivered by a chain of tasks that each wait for the previous one:
+            # reporter and on_step_completed still see steps in order. Artifacts are
+            # written behind, so a step is only announced once its files are on disk.
+            async def deliver_step(previous, markdown_future, step_data):
+                if previous is not None:
+                    try:
+                        await previous
+                    except Exception:
+                        pass  # already reported by that step's own delivery
+                try:
+                    step_data["markdown_content"] = await markdown_future
+                    # Runs in a thread: submitting to a full writer queue blocks
+                    await asyncio.to_thread(
+                        reporter.record_step,
+                        step_data["step"],
+                        step_data["url"],
+                        step_data["screenshot_path"],
+                        step_data["markdown_content"],
+                        step_data["action_desc"],
+                        step_data.get("capture"),
+                    )
+                    # The step's record and Markdown too: a step is never announced
+                    # before it is in the log
+                    written = [
+                        step_data["screenshot_path"],
+                        step_data["html_path"],
+                        reporter.log_path,
+                        reporter.step_path(step_data["step"]),
+                    ]
+                    if step_data.get("capture", {}).get("manifest"):
+                        written.append(step_data["capture"]["manifest"])
+                    if step_data.get("favicon_filename"):
+                        written.append(os.path.join(reporter.run_dir, step_data["favicon_filename"]))
+                    await writer.wait_for(*written)
+                    if on_step_completed:
+                        await on_step_completed(step_data)
+                except Exception as e:
+                    print(f"[Step {step_data['step']}] Failed to deliver step: {e}")
+                    raise
+
+            def queue_step(markdown_future, step_data):
+                nonlocal last_delivery
+                last_delivery = asyncio.create_task(
+                    deliver_step(last_delivery, markdown_future, step_data)
+                )
 
-        # Initial navigation
-        await page.goto(url, wait_until="domcontentloaded")
-        # Wait for potential redirects and initial loading
-        await page.wait_for_timeout(3000)
+            async def capture_step(step):
+                """Capture screenshot, snapshot, HTML and Markdown for a step, or reuse
+                the previous capture's artifacts when the screen has not changed.
+                Returns (screenshot_path, html_path, markdown_future, snapshot, capture).
+                """
+                signature = None
+                if config.dedupe_threshold >= 0:
+                    signature = await scraper.visual_signature(page)
+                reference = scraper.find_reference(signature, config.dedupe_threshold)
+                if reference:
+                    print(
+                        f"[Step {step}] Same screen as step {reference['step']}, reusing its artifacts"
+                    )
+                    artifacts = reference["artifacts"]
+                    return (
+                        artifacts["screenshot_path"],
+                        artifacts["html_path"],
+                        artifacts["markdown_future"],
+                        artifacts["snapshot"],
+                        scraper.reuse_capture(step, reference),
+                    )
+
+                started = time.perf_counter()
+                screenshot_path = await scraper.capture_screenshot(
+                    page, step, config.capture_profile_for(step)
+                )
+                snapshot = await scraper.capture_snapshot(page)
+                html_path = await scraper.save_html(page, step, snapshot)
+                markdown_future = await scraper.submit_markdown(snapshot)
+                capture = scraper.captures[-1]
+                scraper.remember_capture(
+                    step,
+                    signature,
+                    {
+                        "screenshot_path": screenshot_path,
+                        "html_path": html_path,
+                        "markdown_future": markdown_future,
+                        "snapshot": snapshot,
+                    },
+                    (time.perf_counter() - started) * 1000,
+                    capture["bytes"] + len(snapshot["html"].encode("utf-8")),
+                )
+                return screenshot_path, html_path, markdown_future, snapshot, capture
 
-        # Extract initial domain
-        initial_domain = urlparse(page.url).netloc
-        visited_states = set()
+            if on_progress:
+                await on_progress(
+                    {"action": "navigate", "message": f"Navigating to {url}..."}
+                )
 
-        # Step 0: Initial Capture
-        if on_progress:
-            await on_progress(
-                {"action": "cookies", "message": "Checking for cookie banners..."}
+            # Initial navigation
+            await page.goto(url, wait_until="domcontentloaded")
+            # Wait for potential redirects and initial loading
+            stability = await stabilizer.wait(page, config.initial_load_timeout_ms)
+            print(
+                f"[Step 0] Stable after {stability['waited_ms']}ms (released by {stability['released_by']})"
             )
-        await clicker.accept_cookies(page)
 
-        if on_progress:
-            await on_progress(
-                {"action": "screenshot", "message": "Capturing initial screenshot..."}
-            )
+            # Extract initial domain
+            initial_domain = urlparse(page.url).netloc
+            # Canonical URL + structural fingerprint of every captured state
+            states = StateGraph(similarity=config.state_similarity)
 
-        screenshot_path = await scraper.capture_screenshot(page, 0)
-        html_path = await scraper.save_html(page, 0)
-        markdown_content = await scraper.extract_markdown(page)
-        metadata = await scraper.extract_metadata(page)
-        favicon_filename = await scraper.download_favicon(
-            metadata.get("favicon_url"), None
-        )
+            # Step 0: Initial Capture
+            if on_progress:
+                await on_progress(
+                    {"action": "cookies", "message": "Checking for cookie banners..."}
+                )
+            await clicker.accept_cookies(page)
 
-        reporter.record_step(
-            0, page.url, screenshot_path, markdown_content, "Initial page load"
-        )
+            if on_progress:
+                await on_progress(
+                    {"action": "screenshot", "message": "Capturing initial screenshot..."}
+                )
 
-        if on_step_completed:
-            await on_step_completed(
+            screenshot_path, html_path, markdown_future, snapshot, capture = (
+                await capture_step(0)
+            )
+            metadata = await scraper.extract_metadata(page, snapshot)
+            favicon_filename = await scraper.download_favicon(
+                metadata.get("favicon_url"), None
+            )
+
+            queue_step(
+                markdown_future,
                 {
                     "step": 0,
                     "url": page.url,
                     "screenshot_path": screenshot_path,
                     "html_path": html_path,
-                    "markdown_content": markdown_content,
                     "action_desc": "Initial page load",
                     "metadata": metadata,
                     "favicon_filename": favicon_filename,
-                }
+                    "stabilization": stability,
+                    "capture": capture,
+                },
             )
 
-        # Track initial state (URL + content hash)
-        try:
-            initial_content = await page.content()
-            import hashlib
-
-            initial_hash = hashlib.md5(initial_content.encode()).hexdigest()
-            visited_states.add(f"{page.url}:{initial_hash}")
-        except:
-            visited_states.add(page.url)
-
-        consecutive_failures = 0
-        max_consecutive_failures = 3
-
-        # --- LOOP START ---
-        for step in range(1, config.max_steps + 1):
-            if pause_at_step and step == pause_at_step:
-                print(f"\n🔍 PAUSED at step {step}. Opening Inspector...")
-                await page.pause()
-
-            # 1. STABILIZE PAGE
-            print(f"[Step {step}] Waiting for page to stabilize...")
-            if on_progress:
-                await on_progress(
-                    {
-                        "action": "wait",
-                        "message": f"Step {step}: Waiting for animation...",
-                        "step": step,
-                    }
+            # Track initial state
+            states.visit(snapshot, 0)
+
+            consecutive_failures = 0
+            max_consecutive_failures = 3
+
+            # --- LOOP START ---
+            for step in range(1, config.max_steps + 1):
+                if pause_at_step and step == pause_at_step:
+                    print(f"\n🔍 PAUSED at step {step}. Opening Inspector...")
+                    await page.pause()
+
+                # 1. STABILIZE PAGE
+                print(f"[Step {step}] Waiting for page to stabilize...")
+                if on_progress:
+                    await on_progress(
+                        {
+                            "action": "wait",
+                            "message": f"Step {step}: Waiting for animation...",
+                            "step": step,
+                        }
+                    )
+
+                # Critical for SPA: wait for data loading, DOM updates and CSS transitions
+                # to finish. Returns as soon as the page is quiet; the configured
+                # networkidle + screenshot delay budget is only the ceiling.
+                stability = await stabilizer.wait(page)
+                print(
+                    f"[Step {step}] Stable after {stability['waited_ms']}ms "
+                    f"(released by {stability['released_by']})"
                 )
 
-            # Critical for SPA: Wait for network to be idle (data loading)
-            try:
-                await page.wait_for_load_state("networkidle", timeout=4000)
-            except:
-                pass
-
-            # Critical for SPA: Explicit wait for CSS transitions
-            # Use the value we set in data, or fallback to 2000
-            delay = config.data.get("screenshot_delay_ms", 2000)
-            await page.wait_for_timeout(delay)
-
-            # 2. CHECK COOKIES (Again, as they might appear later)
-            await clicker.accept_cookies(page)
-
-            # 3. CAPTURE STATE (Before Action)
-            print(f"[Step {step}] Capturing state...")
-            screenshot_path = await scraper.capture_screenshot(page, step)
-            html_path = await scraper.save_html(page, step)
-            markdown_content = await scraper.extract_markdown(page)
+                # 2. CHECK COOKIES (Again, as they might appear later)
+                await clicker.accept_cookies(page)
 
-            # 4. PERFORM ACTION
-            print(f"[Step {step}] Looking for interactions on {page.url}")
-            if on_progress:
-                await on_progress(
-                    {
-                        "action": "looking",
-                        "message": f"Step {step}: Finding element to click...",
-                        "step": step,
-                    }
+                # 3. CAPTURE STATE (Before Action)
+                print(f"[Step {step}] Capturing state...")
+                screenshot_path, html_path, markdown_future, snapshot, capture = (
+                    await capture_step(step)
                 )
 
-            # Get clean URLs for visited check
-            visited_urls = {state.split(":")[0] for state in visited_states}
-
-            # Execute Click
-            action_desc = await clicker.click_random(page, initial_domain, visited_urls)
-            print(f"[Step {step}] Action: {action_desc}")
-
-            if on_progress:
-                await on_progress(
-                    {
-                        "action": "click",
-                        "message": f"Step {step}: {action_desc}",
-                        "step": step,
-                    }
-                )
+                # Mark the captured state as visited; coming back to a known state
+                # steers the click away from what was tried there, and stops
+                # the run once the same state keeps coming back
+                # (MinHash of a large page takes tens of ms: off the event loop)
+                visit = await asyncio.to_thread(states.visit, snapshot, step)
+                if visit["revisits"]:
+                    print(
+                        f"[Step {step}] Back at the state of step {visit['first_step']} "
+                        f"(revisit {visit['revisits']}, cycle {visit['cycle']}"
+                        f"{', near-duplicate' if visit['near_duplicate'] else ''})"
+                    )
+                if visit["revisits"] > config.max_state_revisits:
+                    print("❌ Loop detected. Stopping.")
+                    queue_step(
+                        markdown_future,
+                        {
+                            "step": step,
+                            "url": page.url,
+                            "screenshot_path": screenshot_path,
+                            "html_path": html_path,
+                            "action_desc": f"Loop detected: same state as step {visit['first_step']}",
+                            "stabilization": stability,
+                            "capture": capture,
+                        },
+                    )
+                    break
 
-            # 5. POST-CLICK HANDLING
-            # If no elements found, wait and see if it's a redirect/loader
-            if action_desc == "No clickable elements found":
-                print(
-                    f"[Step {step}] ⏳ No elements. Waiting 10s for potential redirect/load..."
+                # 4. PERFORM ACTION
+                print(f"[Step {step}] Looking for interactions on {page.url}")
+                if on_progress:
+                    await on_progress(
+                        {
+                            "action": "looking",
+                            "message": f"Step {step}: Finding element to click...",
+                            "step": step,
+                        }
+                    )
+
+                # Execute Click
+                action_desc = await clicker.click_random(
+                    page, initial_domain, states.urls, avoid=states.tried_actions(visit["key"])
                 )
-                start_url = page.url
-                for i in range(10):
-                    await page.wait_for_timeout(1000)
-                    # Check if URL changed or new elements appeared
-                    if page.url != start_url:
-                        action_desc = f"Waited {i+1}s and redirected"
-                        break
-                    # Quick check if something appeared (without full click logic)
-                    if await page.query_selector("button, input, a"):
-                        # Try clicking again in next loop
-                        action_desc = f"Waited {i+1}s, elements appeared"
-                        break
-
+                states.record_action(visit["key"], clicker.last_clicked_text)
+                print(f"[Step {step}] Action: {action_desc}")
+                print(f"[Step {step}] Element selection took {clicker.last_selection_ms:.1f}ms")
+
+                if on_progress:
+                    await on_progress(
+                        {
+                            "action": "click",
+                            "message": f"Step {step}: {action_desc}",
+                            "step": step,
+                        }
+                    )
+
+                # 5. POST-CLICK HANDLING
+                # If no elements found, this may be a redirect or a loader: wake up
+                # on navigation or on new interactive elements, whichever comes first
                 if action_desc == "No clickable elements found":
-                    print("❌ Dead end. Stopping.")
-                    break
-
-            # 6. RECORD DATA
-            reporter.record_step(
-                step, page.url, screenshot_path, markdown_content, action_desc
-            )
+                    print(
+                        f"[Step {step}] ⏳ No elements. Waiting up to "
+                        f"{config.dead_end_timeout_ms}ms for a redirect or new elements..."
+                    )
+                    woke = await stabilizer.wait_for_interactive(page, config.dead_end_timeout_ms)
+                    print(
+                        f"[Step {step}] Woke after {woke['waited_ms']}ms (by {woke['woke_by']}"
+                        f"{': ' + repr(woke['element']) if woke['element'] else ''})"
+                    )
+                    waited_s = woke["waited_ms"] / 1000
+                    if woke["woke_by"] == "navigation":
+                        action_desc = f"Waited {waited_s:.1f}s and redirected"
+                    elif woke["woke_by"] == "interactive":
+                        action_desc = f"Waited {waited_s:.1f}s, elements appeared"
+                    else:
+                        print("❌ Dead end. Stopping.")
+                        break
 
-            if on_step_completed:
-                await on_step_completed(
+                # 6. RECORD DATA (once the markdown conversion is done)
+                queue_step(
+                    markdown_future,
                     {
                         "step": step,
                         "url": page.url,
                         "screenshot_path": screenshot_path,
                         "html_path": html_path,
-                        "markdown_content": markdown_content,
                         "action_desc": action_desc,
-                    }
+                        "selection_ms": round(clicker.last_selection_ms, 1),
+                        "stabilization": stability,
+                        "capture": capture,
+                    },
                 )
 
-            # 7. INFINITE LOOP PROTECTION
-            if "Failed to click" in action_desc:
-                consecutive_failures += 1
-                if consecutive_failures >= 3:
-                    print("❌ Stuck in loop. Stopping.")
-                    break
-            else:
-                consecutive_failures = 0
-
-            # Mark state as visited
-            try:
-                page_content = await page.content()
-                import hashlib
-
-                page_hash = hashlib.md5(page_content.encode()).hexdigest()
-                visited_states.add(f"{page.url}:{page_hash}")
-            except:
-                visited_states.add(page.url)
-
+                # 7. INFINITE LOOP PROTECTION
+                if "Failed to click" in action_desc:
+                    consecutive_failures += 1
+                    if consecutive_failures >= 3:
+                        print("❌ Stuck in loop. Stopping.")
+                        break
+                else:
+                    consecutive_failures = 0
+
+        finally:
+            # Wait for the remaining conversions and deliveries
+            if last_delivery is not None:
+                try:
+                    await last_delivery
+                except Exception:
+                    pass
+            converter.shutdown()
+            # Flush pending artifacts in order, then build funnel_data.json /
+            # funnel_report.md from the step log
+            await asyncio.to_thread(writer.flush)
+            if reporter:
+                await asyncio.to_thread(reporter.finalize)
+            writer.close()
+
+        print(f"Element selection: {clicker.selection_stats()}")
+        print(f"Page stabilization: {stabilizer.stats()}")
+        print(
+            f"Cookie banner: {clicker.cookies.probes} probes, {clicker.cookies.skipped} skipped"
+        )
+        print(f"Resource blocking: {browser.router.stats()}")
+        if browser.asset_cache:
+            print(f"Asset cache: {browser.asset_cache.stats()}")
+        print(f"Screenshots: {scraper.capture_stats()}")
+        print(f"Reused captures: {scraper.reuse_stats()}")
+        print(f"State graph: {states.stats()}")
+        print(f"Artifact I/O: {writer.summary()}")
         print(f"Funnel run completed. Report: {reporter.md_path}")
 
 
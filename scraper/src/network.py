@@ -0,0 +1,133 @@
+from fnmatch import fnmatch
+from urllib.parse import urlparse
+from playwright.async_api import BrowserContext, Route
+
+# Analytics, advertising and session-recording hosts (matched with subdomains)
+TRACKER_DOMAINS = [
+    "google-analytics.com",
+    "googletagmanager.com",
+    "googleadservices.com",
+    "doubleclick.net",
+    "googlesyndication.com",
+    "connect.facebook.net",
+    "analytics.tiktok.com",
+    "bat.bing.com",
+    "clarity.ms",
+    "hotjar.com",
+    "hotjar.io",
+    "mixpanel.com",
+    "segment.io",
+    "cdn.segment.com",
+    "api.amplitude.com",
+    "cdn.amplitude.com",
+    "heapanalytics.com",
+    "fullstory.com",
+    "mc.yandex.ru",
+    "snap.licdn.com",
+    "static.ads-twitter.com",
+    "sc-static.net",
+    "ct.pinterest.com",
+]
+
+
+class RequestRouter:
+    """Blocks requests on a browser context according to `resource_blocking` rules.
+    Every category is opt-in, so with an empty config nothing is blocked and
+    no route is registered at all:
+
+        resource_blocking:
+          resource_types: [media, font]    # Playwright resource types
+          trackers: true                   # built-in TRACKER_DOMAINS
+          tracker_domains: [example-analytics.com]
+          url_patterns: ["*/pixel.gif*"]   # fnmatch patterns on the full URL
+          allow: ["*fonts.gstatic.com*"]   # never blocked
+          funnels:                         # extra allow-list per funnel domain
+            example.com:
+              allow: ["*.woff2"]
+
+    Documents are never blocked. Keeps per-run counters of requests and bytes
+    blocked versus allowed.
+    """
+
+    def __init__(self, rules: dict = None, funnel_url: str = None):
+        rules = rules or {}
+        self.resource_types = set(rules.get("resource_types") or [])
+        self.tracker_domains = list(rules.get("tracker_domains") or [])
+        if rules.get("trackers"):
+            self.tracker_domains += TRACKER_DOMAINS
+        self.url_patterns = list(rules.get("url_patterns") or [])
+        self.allow = list(rules.get("allow") or [])
+
+        funnel_domain = urlparse(funnel_url).netloc.replace("www.", "") if funnel_url else ""
+        for domain, funnel_rules in (rules.get("funnels") or {}).items():
+            if funnel_domain and (funnel_domain == domain or funnel_domain.endswith("." + domain)):
+                self.allow += list((funnel_rules or {}).get("allow") or [])
+
+        self.blocked = {}
+        self.allowed = {}
+        self.bytes_allowed = {}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.resource_types or self.tracker_domains or self.url_patterns)
+
+    def _is_tracker(self, host: str) -> bool:
+        return any(host == domain or host.endswith("." + domain) for domain in self.tracker_domains)
+
+    def match(self, url: str, resource_type: str) -> str:
+        """Name of the rule that blocks this request, or None if it is allowed."""
+        if resource_type == "document":
+            return None
+        if any(fnmatch(url, pattern) for pattern in self.allow):
+            return None
+        if resource_type in self.resource_types:
+            return f"type:{resource_type}"
+        if self.tracker_domains and self._is_tracker(urlparse(url).hostname or ""):
+            return "tracker"
+        for pattern in self.url_patterns:
+            if fnmatch(url, pattern):
+                return "pattern"
+        return None
+
+    async def _handle(self, route: Route):
+        request = route.request
+        rule = self.match(request.url, request.resource_type)
+        if rule:
+            self.blocked[request.resource_type] = self.blocked.get(request.resource_type, 0) + 1
+            await route.abort("blockedbyclient")
+        else:
+            # Let other handlers (e.g. the asset cache) or the network serve it
+            await route.fallback()
+
+    def _on_response(self, response):
+        try:
+            size = int(response.headers.get("content-length", 0))
+        except ValueError:
+            size = 0
+        resource_type = response.request.resource_type
+        self.allowed[resource_type] = self.allowed.get(resource_type, 0) + 1
+        self.bytes_allowed[resource_type] = self.bytes_allowed.get(resource_type, 0) + size
+
+    async def install(self, context: BrowserContext):
+        """Route all requests of the context through the rules (only if any rule is set)."""
+        context.on("response", self._on_response)
+        if self.enabled:
+            await context.route("**/*", self._handle)
+
+    def stats(self) -> dict:
+        """Requests blocked/allowed per resource type. Blocked bytes are estimated
+        from the average size of allowed responses of the same type.
+        """
+        bytes_blocked = 0
+        for resource_type, count in self.blocked.items():
+            seen = self.allowed.get(resource_type, 0)
+            if seen:
+                bytes_blocked += count * self.bytes_allowed.get(resource_type, 0) // seen
+        return {
+            "enabled": self.enabled,
+            "blocked": sum(self.blocked.values()),
+            "allowed": sum(self.allowed.values()),
+            "blocked_by_type": dict(self.blocked),
+            "bytes_allowed": sum(self.bytes_allowed.values()),
+            "bytes_blocked_estimate": bytes_blocked,
+        }
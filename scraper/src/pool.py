@@ -0,0 +1,224 @@
+import os
+import asyncio
+import threading
+from playwright.async_api import async_playwright, BrowserContext
+
+
+class WorkerLoop:
+    """A persistent event loop on a background thread.
+    Playwright objects are bound to the loop that created them, so a browser
+    kept alive across tasks needs a loop that outlives asyncio.run().
+    Synchronous callers (Celery tasks) submit coroutines with run().
+    """
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="worker-loop", daemon=True)
+        self.thread.start()
+
+    def run(self, coro, timeout: float = None):
+        """Run a coroutine on the loop and block until it finishes."""
+        return asyncio.run_coroutine_threadsafe(coro, self.loop).result(timeout)
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
+
+
+# Process names of the Playwright driver and Chromium (incl. headless shell)
+BROWSER_PROCESS_NAMES = ("chrome", "headless_shell", "node")
+CHROMIUM_PROCESS_NAMES = ("chrome", "headless_shell")
+
+
+def _process_table() -> tuple:
+    """(children by parent pid, (name, rss kB) by pid) from /proc; empty where unavailable."""
+    children = {}
+    procs = {}
+    try:
+        pids = [int(name) for name in os.listdir("/proc") if name.isdigit()]
+    except OSError:
+        return children, procs
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/status", "r") as f:
+                status = f.read()
+        except OSError:
+            continue
+        ppid, kb, name = None, 0, ""
+        for line in status.splitlines():
+            if line.startswith("Name:"):
+                name = line[5:].strip()
+            elif line.startswith("PPid:"):
+                ppid = int(line.split()[1])
+            elif line.startswith("VmRSS:"):
+                kb = int(line.split()[1])
+        children.setdefault(ppid, []).append(pid)
+        procs[pid] = (name, kb)
+    return children, procs
+
+
+def _descendants(children: dict, root_pid: int) -> list:
+    found = []
+    stack = list(children.get(root_pid, []))
+    while stack:
+        pid = stack.pop()
+        found.append(pid)
+        stack.extend(children.get(pid, []))
+    return found
+
+
+def process_tree_rss_mb(root_pid: int = None) -> float:
+    """Resident memory of the Playwright driver and browser processes below a
+    process, in MB. Returns 0 where /proc is not available.
+    """
+    children, procs = _process_table()
+    total_kb = sum(
+        procs[pid][1]
+        for pid in _descendants(children, root_pid or os.getpid())
+        if pid in procs and procs[pid][0].startswith(BROWSER_PROCESS_NAMES)
+    )
+    return total_kb / 1024
+
+
+def browser_rss_mb(browser_pid: int) -> float:
+    """Resident memory of one Chromium: its main process and everything below it, in MB."""
+    children, procs = _process_table()
+    pids = [browser_pid] + _descendants(children, browser_pid)
+    return sum(procs[pid][1] for pid in pids if pid in procs) / 1024
+
+
+def browser_pids(root_pid: int = None) -> set:
+    """Main processes of the Chromium instances below a process (renderers and
+    other helpers are children of those, not of the driver).
+    """
+    children, procs = _process_table()
+    parents = {pid: ppid for ppid, kids in children.items() for pid in kids}
+    pids = set()
+    for pid in _descendants(children, root_pid or os.getpid()):
+        name = procs.get(pid, ("", 0))[0]
+        parent_name = procs.get(parents.get(pid), ("", 0))[0]
+        if name.startswith(CHROMIUM_PROCESS_NAMES) and not parent_name.startswith(CHROMIUM_PROCESS_NAMES):
+            pids.add(pid)
+    return pids
+
+
+class BrowserPool:
+    """Chromium launched once and shared by many runs, each in a fresh context.
+    * lease() health-checks the browser and returns a new isolated context.
+    * The browser is recycled after max_contexts leases or when its own
+      process tree (main process, renderers, GPU...) exceeds max_rss_mb.
+      Browsers still draining and other pools don't count towards it.
+      A recycled browser is drained: it is closed once its last leased
+      context is released.
+    """
+
+    def __init__(self, headless: bool = True, max_contexts: int = 50, max_rss_mb: int = 1500):
+        self.headless = headless
+        self.max_contexts = max_contexts
+        self.max_rss_mb = max_rss_mb
+        self.playwright = None
+        self.current = None
+        self.draining = []
+        self.owners = {}
+        self._lock = asyncio.Lock()
+        self.launches = 0
+        self.leases = 0
+
+    async def _launch(self) -> dict:
+        if self.playwright is None:
+            self.playwright = await async_playwright().start()
+        # Launches are serialized by the lease lock: the one new main process
+        # is this browser's
+        before = await asyncio.to_thread(browser_pids)
+        browser = await self.playwright.chromium.launch(headless=self.headless)
+        new_pids = await asyncio.to_thread(browser_pids) - before
+        self.launches += 1
+        print(f"DEBUG: Browser pool launched Chromium #{self.launches}")
+        pid = new_pids.pop() if len(new_pids) == 1 else None
+        return {"browser": browser, "served": 0, "active": 0, "pid": pid}
+
+    async def _retire(self, entry: dict):
+        """Stop leasing from a browser; close it once no context is left."""
+        if entry is self.current:
+            self.current = None
+        if entry["active"]:
+            entry["draining"] = True
+            self.draining.append(entry)
+            return
+        try:
+            await entry["browser"].close()
+        except Exception:
+            pass
+
+    async def _needs_recycle(self, entry: dict) -> bool:
+        if not entry["browser"].is_connected():
+            return True
+        if entry["served"] >= self.max_contexts:
+            return True
+        if not self.max_rss_mb or not entry["pid"]:
+            # Without a known process (no /proc) the context limit still applies
+            return False
+        return await asyncio.to_thread(browser_rss_mb, entry["pid"]) > self.max_rss_mb
+
+    async def lease(self, **context_options) -> BrowserContext:
+        """Return a fresh context from a healthy browser."""
+        async with self._lock:
+            for attempt in range(2):
+                if self.current and await self._needs_recycle(self.current):
+                    print(f"DEBUG: Recycling browser after {self.current['served']} contexts")
+                    await self._retire(self.current)
+                if not self.current:
+                    self.current = await self._launch()
+                try:
+                    context = await self.current["browser"].new_context(**context_options)
+                    break
+                except Exception as e:
+                    # Unhealthy browser: replace it and retry once
+                    print(f"DEBUG: Browser pool health check failed: {e}")
+                    await self._retire(self.current)
+                    if attempt:
+                        raise
+            self.current["served"] += 1
+            self.current["active"] += 1
+            self.owners[context] = self.current
+            self.leases += 1
+            return context
+
+    async def release(self, context: BrowserContext):
+        """Close a leased context and finish draining its browser if needed."""
+        try:
+            await context.close()
+        except Exception:
+            pass
+        entry = self.owners.pop(context, None)
+        if not entry:
+            return
+        entry["active"] -= 1
+        if entry.get("draining") and not entry["active"]:
+            self.draining = [other for other in self.draining if other is not entry]
+            try:
+                await entry["browser"].close()
+            except Exception:
+                pass
+
+    async def close(self):
+        for entry in ([self.current] if self.current else []) + self.draining:
+            try:
+                await entry["browser"].close()
+            except Exception:
+                pass
+        self.current = None
+        self.draining = []
+        if self.playwright:
+            await self.playwright.stop()
+            self.playwright = None
+
+    def stats(self) -> dict:
+        return {
+            "launches": self.launches,
+            "leases": self.leases,
+            "active": len(self.owners),
+            "current_served": self.current["served"] if self.current else 0,
+            "rss_mb": round(process_tree_rss_mb(), 1),
+            "current_rss_mb": round(browser_rss_mb(self.current["pid"]), 1) if self.current and self.current["pid"] else 0,
+        }
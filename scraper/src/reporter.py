@@ -6,13 +6,25 @@ from urllib.parse import urlparse
 class Reporter:
     """Handles incremental Markdown and JSON reporting for each funnel step.
     Creates/initializes files at start and appends after each captured step.
+
+    In streaming mode every step is appended as one fsync'd line to
+    funnel_steps.jsonl and only a small index is kept in memory;
+    funnel_data.json and funnel_report.md are materialized by finalize(),
+    and every checkpoint_steps steps so a killed run leaves them usable.
+
+    With a writer (ArtifactWriter) all writes are queued and done off-loop;
+    reads (read_step, finalize) flush it first.
     """
 
-    def __init__(self, url: str, output_dir: str = "outputs", use_subdirectory: bool = True):
+    def __init__(self, url: str, output_dir: str = "outputs", use_subdirectory: bool = True, streaming: bool = False, writer=None, checkpoint_steps: int = 0):
         # Extract domain from URL
         parsed = urlparse(url)
         domain = parsed.netloc.replace('www.', '').replace('.', '_')
         timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S")
+        self.timestamp = timestamp
+        self.streaming = streaming
+        self.checkpoint_steps = checkpoint_steps
+        self.writer = writer
 
         # Create directory for this specific run
         if use_subdirectory:
@@ -24,51 +36,111 @@ class Reporter:
 
         # Create README.md with URL info
         readme_path = os.path.join(self.run_dir, "README.md")
-        with open(readme_path, "w", encoding="utf-8") as f:
-            f.write(f"# Funnel Report\n\n")
-            f.write(f"**URL:** {url}\n\n")
-            f.write(f"**Domain:** {parsed.netloc}\n\n")
-            f.write(f"**Started:** {timestamp}\n\n")
+        self._write(readme_path, (
+            f"# Funnel Report\n\n"
+            f"**URL:** {url}\n\n"
+            f"**Domain:** {parsed.netloc}\n\n"
+            f"**Started:** {timestamp}\n\n"
+        ))
 
         self.md_path = os.path.join(self.run_dir, f"funnel_report.md")
         self.json_path = os.path.join(self.run_dir, f"funnel_data.json")
+        self.jsonl_path = os.path.join(self.run_dir, "funnel_steps.jsonl")
 
         # Initialize files
-        with open(self.md_path, "w", encoding="utf-8") as f_md:
-            f_md.write(f"# Funnel Report – {timestamp}\n\n")
-        with open(self.json_path, "w", encoding="utf-8") as f_json:
-            json.dump([], f_json, indent=2)
+        self._write(self.md_path, self._markdown_header())
+        self._write(self.json_path, json.dumps([], indent=2))
         self.steps = []
 
+        # Streaming mode: byte offsets of each step's record in the JSONL log
+        self.index = []
+        self._jsonl_size = 0
+        if streaming:
+            self._write(self.jsonl_path, b"")
+
+    def _write(self, path: str, data, mode: str = "w", fsync: bool = False):
+        """Write (mode 'w') or append (mode 'a') str/bytes, through the writer if any."""
+        if self.writer:
+            self.writer.submit(path, data, mode=mode, fsync=fsync)
+            return
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        with open(path, mode + "b") as f:
+            f.write(data)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+
+    def flush(self):
+        """Wait until all queued report writes are on disk."""
+        if self.writer:
+            self.writer.flush()
+
+    def _markdown_header(self) -> str:
+        return f"# Funnel Report – {self.timestamp}\n\n"
+
+    @staticmethod
+    def _markdown_section(step_num: int, url: str, screenshot_path: str, markdown_content: str, action: str) -> str:
+        # Ensure absolute path for screenshot
+        abs_screenshot_path = os.path.abspath(screenshot_path)
+        return (
+            f"## Step {step_num}\n"
+            f"**URL:** {url}\n\n"
+            f"**Action:** {action}\n\n"
+            f"![Screenshot]({abs_screenshot_path})\n\n"
+            f"{markdown_content}\n\n---\n\n"
+        )
+
     def _append_markdown(self, step_num: int, url: str, screenshot_path: str, markdown_content: str, action: str):
         # Ensure absolute path for screenshot
         abs_screenshot_path = os.path.abspath(screenshot_path)
-        
-        # Append to main report
-        with open(self.md_path, "a", encoding="utf-8") as f_md:
-            f_md.write(f"## Step {step_num}\n")
-            f_md.write(f"**URL:** {url}\n\n")
-            f_md.write(f"**Action:** {action}\n\n")
-            f_md.write(f"![Screenshot]({abs_screenshot_path})\n\n")
-            f_md.write(f"{markdown_content}\n\n---\n\n")
+
+        # Append to main report (materialized at the end in streaming mode)
+        if not self.streaming:
+            self._write(self.md_path, self._markdown_section(step_num, url, screenshot_path, markdown_content, action), mode="a")
 
         # Create individual step file
-        step_file = os.path.join(self.run_dir, f"step_{step_num}.md")
-        with open(step_file, "w", encoding="utf-8") as f_step:
-            f_step.write(f"# Step {step_num}\n\n")
-            f_step.write(f"**URL:** {url}\n\n")
-            f_step.write(f"**Action:** {action}\n\n")
-            f_step.write(f"![Screenshot]({abs_screenshot_path})\n\n")
-            f_step.write(f"## Page Content\n\n")
-            f_step.write(f"{markdown_content}\n")
+        self._write(self.step_path(step_num), (
+            f"# Step {step_num}\n\n"
+            f"**URL:** {url}\n\n"
+            f"**Action:** {action}\n\n"
+            f"![Screenshot]({abs_screenshot_path})\n\n"
+            f"## Page Content\n\n"
+            f"{markdown_content}\n"
+        ))
+
+    def step_path(self, step_num: int) -> str:
+        """Path of a step's own Markdown file."""
+        return os.path.join(self.run_dir, f"step_{step_num}.md")
+
+    @property
+    def log_path(self) -> str:
+        """File that holds each step's record: the JSONL log, or funnel_data.json."""
+        return self.jsonl_path if self.streaming else self.json_path
 
     def _write_json(self):
-        with open(self.json_path, "w", encoding="utf-8") as f_json:
-            json.dump(self.steps, f_json, indent=2, ensure_ascii=False)
+        self._write(self.json_path, json.dumps(self.steps, indent=2, ensure_ascii=False))
+
+    def _append_jsonl(self, entry: dict):
+        """Append one step record and fsync it, so a crash never loses a recorded step."""
+        line = (json.dumps(entry, ensure_ascii=False) + "\n").encode("utf-8")
+        self._write(self.jsonl_path, line, mode="a", fsync=True)
+
+        self.index.append({
+            "step": entry["step"],
+            "url": entry["url"],
+            "action": entry["action"],
+            "offset": self._jsonl_size,
+            "length": len(line),
+        })
+        self._jsonl_size += len(line)
 
-    def record_step(self, step_num: int, url: str, screenshot_path: str, markdown_content: str, action: str):
+    def record_step(self, step_num: int, url: str, screenshot_path: str, markdown_content: str, action: str, capture: dict = None):
         """Record a step both in markdown and JSON.
-        This method is crash‑resilient: it updates the JSON file after each call.
+        This method is crash‑resilient: it updates the JSON file (or, in
+        streaming mode, the fsync'd JSONL log, plus the reports at each
+        checkpoint) after each call.
+        `capture` (screenshot profile, encode time, bytes) is stored as is.
         """
         entry = {
             "step": step_num,
@@ -78,6 +150,57 @@ class Reporter:
             "action": action,
             "timestamp": datetime.datetime.now().isoformat(),
         }
-        self.steps.append(entry)
+        if capture:
+            entry["capture"] = capture
         self._append_markdown(step_num, url, screenshot_path, markdown_content, action)
-        self._write_json()
+        if self.streaming:
+            self._append_jsonl(entry)
+            if self.checkpoint_steps and len(self.index) % self.checkpoint_steps == 0:
+                self._materialize()
+        else:
+            self.steps.append(entry)
+            self._write_json()
+
+    def read_step(self, position: int) -> dict:
+        """Load the full record of the n-th recorded step from the JSONL log."""
+        item = self.index[position]
+        self.flush()
+        with open(self.jsonl_path, "rb") as f_jsonl:
+            f_jsonl.seek(item["offset"])
+            return json.loads(f_jsonl.read(item["length"]).decode("utf-8"))
+
+    def _iter_jsonl(self):
+        with open(self.jsonl_path, "r", encoding="utf-8") as f_jsonl:
+            for line in f_jsonl:
+                if line.strip():
+                    yield json.loads(line)
+
+    def finalize(self):
+        """Materialize funnel_data.json and funnel_report.md from the JSONL log.
+        Streams one record at a time, so memory stays flat. No-op outside
+        streaming mode, where both files are always up to date.
+        """
+        if self.streaming:
+            self._materialize()
+        else:
+            self.flush()
+
+    def _materialize(self):
+        """Rebuild funnel_data.json and funnel_report.md from the JSONL log."""
+        self.flush()
+        json_tmp = f"{self.json_path}.tmp"
+        md_tmp = f"{self.md_path}.tmp"
+        with open(json_tmp, "w", encoding="utf-8") as f_json, open(md_tmp, "w", encoding="utf-8") as f_md:
+            f_md.write(self._markdown_header())
+            f_json.write("[")
+            count = 0
+            for entry in self._iter_jsonl():
+                record = json.dumps(entry, indent=2, ensure_ascii=False).replace("\n", "\n  ")
+                f_json.write(("," if count else "") + "\n  " + record)
+                count += 1
+                f_md.write(self._markdown_section(
+                    entry["step"], entry["url"], entry["screenshot"], entry["markdown"], entry["action"]
+                ))
+            f_json.write("\n]" if count else "]")
+        os.replace(json_tmp, self.json_path)
+        os.replace(md_tmp, self.md_path)
@@ -1,170 +1,459 @@
+import io
 import os
-import datetime
-import re
-import base64
+import json
+import time
+import asyncio
 from playwright.async_api import Page
-from markdownify import markdownify as md
 from urllib.parse import urljoin
 import aiohttp
+from .converter import MarkdownConverter, html_to_markdown
+from .writer import ArtifactWriter
+from .state_graph import STATE_JS
+
+# Page metadata: title, description and the best available icon URL
+METADATA_JS = """() => {
+    // Extract title
+    let title = document.title || '';
+
+    // Try og:title first, fallback to title tag
+    const ogTitle = document.querySelector('meta[property="og:title"]');
+    if (ogTitle && ogTitle.content) {
+        title = ogTitle.content;
+    }
+
+    // Extract description
+    let description = '';
+    const metaDesc = document.querySelector('meta[name="description"]');
+    if (metaDesc && metaDesc.content) {
+        description = metaDesc.content;
+    }
+
+    // Try og:description as fallback
+    if (!description) {
+        const ogDesc = document.querySelector('meta[property="og:description"]');
+        if (ogDesc && ogDesc.content) {
+            description = ogDesc.content;
+        }
+    }
+
+    // Extract favicon/icon URLs with priority:
+    // 1. apple-touch-icon (usually highest quality)
+    // 2. icon with sizes
+    // 3. shortcut icon / icon
+    // 4. og:image
+    let iconUrl = '';
+
+    // Try apple-touch-icon first (best quality)
+    const appleTouchIcon = document.querySelector('link[rel*="apple-touch-icon"]');
+    if (appleTouchIcon && appleTouchIcon.href) {
+        iconUrl = appleTouchIcon.href;
+    }
+
+    // Try icon with sizes
+    if (!iconUrl) {
+        const iconWithSizes = document.querySelector('link[rel="icon"][sizes]');
+        if (iconWithSizes && iconWithSizes.href) {
+            iconUrl = iconWithSizes.href;
+        }
+    }
+
+    // Try regular icon/shortcut icon
+    if (!iconUrl) {
+        const icon = document.querySelector('link[rel*="icon"]');
+        if (icon && icon.href) {
+            iconUrl = icon.href;
+        }
+    }
+
+    // Fallback to og:image if no favicon found
+    if (!iconUrl) {
+        const ogImage = document.querySelector('meta[property="og:image"]');
+        if (ogImage && ogImage.content) {
+            iconUrl = ogImage.content;
+        }
+    }
+
+    // Last resort: try /favicon.ico
+    if (!iconUrl) {
+        iconUrl = '/favicon.ico';
+    }
+
+    return {
+        title: title,
+        description: description,
+        favicon_url: iconUrl
+    };
+}"""
+
+# Visible HTML of the page, without scripts, styles and hidden elements.
+# Walks the live DOM once with a TreeWalker: hidden or non-content elements
+# are rejected together with their whole subtree, so getComputedStyle only
+# runs on nodes that can end up in the output. Emits compact HTML that keeps
+# only the attributes markdownify uses (links and images).
+VISIBLE_HTML_JS = """() => {
+    const SKIP = new Set(['SCRIPT', 'STYLE', 'NOSCRIPT', 'SVG', 'IFRAME', 'LINK', 'META', 'TEMPLATE']);
+    const VOID = new Set(['AREA', 'BR', 'COL', 'EMBED', 'HR', 'IMG', 'INPUT', 'SOURCE', 'TRACK', 'WBR']);
+    const ATTRS = ['href', 'src', 'alt', 'title'];
+    const escapeText = (s) => s.replace(/&/g, '&amp;').replace(/</g, '&lt;').replace(/>/g, '&gt;');
+    const escapeAttr = (s) => escapeText(s).replace(/"/g, '&quot;');
+
+    const out = [];
+    const open = (el) => {
+        let attrs = '';
+        for (const name of ATTRS) {
+            const value = el.getAttribute(name);
+            if (value !== null) attrs += ' ' + name + '="' + escapeAttr(value) + '"';
+        }
+        out.push('<' + el.localName + attrs + '>');
+    };
+    const close = (el) => {
+        if (!VOID.has(el.tagName.toUpperCase())) out.push('</' + el.localName + '>');
+    };
+    const emit = (node) => {
+        if (node.nodeType === Node.TEXT_NODE) {
+            out.push(/\\S/.test(node.data) ? escapeText(node.data) : ' ');
+        } else {
+            open(node);
+        }
+    };
+
+    const root = document.body;
+    out.push('<html><head><title>' + escapeText(document.title || '') + '</title></head>');
+    if (!root) return out.join('') + '</html>';
+
+    const walker = document.createTreeWalker(root, NodeFilter.SHOW_ELEMENT | NodeFilter.SHOW_TEXT, {
+        acceptNode(node) {
+            if (node.nodeType === Node.TEXT_NODE) return NodeFilter.FILTER_ACCEPT;
+            if (SKIP.has(node.tagName.toUpperCase())) return NodeFilter.FILTER_REJECT;
+            const style = window.getComputedStyle(node);
+            if (style.display === 'none' || style.visibility === 'hidden' || style.opacity === '0') {
+                return NodeFilter.FILTER_REJECT;
+            }
+            return NodeFilter.FILTER_ACCEPT;
+        },
+    });
+
+    open(root);
+    let node = walker.firstChild();
+    while (node) {
+        emit(node);
+        if (node.nodeType === Node.ELEMENT_NODE) {
+            const child = walker.firstChild();
+            if (child) {
+                node = child;
+                continue;
+            }
+            close(node);
+        }
+        // No children left: climb until an ancestor has a next sibling
+        let next = walker.nextSibling();
+        while (!next) {
+            const parent = walker.parentNode();
+            if (!parent || parent === root) break;
+            close(parent);
+            next = walker.nextSibling();
+        }
+        node = next;
+    }
+    close(root);
+    out.push('</html>');
+    return out.join('');
+}"""
+
+# Cheap structural fingerprint (see STATE_JS): tags, roles and normalised
+# text, hashed in-page so only a short string crosses the wire
+FINGERPRINT_JS = """() => (""" + STATE_JS + """)({shingles: false}).fingerprint"""
+
+# Full document height, to cap tall full-page captures
+PAGE_HEIGHT_JS = """() => Math.max(
+    document.documentElement.scrollHeight,
+    document.body ? document.body.scrollHeight : 0
+)"""
+
+# File extension per capture format
+CAPTURE_EXTENSIONS = {'png': 'png', 'jpeg': 'jpg', 'webp': 'webp'}
+
+# Everything a step needs from the DOM, serialized in a single evaluate call
+SNAPSHOT_JS = """() => {
+    const doctype = document.doctype ? new XMLSerializer().serializeToString(document.doctype) : '';
+    return {
+        html: doctype + document.documentElement.outerHTML,
+        visible_html: (""" + VISIBLE_HTML_JS + """)(),
+        metadata: (""" + METADATA_JS + """)(),
+        state: (""" + STATE_JS + """)({shingles: true}),
+    };
+}"""
+
 
 class Scraper:
-    """Handles screenshot capture and HTML-to-Markdown extraction for a page."""
+    """Handles screenshot capture and HTML-to-Markdown extraction for a page.
+    With a writer, artifacts are written behind by the ArtifactWriter and the
+    returned paths exist once writer.wait_for(path) (or flush) completes.
+    """
 
-    def __init__(self, output_dir: str = None):
+    def __init__(self, output_dir: str = None, converter: MarkdownConverter = None, writer: ArtifactWriter = None):
         self.output_dir = output_dir
+        self.converter = converter
+        self.writer = writer
+        self.captures = []
+        # Last captured step (artifacts + visual signature) and steps that reused it
+        self.reference = None
+        self.reused = []
+        self.signature_ms = 0.0
 
-    async def capture_screenshot(self, page: Page, step: int) -> str:
-        """Capture a screenshot of the current page.
-        Returns the file path of the saved screenshot.
+    async def _write(self, path: str, data):
+        if self.writer:
+            await self.writer.write(path, data)
+            return
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        with open(path, 'wb') as f:
+            f.write(data)
+
+    async def capture_screenshot(self, page: Page, step: int, profile: dict = None) -> str:
+        """Capture a screenshot of the current page using a capture profile
+        (Config.capture_profile_for): scale ('css' or 'device'), format ('png',
+        'jpeg' or 'webp'), quality, full_page, max_height (full-page cap) and
+        tile_height (capture pages taller than this as tiles, see _capture_tiles).
+        Returns the file path of the saved screenshot (the first tile for tiled
+        captures); encode time and size are appended to self.captures.
         """
-        filename = f"step_{step}.png"
+        profile = profile or {'name': 'default', 'scale': 'device', 'format': 'png', 'full_page': True}
+        fmt = profile.get('format', 'png')
+        quality = int(profile.get('quality', 80))
+        filename = f"step_{step}.{CAPTURE_EXTENSIONS[fmt]}"
         path = os.path.join(self.output_dir, filename)
-        await page.screenshot(path=path, full_page=True)
+
+        # WebP is encoded from a PNG capture (Playwright only emits PNG/JPEG)
+        options = {
+            'full_page': bool(profile.get('full_page', True)),
+            'scale': profile.get('scale', 'device'),
+            'type': 'jpeg' if fmt == 'jpeg' else 'png',
+        }
+        if fmt == 'jpeg':
+            options['quality'] = quality
+
+        height = None
+        max_height = profile.get('max_height')
+        tile_height = profile.get('tile_height')
+        if options['full_page'] and (max_height or tile_height):
+            height = await page.evaluate(PAGE_HEIGHT_JS)
+        clipped = bool(max_height and height and height > max_height)
+        if clipped:
+            height = max_height
+
+        capture = {'step': step, 'profile': profile.get('name'), 'format': fmt, 'clipped': clipped}
+        if tile_height and height and height > tile_height:
+            path, manifest_path, size, encode_ms, tiles = await self._capture_tiles(
+                page, step, options, fmt, quality, height, int(tile_height)
+            )
+            capture.update({'tiles': tiles, 'manifest': manifest_path})
+        else:
+            if clipped:
+                options['clip'] = {'x': 0, 'y': 0, 'width': page.viewport_size['width'], 'height': max_height}
+            started = time.perf_counter()
+            data = await self._screenshot(page, options, fmt, quality)
+            encode_ms = (time.perf_counter() - started) * 1000
+            size = len(data)
+            await self._write(path, data)
+
+        capture.update({'encode_ms': round(encode_ms, 1), 'bytes': size})
+        self.captures.append(capture)
         return path
 
-    async def save_html(self, page: Page, step: int) -> str:
+    async def _screenshot(self, page: Page, options: dict, fmt: str, quality: int) -> bytes:
+        data = await page.screenshot(**options)
+        if fmt == 'webp':
+            data = await asyncio.to_thread(self._to_webp, data, quality)
+        return data
+
+    async def _capture_tiles(self, page: Page, step: int, options: dict, fmt: str, quality: int, height: int, tile_height: int) -> tuple:
+        """Capture a tall page as clip-rect tiles of tile_height CSS px, each
+        written to step_N_tiles/ as soon as it is encoded, so Chromium never
+        rasterizes more than one tile and memory stays bounded by page height.
+        manifest.json (written once all tiles are on disk) lists how to stack them.
+        Returns (first tile path, manifest path, bytes, encode ms, tile count).
+        """
+        tile_dir = os.path.join(self.output_dir, f"step_{step}_tiles")
+        os.makedirs(tile_dir, exist_ok=True)
+        width = page.viewport_size['width']
+        tiles, tile_paths, size, encode_ms = [], [], 0, 0.0
+
+        for index, y in enumerate(range(0, height, tile_height)):
+            clip = {'x': 0, 'y': y, 'width': width, 'height': min(tile_height, height - y)}
+            started = time.perf_counter()
+            data = await self._screenshot(page, {**options, 'clip': clip}, fmt, quality)
+            encode_ms += (time.perf_counter() - started) * 1000
+
+            filename = f"tile_{index:03d}.{CAPTURE_EXTENSIONS[fmt]}"
+            tile_path = os.path.join(tile_dir, filename)
+            await self._write(tile_path, data)
+            tiles.append({'file': filename, 'y': y, 'height': clip['height']})
+            tile_paths.append(tile_path)
+            size += len(data)
+
+        manifest = {'width': width, 'height': height, 'scale': options['scale'], 'format': fmt, 'tiles': tiles}
+        manifest_path = os.path.join(tile_dir, 'manifest.json')
+        if self.writer:
+            await self.writer.wait_for(*tile_paths)
+        await self._write(manifest_path, json.dumps(manifest, indent=2))
+        return tile_paths[0], manifest_path, size, encode_ms, len(tiles)
+
+    @staticmethod
+    def _to_webp(png: bytes, quality: int) -> bytes:
+        from PIL import Image
+
+        output = io.BytesIO()
+        Image.open(io.BytesIO(png)).save(output, format='WEBP', quality=quality)
+        return output.getvalue()
+
+    def capture_stats(self) -> dict:
+        """Total and per-profile screenshot encode time and size for the run."""
+        by_profile = {}
+        for capture in self.captures:
+            stats = by_profile.setdefault(capture['profile'], {'count': 0, 'encode_ms': 0.0, 'bytes': 0})
+            stats['count'] += 1
+            stats['encode_ms'] = round(stats['encode_ms'] + capture['encode_ms'], 1)
+            stats['bytes'] += capture['bytes']
+        return {
+            'count': len(self.captures),
+            'encode_ms': round(sum(c['encode_ms'] for c in self.captures), 1),
+            'bytes': sum(c['bytes'] for c in self.captures),
+            'by_profile': by_profile,
+        }
+
+    async def visual_signature(self, page: Page) -> dict:
+        """Cheap description of what is on screen: URL, structural fingerprint
+        and a perceptual hash (dHash) of a CSS-scale viewport JPEG.
+        """
+        started = time.perf_counter()
+        fingerprint = await page.evaluate(FINGERPRINT_JS)
+        image = await page.screenshot(type='jpeg', quality=50, scale='css')
+        phash = await asyncio.to_thread(self._dhash, image)
+        self.signature_ms += (time.perf_counter() - started) * 1000
+        return {'url': page.url, 'fingerprint': fingerprint, 'hash': phash}
+
+    @staticmethod
+    def _dhash(image: bytes, size: int = 8) -> int:
+        # Difference hash: one bit per horizontally adjacent pixel pair of a
+        # (size + 1) x size grayscale thumbnail
+        from PIL import Image
+
+        thumb = Image.open(io.BytesIO(image)).convert('L').resize((size + 1, size), Image.LANCZOS)
+        pixels = list(thumb.getdata())
+        bits = 0
+        for row in range(size):
+            for col in range(size):
+                offset = row * (size + 1) + col
+                bits = (bits << 1) | (pixels[offset] > pixels[offset + 1])
+        return bits
+
+    def find_reference(self, signature: dict, threshold: int) -> dict:
+        """The last captured step if `signature` shows the same screen: same URL
+        and fingerprint, hash within `threshold` differing bits. None otherwise.
+        """
+        reference = self.reference
+        if signature is None or reference is None or reference['signature'] is None:
+            return None
+        previous = reference['signature']
+        if signature['url'] != previous['url'] or signature['fingerprint'] != previous['fingerprint']:
+            return None
+        distance = bin(signature['hash'] ^ previous['hash']).count('1')
+        return reference if distance <= threshold else None
+
+    def remember_capture(self, step: int, signature: dict, artifacts: dict, capture_ms: float, size: int):
+        """Make a freshly captured step the reference for the next ones.
+        `artifacts` holds what a reusing step needs (paths, markdown future, snapshot).
+        """
+        self.reference = {
+            'step': step, 'signature': signature, 'artifacts': artifacts,
+            'capture_ms': capture_ms, 'bytes': size,
+        }
+
+    def reuse_capture(self, step: int, reference: dict) -> dict:
+        """Record `step` as a reference to the artifacts of an earlier step."""
+        reuse = {
+            'step': step,
+            'reused_from': reference['step'],
+            'saved_ms': round(reference['capture_ms'], 1),
+            'saved_bytes': reference['bytes'],
+        }
+        self.reused.append(reuse)
+        return reuse
+
+    def reuse_stats(self) -> dict:
+        """Steps recorded as references, and the capture time and storage saved."""
+        return {
+            'reused': len(self.reused),
+            'saved_ms': round(sum(r['saved_ms'] for r in self.reused), 1),
+            'saved_bytes': sum(r['saved_bytes'] for r in self.reused),
+            'signature_ms': round(self.signature_ms, 1),
+        }
+
+    async def capture_snapshot(self, page: Page) -> dict:
+        """Serialize everything a step needs from the DOM in one evaluate call.
+        Returns a dictionary with 'url', 'html' (raw page HTML), 'visible_html',
+        'metadata', 'state' (structural fingerprint and shingles, see StateGraph)
+        and 'fingerprint'. Pass it to
+        save_html, extract_markdown and extract_metadata to avoid re-serializing.
+        """
+        snapshot = await page.evaluate(SNAPSHOT_JS)
+        snapshot["url"] = page.url
+        snapshot["fingerprint"] = snapshot["state"]["fingerprint"]
+        snapshot["metadata"] = self._resolve_metadata(snapshot["metadata"], page.url)
+        return snapshot
+
+    async def save_html(self, page: Page, step: int, snapshot: dict = None) -> str:
         """Save the HTML content of the page for debugging.
         Returns the file path of the saved HTML.
         """
         filename = f"step_{step}.html"
         path = os.path.join(self.output_dir, filename)
-        html = await page.content()
-        with open(path, 'w', encoding='utf-8') as f:
-            f.write(html)
+        html = snapshot["html"] if snapshot is not None else await page.content()
+        await self._write(path, html)
         return path
 
-    async def extract_markdown(self, page: Page) -> str:
+    async def extract_markdown(self, page: Page, snapshot: dict = None) -> str:
         """Extract the visible HTML content of the page and convert it to Markdown.
         Fixes relative image URLs to absolute URLs.
         """
         # Get content via evaluation to ensure we get the current DOM state
         # and remove hidden elements which might clutter the output
-        html = await page.evaluate("""() => {
-            const clone = document.documentElement.cloneNode(true);
-            
-            // Remove scripts, styles, and other non-visible elements
-            const toRemove = clone.querySelectorAll('script, style, noscript, svg, iframe, link, meta');
-            toRemove.forEach(el => el.remove());
-            
-            // Remove hidden elements (simple check)
-            const allElements = clone.querySelectorAll('*');
-            allElements.forEach(el => {
-                const style = window.getComputedStyle(el);
-                if (style.display === 'none' || style.visibility === 'hidden' || style.opacity === '0') {
-                    el.remove();
-                }
-            });
-            
-            return clone.outerHTML;
-        }""")
-        
-        current_url = page.url
-
-        # Convert cleaned HTML to markdown
-        # strip=['a'] ensures links are kept but maybe we want to keep them
-        # newline_style='BACKSLASH' handles line breaks better
-        markdown = md(html, heading_style="ATX", strip=['script', 'style'])
-
-        # Fix relative image URLs in markdown
-        # Pattern: ![alt](relative_path) or [text](relative_path)
-        def fix_url(match):
-            prefix = match.group(1) # ![ or [
-            alt_or_text = match.group(2)
-            url = match.group(3)
-            
-            # If URL is relative (starts with / or doesn't have protocol), make it absolute
-            if url and (url.startswith('/') or (not url.startswith('http://') and not url.startswith('https://') and not url.startswith('data:'))):
-                absolute_url = urljoin(current_url, url)
-                return f'{prefix}{alt_or_text}]({absolute_url})'
-            return match.group(0)  # Return unchanged if already absolute
-
-        # Fix both image and link URLs with a more robust regex
-        # Matches ![alt](url) or [text](url)
-        markdown = re.sub(r'(!?\[)([^\]]*)\]\(([^)]+)\)', fix_url, markdown)
-
-        return markdown
-
-    async def extract_metadata(self, page: Page) -> dict:
-        """Extract page metadata: title, description, and favicon.
-        Returns a dictionary with 'title', 'description', and 'favicon_url'.
-        """
-        metadata = await page.evaluate("""() => {
-            // Extract title
-            let title = document.title || '';
-
-            // Try og:title first, fallback to title tag
-            const ogTitle = document.querySelector('meta[property="og:title"]');
-            if (ogTitle && ogTitle.content) {
-                title = ogTitle.content;
-            }
+        if snapshot is None:
+            html = await page.evaluate(VISIBLE_HTML_JS)
+            current_url = page.url
+        else:
+            html = snapshot["visible_html"]
+            current_url = snapshot["url"]
 
-            // Extract description
-            let description = '';
-            const metaDesc = document.querySelector('meta[name="description"]');
-            if (metaDesc && metaDesc.content) {
-                description = metaDesc.content;
-            }
+        if self.converter:
+            return await self.converter.convert(html, current_url)
+        return html_to_markdown(html, current_url)
 
-            // Try og:description as fallback
-            if (!description) {
-                const ogDesc = document.querySelector('meta[property="og:description"]');
-                if (ogDesc && ogDesc.content) {
-                    description = ogDesc.content;
-                }
-            }
-
-            // Extract favicon/icon URLs with priority:
-            // 1. apple-touch-icon (usually highest quality)
-            // 2. icon with sizes
-            // 3. shortcut icon / icon
-            // 4. og:image
-            let iconUrl = '';
-
-            // Try apple-touch-icon first (best quality)
-            const appleTouchIcon = document.querySelector('link[rel*="apple-touch-icon"]');
-            if (appleTouchIcon && appleTouchIcon.href) {
-                iconUrl = appleTouchIcon.href;
-            }
-
-            // Try icon with sizes
-            if (!iconUrl) {
-                const iconWithSizes = document.querySelector('link[rel="icon"][sizes]');
-                if (iconWithSizes && iconWithSizes.href) {
-                    iconUrl = iconWithSizes.href;
-                }
-            }
-
-            // Try regular icon/shortcut icon
-            if (!iconUrl) {
-                const icon = document.querySelector('link[rel*="icon"]');
-                if (icon && icon.href) {
-                    iconUrl = icon.href;
-                }
-            }
-
-            // Fallback to og:image if no favicon found
-            if (!iconUrl) {
-                const ogImage = document.querySelector('meta[property="og:image"]');
-                if (ogImage && ogImage.content) {
-                    iconUrl = ogImage.content;
-                }
-            }
-
-            // Last resort: try /favicon.ico
-            if (!iconUrl) {
-                iconUrl = '/favicon.ico';
-            }
+    async def submit_markdown(self, snapshot: dict) -> asyncio.Future:
+        """Start converting a snapshot's visible HTML to Markdown without waiting.
+        Uses the converter's pool when available; returns a future with the Markdown.
+        """
+        if self.converter:
+            return await self.converter.submit(snapshot["visible_html"], snapshot["url"])
+        future = asyncio.get_running_loop().create_future()
+        future.set_result(html_to_markdown(snapshot["visible_html"], snapshot["url"]))
+        return future
 
-            return {
-                title: title,
-                description: description,
-                favicon_url: iconUrl
-            };
-        }""")
+    async def extract_metadata(self, page: Page, snapshot: dict = None) -> dict:
+        """Extract page metadata: title, description, and favicon.
+        Returns a dictionary with 'title', 'description', and 'favicon_url'.
+        """
+        if snapshot is not None:
+            return snapshot["metadata"]
+        metadata = await page.evaluate(METADATA_JS)
+        return self._resolve_metadata(metadata, page.url)
 
+    @staticmethod
+    def _resolve_metadata(metadata: dict, page_url: str) -> dict:
         # Convert relative favicon URL to absolute
         if metadata['favicon_url']:
-            metadata['favicon_url'] = urljoin(page.url, metadata['favicon_url'])
+            metadata['favicon_url'] = urljoin(page_url, metadata['favicon_url'])
 
         return metadata
 
@@ -193,8 +482,7 @@ class Scraper:
                 async with session.get(favicon_url, timeout=aiohttp.ClientTimeout(total=10)) as response:
                     if response.status == 200:
                         content = await response.read()
-                        with open(filepath, 'wb') as f:
-                            f.write(content)
+                        await self._write(filepath, content)
                         return filename
         except Exception as e:
             print(f"Failed to download favicon from {favicon_url}: {e}")
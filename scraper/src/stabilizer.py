@@ -0,0 +1,248 @@
+import time
+import asyncio
+from playwright.async_api import Page
+
+# Idempotent in-page tracker for DOM mutations and in-flight fetch/XHR.
+# Installed as an init script so it is present from the very first byte of
+# every document, and re-run by WAIT_JS in case a page predates install().
+TRACKER_JS = """
+    if (!window.__fsStability) {
+        const state = window.__fsStability = { lastMutation: performance.now(), requests: new Map(), seq: 0 };
+        const touch = () => { state.lastMutation = performance.now(); };
+        new MutationObserver(touch).observe(document, {
+            childList: true, subtree: true, attributes: true, characterData: true,
+        });
+        const begin = () => { const id = ++state.seq; state.requests.set(id, performance.now()); return id; };
+        const end = (id) => { state.requests.delete(id); };
+
+        const originalFetch = window.fetch;
+        if (originalFetch) {
+            window.fetch = function (...args) {
+                const id = begin();
+                return originalFetch.apply(this, args).finally(() => end(id));
+            };
+        }
+        const originalSend = XMLHttpRequest.prototype.send;
+        XMLHttpRequest.prototype.send = function (...args) {
+            const id = begin();
+            this.addEventListener('loadend', () => end(id), { once: true });
+            return originalSend.apply(this, args);
+        };
+    }
+"""
+
+# Resolves once every signal has been quiet at the same time, or at the ceiling.
+# The signal that settled last is reported as the one that released the wait.
+WAIT_JS = """async (opts) => {""" + TRACKER_JS + """
+    const state = window.__fsStability;
+    const started = performance.now();
+    const settledAt = {};
+
+    const inViewport = (el) => {
+        const rect = el.getBoundingClientRect();
+        return rect.bottom > 0 && rect.top < window.innerHeight && rect.width > 0 && rect.height > 0;
+    };
+    const checks = {
+        dom: () => performance.now() - state.lastMutation >= opts.quietMs,
+        // Infinite animations (spinners, marquees) never finish, so only finite ones count
+        animations: () => !document.getAnimations().some(a =>
+            a.playState === 'running' && a.effect && isFinite(a.effect.getComputedTiming().endTime)),
+        // Long-polling and beacons would hold the page forever, so old requests are ignored
+        network: () => {
+            const now = performance.now();
+            for (const startedAt of state.requests.values()) {
+                if (now - startedAt < opts.maxRequestAgeMs) return false;
+            }
+            return true;
+        },
+        fonts: () => !document.fonts || document.fonts.status === 'loaded',
+        images: () => Array.from(document.images).every(img => img.complete || !inViewport(img)),
+    };
+
+    while (true) {
+        const elapsed = performance.now() - started;
+        const busy = [];
+        for (const [name, check] of Object.entries(checks)) {
+            let ok;
+            try { ok = check(); } catch (e) { ok = true; }
+            if (ok) {
+                if (!(name in settledAt)) settledAt[name] = elapsed;
+            } else {
+                delete settledAt[name];
+                busy.push(name);
+            }
+        }
+        if (!busy.length) {
+            const releasedBy = Object.keys(settledAt).reduce((a, b) => settledAt[a] >= settledAt[b] ? a : b);
+            return { waited_ms: Math.round(elapsed), released_by: releasedBy, busy: [] };
+        }
+        if (elapsed >= opts.timeoutMs) {
+            return { waited_ms: Math.round(elapsed), released_by: 'timeout', busy: busy };
+        }
+        await new Promise(resolve => setTimeout(resolve, opts.pollMs));
+    }
+}"""
+
+# Resolves as soon as an interactive element that was not usable when the wait
+# started (inserted, shown or enabled) is on screen, driven by a MutationObserver
+# and coalesced per burst of mutations, or at the ceiling.
+INTERACTIVE_JS = """(opts) => new Promise((resolve) => {
+    const SELECTOR = 'button, input:not([type="hidden"]), select, textarea, a[href], [role="button"], [onclick]';
+    const started = performance.now();
+    const usable = (el) => {
+        if (el.disabled || el.getAttribute('aria-disabled') === 'true') return false;
+        const rect = el.getBoundingClientRect();
+        return rect.width > 0 && rect.height > 0 && window.getComputedStyle(el).visibility !== 'hidden';
+    };
+    const initial = new Set(Array.from(document.querySelectorAll(SELECTOR)).filter(usable));
+    let scheduled = false;
+    let timer = null;
+    // Lets INTERACTIVE_CLEANUP_JS stop this wait once the caller gave up on it
+    const waits = window.__fsInteractiveWaits || (window.__fsInteractiveWaits = new Set());
+    const finish = (result) => {
+        observer.disconnect();
+        clearTimeout(timer);
+        waits.delete(cancel);
+        resolve({ ...result, waited_ms: Math.round(performance.now() - started) });
+    };
+    const cancel = () => finish({ woke_by: 'cancelled', element: null });
+    waits.add(cancel);
+    const scan = () => {
+        scheduled = false;
+        for (const el of document.querySelectorAll(SELECTOR)) {
+            if (!initial.has(el) && usable(el)) {
+                const text = ((el.innerText || el.value || '') + '').trim() || el.localName;
+                return finish({ woke_by: 'interactive', element: text.slice(0, 80) });
+            }
+        }
+    };
+    const observer = new MutationObserver(() => {
+        if (!scheduled) {
+            scheduled = true;
+            setTimeout(scan, 0);
+        }
+    });
+    observer.observe(document, {
+        childList: true, subtree: true, attributes: true,
+        attributeFilter: ['disabled', 'aria-disabled', 'class', 'style', 'hidden'],
+    });
+    timer = setTimeout(() => finish({ woke_by: 'timeout', element: null }), opts.timeoutMs);
+})"""
+
+# Disconnects the observers of interactive waits nobody is awaiting any more
+INTERACTIVE_CLEANUP_JS = """() => {
+    for (const cancel of window.__fsInteractiveWaits || []) cancel();
+}"""
+
+
+class Stabilizer:
+    """Waits until a page is visually and structurally quiet.
+    Combines in-page signals (DOM mutation quiet window, running CSS
+    animations/transitions, pending fetch/XHR, font and image loading)
+    and returns as soon as all of them are quiet. The timeout is only a
+    ceiling. Each wait reports how long it took and which signal released it.
+    """
+
+    def __init__(self, quiet_ms: int = 300, timeout_ms: int = 6000, max_request_age_ms: int = 3000):
+        self.quiet_ms = quiet_ms
+        self.timeout_ms = timeout_ms
+        self.max_request_age_ms = max_request_age_ms
+        self.waits = []
+        self.interactive_waits = []
+
+    async def install(self, page: Page):
+        """Register the tracker for all future documents of this page.
+        Call before the first navigation so the first document is tracked too.
+        """
+        await page.add_init_script("(() => {" + TRACKER_JS + "})()")
+
+    async def wait(self, page: Page, timeout_ms: int = None) -> dict:
+        """Wait for the page to settle.
+        Returns a dict with 'waited_ms', 'released_by' (signal name or
+        'timeout') and 'busy' (signals still active at the ceiling).
+        """
+        timeout_ms = self.timeout_ms if timeout_ms is None else timeout_ms
+        started = time.perf_counter()
+        result = None
+
+        # A navigation destroys the execution context mid-wait; retry on the new document
+        while result is None:
+            remaining = timeout_ms - (time.perf_counter() - started) * 1000
+            if remaining <= 0 or page.is_closed():
+                result = {"released_by": "timeout", "busy": ["navigation"]}
+                break
+            try:
+                result = await page.evaluate(WAIT_JS, {
+                    "quietMs": self.quiet_ms,
+                    "timeoutMs": remaining,
+                    "maxRequestAgeMs": self.max_request_age_ms,
+                    "pollMs": 50,
+                })
+            except Exception as e:
+                print(f"DEBUG: Stabilization interrupted ({e}), retrying on new document")
+                try:
+                    await page.wait_for_load_state("domcontentloaded", timeout=max(1, int(remaining)))
+                except Exception:
+                    pass
+
+        result["waited_ms"] = round((time.perf_counter() - started) * 1000)
+        self.waits.append(result)
+        return result
+
+    async def wait_for_interactive(self, page: Page, timeout_ms: int = 10000) -> dict:
+        """Wait on a page without anything to click (loaders, "calculating your
+        plan..." screens). Races a main-frame navigation, the in-page observer
+        for new interactive elements and the timeout, and returns as soon as
+        one of them fires: {'waited_ms', 'woke_by' ('navigation', 'interactive'
+        or 'timeout'), 'element' (text of the element that appeared)}.
+        """
+        started = time.perf_counter()
+        navigation = asyncio.ensure_future(page.wait_for_event(
+            "framenavigated", predicate=lambda frame: frame == page.main_frame, timeout=timeout_ms
+        ))
+        interactive = asyncio.ensure_future(page.evaluate(INTERACTIVE_JS, {"timeoutMs": timeout_ms}))
+        done = set()
+        try:
+            done, _ = await asyncio.wait(
+                {navigation, interactive}, timeout=timeout_ms / 1000 + 1, return_when=asyncio.FIRST_COMPLETED
+            )
+        finally:
+            # Still observing: a same-document navigation won, the wait timed
+            # out here first or we were cancelled. Stop the in-page observer
+            # instead of leaving it running until its own timer
+            observing = not interactive.done()
+            for task in (navigation, interactive):
+                task.cancel()
+            await asyncio.gather(navigation, interactive, return_exceptions=True)
+            if observing and not page.is_closed():
+                try:
+                    await page.evaluate(INTERACTIVE_CLEANUP_JS)
+                except Exception as e:
+                    print(f"DEBUG: Could not stop interactive wait observer: {e}")
+
+        result = {"woke_by": "timeout", "element": None}
+        if navigation in done and not navigation.cancelled() and navigation.exception() is None:
+            result["woke_by"] = "navigation"
+        elif interactive in done and not interactive.cancelled():
+            if interactive.exception() is None:
+                result.update(interactive.result())
+            else:
+                # The document went away under the observer
+                result["woke_by"] = "navigation"
+        result["waited_ms"] = round((time.perf_counter() - started) * 1000)
+        self.interactive_waits.append(result)
+        return result
+
+    def stats(self) -> dict:
+        """Summary of all waits in this run."""
+        released = {}
+        for w in self.waits:
+            released[w["released_by"]] = released.get(w["released_by"], 0) + 1
+        return {
+            "waits": len(self.waits),
+            "total_ms": sum(w["waited_ms"] for w in self.waits),
+            "released_by": released,
+            "dead_end_waits": len(self.interactive_waits),
+            "dead_end_ms": sum(w["waited_ms"] for w in self.interactive_waits),
+            "dead_end_woke_by": [w["woke_by"] for w in self.interactive_waits],
+        }
@@ -0,0 +1,210 @@
+import random
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Query parameters that never change what a funnel shows (cache busters, ad click ids)
+TRACKING_PARAMS = {"gclid", "fbclid", "msclkid", "yclid", "dclid", "_ga", "_gl", "ref", "ts", "_t"}
+TRACKING_PREFIXES = ("utm_", "mc_")
+
+# Structural description of the DOM, computed in-page: a token per element
+# (tag + ARIA role) and per text node (lowercased, digits folded to '#'), with
+# attributes ignored altogether so class names, ids, CSRF tokens and timers do
+# not change it. Returns the fingerprint (64-bit hash of the token stream), the
+# structure (hash of the element tokens and of heading, label and legend text:
+# the question a quiz screen asks) and, with opts.shingles, the 32-bit hashes
+# of every run of SHINGLE_SIZE tokens.
+STATE_JS = """(opts) => {
+    const SKIP = new Set(['script', 'style', 'noscript', 'template', 'svg', 'iframe', 'canvas', 'video', 'audio', 'link', 'meta']);
+    const SHINGLE_SIZE = 4;
+    const HEADINGS = 'h1, h2, h3, h4, h5, h6, [role=heading], legend, label';
+    const hash32 = (str, seed) => {
+        let h = seed >>> 0;
+        for (let i = 0; i < str.length; i++) {
+            h = Math.imul(h ^ str.charCodeAt(i), 2654435761);
+        }
+        return (h ^ (h >>> 15)) >>> 0;
+    };
+    const walker = document.createTreeWalker(
+        document.documentElement,
+        NodeFilter.SHOW_ELEMENT | NodeFilter.SHOW_TEXT,
+        { acceptNode: (node) => {
+            if (node.nodeType !== 1) return NodeFilter.FILTER_ACCEPT;
+            if (SKIP.has(node.localName)) return NodeFilter.FILTER_REJECT;
+            if (node.localName === 'input' && node.type === 'hidden') return NodeFilter.FILTER_REJECT;
+            return NodeFilter.FILTER_ACCEPT;
+        } }
+    );
+    const finish = (a, b) => {
+        a = Math.imul(a ^ (a >>> 16), 2246822507) ^ Math.imul(b ^ (b >>> 13), 3266489909);
+        b = Math.imul(b ^ (b >>> 16), 2246822507) ^ Math.imul(a ^ (a >>> 13), 3266489909);
+        return (b >>> 0).toString(16).padStart(8, '0') + (a >>> 0).toString(16).padStart(8, '0');
+    };
+    let h1 = 0xdeadbeef, h2 = 0x41c6ce57;
+    let s1 = 0x85ebca6b, s2 = 0xc2b2ae35;
+    const window_ = [];
+    const shingles = new Set();
+    for (let node = walker.currentNode; node; node = walker.nextNode()) {
+        let token, structural = true;
+        if (node.nodeType === 1) {
+            const role = node.getAttribute('role');
+            token = '<' + node.localName + (role ? '/' + role : '');
+        } else {
+            const text = node.data.replace(/\\s+/g, ' ').trim().toLowerCase().replace(/\\d+/g, '#');
+            if (!text) continue;
+            token = '"' + text.slice(0, 80);
+            structural = !!(node.parentElement && node.parentElement.closest(HEADINGS));
+        }
+        const th = hash32(token, 0x9747b28c);
+        h1 = Math.imul(h1 ^ th, 2654435761);
+        h2 = Math.imul(h2 ^ th, 1597334677);
+        if (structural) {
+            s1 = Math.imul(s1 ^ th, 2654435761);
+            s2 = Math.imul(s2 ^ th, 1597334677);
+        }
+        if (opts && opts.shingles) {
+            window_.push(th);
+            if (window_.length > SHINGLE_SIZE) window_.shift();
+            if (window_.length === SHINGLE_SIZE) shingles.add(hash32(window_.join(','), 0x1b873593));
+        }
+    }
+    return {
+        fingerprint: finish(h1, h2),
+        structure: finish(s1, s2),
+        shingles: Array.from(shingles),
+    };
+}"""
+
+
+def canonicalize_url(url: str) -> str:
+    """URL reduced to what identifies a screen: lowercase host without www,
+    no fragment (except #/ client-side routes), no tracking parameters,
+    sorted query and no trailing slash.
+    """
+    parts = urlsplit(url)
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if key.lower() not in TRACKING_PARAMS and not key.lower().startswith(TRACKING_PREFIXES)
+    )
+    fragment = parts.fragment if parts.fragment.startswith("/") else ""
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit((parts.scheme.lower(), host, path, urlencode(query), fragment))
+
+
+class StateGraph:
+    """Funnel states (canonical URL + structural fingerprint) and the steps
+    between them, to notice when a crawl starts going in circles.
+    * Exact revisits are a dict lookup on the state key.
+    * Near-duplicates (same canonical URL and structure, shingle Jaccard >=
+      similarity) are found with MinHash signatures bucketed by LSH bands.
+      Requiring the same structure keeps SPA screens that only differ in
+      their question (heading, label) apart, however similar the rest is.
+    * A revisit closes a cycle: the states walked since the last visit.
+    """
+
+    NUM_PERM = 64
+    BANDS = 16
+    _PRIME = (1 << 61) - 1
+
+    def __init__(self, similarity: float = 0.95):
+        self.similarity = similarity
+        rng = random.Random(0x5EED)
+        self._perms = [(rng.randrange(1, self._PRIME), rng.randrange(0, self._PRIME)) for _ in range(self.NUM_PERM)]
+        self.states = {}
+        self.aliases = {}
+        self.buckets = {}
+        self.edges = {}
+        self.path = []
+        self.urls = set()
+        self.revisits = 0
+        self.near_duplicates = 0
+        self.cycles = []
+
+    def _minhash(self, shingles: list) -> tuple:
+        if not shingles:
+            return tuple([0] * self.NUM_PERM)
+        prime = self._PRIME
+        return tuple(min((a * x + b) % prime for x in shingles) for a, b in self._perms)
+
+    def _bands(self, scope: tuple, signature: tuple) -> list:
+        rows = self.NUM_PERM // self.BANDS
+        return [(scope, band, signature[band * rows:(band + 1) * rows]) for band in range(self.BANDS)]
+
+    def _near_duplicate(self, scope: tuple, signature: tuple) -> str:
+        """Key of a known state of the same scope (canonical URL, structure)
+        similar enough to this one, or None."""
+        best, best_score = None, 0.0
+        for bucket in self._bands(scope, signature):
+            for key in self.buckets.get(bucket, ()):
+                other = self.states[key]["signature"]
+                score = sum(1 for a, b in zip(signature, other) if a == b) / self.NUM_PERM
+                if score >= self.similarity and score > best_score:
+                    best, best_score = key, score
+        return best
+
+    def visit(self, snapshot: dict, step: int) -> dict:
+        """Record the state captured at a step (a Scraper snapshot).
+        Returns {'key', 'revisits' (0 for a new state), 'first_step',
+        'near_duplicate' and 'cycle' (steps since the last visit)}.
+        """
+        state = snapshot["state"]
+        canonical = canonicalize_url(snapshot["url"])
+        key = f"{canonical}:{state['fingerprint']}"
+        scope = (canonical, state.get("structure"))
+        self.urls.add(snapshot["url"])
+
+        near_duplicate = key in self.aliases
+        key = self.aliases.get(key, key)
+        if key not in self.states:
+            signature = self._minhash(state["shingles"])
+            match = self._near_duplicate(scope, signature)
+            if match:
+                # Later visits of this variant resolve with a dict lookup
+                self.aliases[key] = match
+                key, near_duplicate = match, True
+            else:
+                self.states[key] = {"first_step": step, "visits": [], "signature": signature, "actions": set()}
+                for bucket in self._bands(scope, signature):
+                    self.buckets.setdefault(bucket, []).append(key)
+
+        if near_duplicate:
+            self.near_duplicates += 1
+        node = self.states[key]
+        cycle = []
+        if node["visits"]:
+            self.revisits += 1
+            last = node["visits"][-1]
+            cycle = [visited_step for visited_step, _ in self.path if visited_step >= last]
+            self.cycles.append(cycle)
+        if self.path:
+            self.edges.setdefault(self.path[-1][1], set()).add(key)
+        node["visits"].append(step)
+        self.path.append((step, key))
+        return {
+            "key": key,
+            "revisits": len(node["visits"]) - 1,
+            "first_step": node["first_step"],
+            "near_duplicate": near_duplicate,
+            "cycle": cycle,
+        }
+
+    def record_action(self, key: str, text: str):
+        """Remember an element clicked from a state."""
+        if text:
+            self.states[key]["actions"].add(text)
+
+    def tried_actions(self, key: str) -> set:
+        """Texts of the elements already clicked from a state."""
+        return set(self.states[key]["actions"]) if key in self.states else set()
+
+    def stats(self) -> dict:
+        return {
+            "states": len(self.states),
+            "transitions": sum(len(targets) for targets in self.edges.values()),
+            "revisits": self.revisits,
+            "near_duplicates": self.near_duplicates,
+            "cycles": len(self.cycles),
+            "longest_cycle": max((len(cycle) for cycle in self.cycles), default=0),
+        }
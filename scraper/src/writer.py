@@ -0,0 +1,138 @@
+import os
+import time
+import queue
+import asyncio
+import threading
+import zlib
+from concurrent.futures import Future
+
+
+class ArtifactWriter:
+    """Write-behind writer for run artifacts (screenshots, HTML, reports).
+    Writes are queued and performed by a small pool of threads, so slow disks
+    (e.g. bind-mounted volumes) never stall the event loop.
+
+    * Writes to the same path always go to the same thread, so appends and
+      rewrites of one file keep their order.
+    * Queues are bounded: when they are full, write() waits in a thread and
+      submit() blocks (back-pressure).
+    * flush() waits until everything queued so far is on disk.
+    * Latency and size of every artifact are recorded for summary().
+    """
+
+    def __init__(self, workers: int = 2, max_pending: int = 32):
+        self._queues = [queue.Queue(maxsize=max_pending) for _ in range(workers)]
+        self._threads = [
+            threading.Thread(target=self._drain, args=(q,), name=f"artifact-writer-{i}", daemon=True)
+            for i, q in enumerate(self._queues)
+        ]
+        for thread in self._threads:
+            thread.start()
+        self._pending = {}
+        self._lock = threading.Lock()
+        self.records = []
+        self.errors = []
+
+    def _queue_for(self, path: str) -> queue.Queue:
+        return self._queues[zlib.crc32(path.encode("utf-8")) % len(self._queues)]
+
+    def _item(self, path: str, data, mode: str, fsync: bool) -> tuple:
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        future = Future()
+        with self._lock:
+            self._pending[path] = future
+        return (path, data, mode, fsync, time.perf_counter(), future)
+
+    def _drain(self, q: queue.Queue):
+        while True:
+            item = q.get()
+            if item is None:
+                q.task_done()
+                return
+            path, data, mode, fsync, queued_at, future = item
+            started = time.perf_counter()
+            try:
+                with open(path, mode + "b") as f:
+                    f.write(data)
+                    if fsync:
+                        f.flush()
+                        os.fsync(f.fileno())
+                future.set_result(path)
+            except Exception as e:
+                print(f"Failed to write {path}: {e}")
+                self.errors.append({"path": path, "error": str(e)})
+                future.set_exception(e)
+            finished = time.perf_counter()
+            with self._lock:
+                self.records.append({
+                    "path": path,
+                    "bytes": len(data),
+                    "write_ms": (finished - started) * 1000,
+                    "queued_ms": (started - queued_at) * 1000,
+                })
+                if self._pending.get(path) is future:
+                    del self._pending[path]
+            q.task_done()
+
+    def submit(self, path: str, data, mode: str = "w", fsync: bool = False):
+        """Queue a write from synchronous code. Blocks while the queue is full."""
+        self._queue_for(path).put(self._item(path, data, mode, fsync))
+
+    async def write(self, path: str, data, mode: str = "w", fsync: bool = False):
+        """Queue a write from async code. Waits off-loop while the queue is full."""
+        q = self._queue_for(path)
+        item = self._item(path, data, mode, fsync)
+        try:
+            q.put_nowait(item)
+        except queue.Full:
+            await asyncio.to_thread(q.put, item)
+
+    async def wait_for(self, *paths: str):
+        """Wait until the latest queued writes of the given paths are on disk.
+        Raises the first write error among them, once all have finished.
+        """
+        with self._lock:
+            futures = [self._pending[p] for p in paths if p in self._pending]
+        errors = []
+        for future in futures:
+            try:
+                await asyncio.wrap_future(future)
+            except Exception as e:
+                errors.append(e)
+        if errors:
+            raise errors[0]
+
+    def flush(self):
+        """Block until everything queued so far has been written, in order."""
+        for q in self._queues:
+            q.join()
+
+    def close(self):
+        """Flush and stop the writer threads."""
+        self.flush()
+        for q in self._queues:
+            q.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def summary(self) -> dict:
+        """Per artifact type I/O cost: count, bytes and write latency."""
+        by_type = {}
+        for record in self.records:
+            ext = os.path.splitext(record["path"])[1] or "other"
+            stats = by_type.setdefault(ext, {"count": 0, "bytes": 0, "write_ms": 0.0, "max_ms": 0.0})
+            stats["count"] += 1
+            stats["bytes"] += record["bytes"]
+            stats["write_ms"] += record["write_ms"]
+            stats["max_ms"] = max(stats["max_ms"], record["write_ms"])
+        for stats in by_type.values():
+            stats["write_ms"] = round(stats["write_ms"], 1)
+            stats["max_ms"] = round(stats["max_ms"], 1)
+        return {
+            "artifacts": len(self.records),
+            "bytes": sum(r["bytes"] for r in self.records),
+            "write_ms": round(sum(r["write_ms"] for r in self.records), 1),
+            "errors": len(self.errors),
+            "by_type": by_type,
+        }